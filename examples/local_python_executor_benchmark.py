@@ -0,0 +1,66 @@
+"""Microbenchmark of the LocalPythonExecutor interpreter on loop-heavy code snippets.
+
+Usage: python examples/local_python_executor_benchmark.py [--repeat 5]
+"""
+
+import argparse
+import time
+
+from smolagents.local_python_executor import BASE_PYTHON_TOOLS, evaluate_python_code
+
+
+SNIPPETS = {
+    "arithmetic loop": """
+total = 0
+for i in range(100000):
+    total += i * 2 - 1
+total
+""",
+    "while loop with conditions": """
+i = 0
+evens = 0
+while i < 50000:
+    if i % 2 == 0:
+        evens += 1
+    i += 1
+evens
+""",
+    "list comprehension": """
+squares = [x * x for x in range(50000) if x % 3 == 0]
+len(squares)
+""",
+    "small function calls": """
+def add(a, b):
+    return a + b
+
+total = 0
+for i in range(100000):
+    total = add(total, abs(-i))
+total
+""",
+    "builtin function calls": """
+total = 0
+for i in range(100000):
+    total += max(abs(-i), len("abc"), int(1.5))
+total
+""",
+}
+
+
+def benchmark(code: str, repeat: int) -> float:
+    """Returns the best wall-clock time over `repeat` runs of `code`, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        evaluate_python_code(code, static_tools=BASE_PYTHON_TOOLS.copy(), state={})
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs per snippet, the best one is kept")
+    args = parser.parse_args()
+
+    for name, code in SNIPPETS.items():
+        print(f"{name:<30} {benchmark(code, args.repeat) * 1000:>10.1f} ms")
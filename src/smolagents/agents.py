@@ -14,8 +14,11 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import asyncio
+import contextvars
 import importlib
 import inspect
+import itertools
 import json
 import os
 import re
@@ -24,20 +27,22 @@ import textwrap
 import time
 from abc import ABC, abstractmethod
 from collections import deque
-from collections.abc import Callable, Generator
+from collections.abc import Awaitable, Callable, Generator, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait as futures_wait
 from logging import getLogger
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, TypedDict
-from .bp_executors import LocalExecExecutor
+from .bp_executors import LocalExecExecutor, ProcessExecExecutor
 from .bp_tools import get_file_size
+from .bp_utils import resolve_path, writable_path
 
 import jinja2
 import yaml
 from huggingface_hub import create_repo, metadata_update, snapshot_download, upload_folder
 from jinja2 import StrictUndefined, Template
 from rich.console import Group
-from rich.live import Live
-from rich.markdown import Markdown
 from rich.panel import Panel
 from rich.rule import Rule
 from rich.text import Text
@@ -52,14 +57,25 @@ from .local_python_executor import BASE_BUILTIN_MODULES, LocalPythonExecutor, Py
 from .memory import (
     ActionStep,
     AgentMemory,
+    CompactionPolicy,
     FinalAnswerStep,
     Message,
     PlanningStep,
+    StepJournal,
     SystemPromptStep,
     TaskStep,
     ToolCall,
 )
-from .models import ChatMessage, MessageRole, Model, parse_json_if_needed
+from .models import (
+    ChatMessage,
+    ChatMessageToolCall,
+    MessageRole,
+    Model,
+    RetryPolicy,
+    ToolCallStreamAssembler,
+    get_rate_limiter,
+    parse_json_if_needed,
+)
 from .monitoring import (
     YELLOW_HEX,
     AgentLogger,
@@ -210,6 +226,13 @@ class MultiStepAgent(ABC):
         description (`str`, *optional*): Necessary for a managed agent only - the description of this agent.
         provide_run_summary (`bool`, *optional*): Whether to provide a run summary when called as a managed agent.
         final_answer_checks (`list`, *optional*): List of Callables to run before returning a final answer for checking validity.
+        journal (`StepJournal | str | Path`, *optional*): Journal, or path of the journal file, where each finished step is recorded.
+            A run interrupted by a crash can then be continued with `resume`.
+        compaction_policy (`CompactionPolicy`, *optional*): Policy keeping the messages given to the model within a token budget,
+            by collapsing the older steps into a summary.
+        retry_policy (`RetryPolicy`, *optional*): Policy retrying the transient failures of the model calls of the steps.
+            Defaults to `RetryPolicy()`. The calls are also throttled by the rate limiter of the model's provider and id,
+            shared by all the agents of the process, see `get_rate_limiter`.
     """
 
     def __init__(
@@ -229,9 +252,16 @@ class MultiStepAgent(ABC):
         provide_run_summary: bool = False,
         final_answer_checks: list[Callable] | None = None,
         logger: AgentLogger | None = None,
+        journal: StepJournal | str | Path | None = None,
+        compaction_policy: CompactionPolicy | None = None,
+        retry_policy: RetryPolicy | None = None,
     ):
         self.agent_name = self.__class__.__name__
         self.model = model
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.rate_limiter = get_rate_limiter(
+            getattr(model, "provider", None) or type(model).__name__, getattr(model, "model_id", None)
+        )
         self.prompt_templates = prompt_templates or EMPTY_PROMPT_TEMPLATES
         if prompt_templates is not None:
             missing_keys = set(EMPTY_PROMPT_TEMPLATES.keys()) - set(prompt_templates.keys())
@@ -254,6 +284,7 @@ class MultiStepAgent(ABC):
         self.description = description
         self.provide_run_summary = provide_run_summary
         self.final_answer_checks = final_answer_checks
+        self.journal = journal if journal is None or isinstance(journal, StepJournal) else StepJournal(journal)
 
         self._setup_managed_agents(managed_agents)
         self._setup_tools(tools, add_base_tools)
@@ -261,7 +292,7 @@ class MultiStepAgent(ABC):
 
         self.system_prompt = self.initialize_system_prompt()
         self.task: str | None = None
-        self.memory = AgentMemory(self.system_prompt)
+        self.memory = AgentMemory(self.system_prompt, compaction_policy=compaction_policy)
 
         if logger is None:
             self.logger = AgentLogger(level=verbosity_level)
@@ -272,6 +303,21 @@ class MultiStepAgent(ABC):
         self.step_callbacks = step_callbacks if step_callbacks is not None else []
         self.step_callbacks.append(self.monitor.update_metrics)
 
+    def _generate_with_retries(self, generate: Callable[[], ChatMessage]) -> ChatMessage:
+        """Calls `generate`, retrying its transient model errors according to `self.retry_policy`."""
+        return self.retry_policy.call(generate, rate_limiter=self.rate_limiter, on_retry=self._log_retry)
+
+    async def _agenerate_with_retries(self, agenerate: Callable[[], Awaitable[ChatMessage]]) -> ChatMessage:
+        """Asynchronous version of `_generate_with_retries`, awaiting `agenerate`."""
+        return await self.retry_policy.acall(agenerate, rate_limiter=self.rate_limiter, on_retry=self._log_retry)
+
+    def _log_retry(self, error: BaseException, retry_number: int, delay: float) -> None:
+        self.logger.log(
+            f"Model call failed with {type(error).__name__}: {error}\n"
+            f"Retry {retry_number}/{self.retry_policy.max_retries} in {delay:.1f} seconds.",
+            level=LogLevel.INFO,
+        )
+
     def _validate_name(self, name: str | None) -> str | None:
         if name is not None and not is_valid_name(name):
             raise ValueError(f"Agent name '{name}' must be a valid Python identifier and not a reserved keyword.")
@@ -341,6 +387,16 @@ class MultiStepAgent(ABC):
         ```
         """
         max_steps = max_steps or self.max_steps
+        self._setup_run(task, reset, images, additional_args)
+        if stream:
+            # The steps are returned as they are executed through a generator to iterate on.
+            return self._run(task=self.task, max_steps=max_steps, images=images)
+        # Outputs are returned only at the end. We only look at the last step.
+        return deque(self._run(task=self.task, max_steps=max_steps, images=images), maxlen=1)[0].final_answer
+
+    def _setup_run(
+        self, task: str, reset: bool, images: list["PIL.Image.Image"] | None, additional_args: dict | None
+    ) -> None:
         self.task = task
         self.interrupt_switch = False
         if additional_args is not None:
@@ -354,6 +410,8 @@ You have been provided with these additional arguments, that you can access usin
         if reset:
             self.memory.reset()
             self.monitor.reset()
+            if self.journal is not None:
+                self.journal.clear()
 
         self.logger.log_task(
             content=self.task.strip(),
@@ -361,34 +419,145 @@ You have been provided with these additional arguments, that you can access usin
             level=LogLevel.DEBUG,
             title=self.name if hasattr(self, "name") else None,
         )
-        self.memory.steps.append(TaskStep(task=self.task, task_images=images))
+        self._append_step(TaskStep(task=self.task, task_images=images, additional_args=additional_args))
+
+        if getattr(self, "python_executor", None):
+            self.python_executor.send_variables(variables=self.state)
+            self.python_executor.send_tools({**self.tools, **self.managed_agents})
+
+        self.step_number = 1
+
+    async def arun(
+        self,
+        task: str,
+        reset: bool = True,
+        images: list["PIL.Image.Image"] | None = None,
+        additional_args: dict | None = None,
+        max_steps: int | None = None,
+    ):
+        """
+        Asynchronous version of `run`, returning the final answer: awaiting it lets the event loop run other agents meanwhile.
+
+        The model is called with `agenerate` (without streaming), so waiting for it takes no thread. Only the synchronous
+        parts of the steps, like tool calls and code actions, run in worker threads of the event loop's default executor:
+        many more agents than this executor has workers can wait for their model at the same time.
+
+        Args:
+            task (`str`): Task to perform.
+            reset (`bool`): Whether to reset the conversation or keep it going from previous run.
+            images (`list[PIL.Image.Image]`, *optional*): Image(s) objects.
+            additional_args (`dict`, *optional*): Any other variables that you want to pass to the agent run, for instance images or dataframes. Give them clear names!
+            max_steps (`int`, *optional*): Maximum number of steps the agent can take to solve the task. if not provided, will use the agent's default value.
+
+        Example:
+        ```py
+        import asyncio
+        from smolagents import CodeAgent
+        agents = [CodeAgent(tools=[], model=model) for _ in range(10)]
+        answers = await asyncio.gather(*(agent.arun("What is the result of 2 power 3.7384?") for agent in agents))
+        ```
+        """
+        max_steps = max_steps or self.max_steps
+        await asyncio.to_thread(self._setup_run, task, reset, images, additional_args)
+        return await self._arun(task=self.task, max_steps=max_steps, images=images)
+
+    def resume(
+        self,
+        journal_path: str | Path,
+        stream: bool = False,
+        max_steps: int | None = None,
+        additional_args: dict | None = None,
+    ):
+        """
+        Resumes a run from its journal, for instance after a crash: the memory is rebuilt from the journaled steps
+        without querying the model again, and the run continues after the last finished step.
+        New steps are appended to the same journal.
+
+        The state of the Python executor, if any, is rebuilt by running the code actions of the journaled steps again:
+        their side effects, for instance on files, happen again.
+
+        Args:
+            journal_path (`str | Path`): Path of the journal of the run, written by an agent created with `journal`.
+            stream (`bool`): Whether to run in streaming mode, see `run`.
+            max_steps (`int`, *optional*): Maximum number of steps of the whole run. if not provided, will use the agent's default value.
+            additional_args (`dict`, *optional*): The `additional_args` given to the journaled runs that could not be
+                journaled, for instance images or dataframes: they must be given again to resume these runs.
+        """
+        max_steps = max_steps or self.max_steps
+        records = StepJournal.load_records(journal_path)
+        steps = [StepJournal.step_from_record(record) for record in records]
+        task_indices = [i for i, step in enumerate(steps) if isinstance(step, TaskStep)]
+        if not task_indices:
+            raise ValueError(f"No task was journaled in {journal_path}, there is no run to resume.")
+        # The journal holds all the runs since the last reset, whose arguments are all in the state
+        state = {}
+        unjournaled_args = set()
+        for i in task_indices:
+            state.update(records[i].get("additional_args", {}))
+            unjournaled_args.update(records[i].get("unjournaled_args", []))
+        state.update(additional_args or {})
+        missing_args = unjournaled_args - state.keys()
+        if missing_args:
+            raise ValueError(
+                f"The run journaled in {journal_path} was given additional arguments that could not be journaled: "
+                f"pass {sorted(missing_args)} again with `additional_args` to resume it."
+            )
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = StepJournal(journal_path)
+        self.task = steps[task_indices[-1]].task
+        self.interrupt_switch = False
+        self.state.update(state)
+        self.system_prompt = self.initialize_system_prompt()
+        self.memory.system_prompt = SystemPromptStep(system_prompt=self.system_prompt)
+        self.memory.reset()
+        self.monitor.reset()
+        self.memory.steps = [step for step in steps if not isinstance(step, FinalAnswerStep)]
+
+        if isinstance(steps[-1], FinalAnswerStep):
+            if stream:
+                return iter([steps[-1]])
+            return steps[-1].final_answer
 
         if getattr(self, "python_executor", None):
             self.python_executor.send_variables(variables=self.state)
             self.python_executor.send_tools({**self.tools, **self.managed_agents})
+            self._restore_executor_state()
 
+        # Only the steps of the last run count, which may have crashed before its first action step
+        action_steps = [step for step in steps[task_indices[-1] :] if isinstance(step, ActionStep)]
+        self.step_number = action_steps[-1].step_number + 1 if action_steps else 1
         if stream:
-            # The steps are returned as they are executed through a generator to iterate on.
-            return self._run(task=self.task, max_steps=max_steps, images=images)
-        # Outputs are returned only at the end. We only look at the last step.
-        return deque(self._run(task=self.task, max_steps=max_steps, images=images), maxlen=1)[0].final_answer
+            return self._run(task=self.task, max_steps=max_steps)
+        return deque(self._run(task=self.task, max_steps=max_steps), maxlen=1)[0].final_answer
+
+    def _restore_executor_state(self):
+        """Rebuilds the state of the Python executor from the steps in memory, when resuming a run."""
+        pass
+
+    def _append_step(self, step: TaskStep | ActionStep | PlanningStep):
+        self.memory.steps.append(step)
+        if self.journal is not None:
+            self.journal.append(step)
 
     def _run(
         self, task: str, max_steps: int, images: list["PIL.Image.Image"] | None = None
     ) -> Generator[ActionStep | PlanningStep | FinalAnswerStep]:
         final_answer = None
-        self.step_number = 1
         while final_answer is None and self.step_number <= max_steps:
             if self.interrupt_switch:
                 raise AgentError("Agent interrupted.", self.logger)
             step_start_time = time.time()
-            if self.planning_interval is not None and (
-                self.step_number == 1 or (self.step_number - 1) % self.planning_interval == 0
+            # A planning step may already be in memory when resuming a run that stopped right after it
+            if (
+                self.planning_interval is not None
+                and (self.step_number == 1 or (self.step_number - 1) % self.planning_interval == 0)
+                and not isinstance(self.memory.steps[-1], PlanningStep)
             ):
                 planning_step = self._generate_planning_step(
                     task, is_first_step=(self.step_number == 1), step=self.step_number
                 )
-                self.memory.steps.append(planning_step)
+                self._append_step(planning_step)
                 yield planning_step
             action_step = ActionStep(
                 step_number=self.step_number, start_time=step_start_time, observations_images=images
@@ -403,14 +572,56 @@ You have been provided with these additional arguments, that you can access usin
                 action_step.error = e
             finally:
                 self._finalize_step(action_step, step_start_time)
-                self.memory.steps.append(action_step)
+                self._append_step(action_step)
                 yield action_step
                 self.step_number += 1
 
         if final_answer is None and self.step_number == max_steps + 1:
             final_answer = self._handle_max_steps_reached(task, images, step_start_time)
             yield action_step
-        yield FinalAnswerStep(handle_agent_output_types(final_answer))
+        final_answer_step = FinalAnswerStep(handle_agent_output_types(final_answer))
+        if self.journal is not None:
+            self.journal.append(final_answer_step)
+        yield final_answer_step
+
+    async def _arun(self, task: str, max_steps: int, images: list["PIL.Image.Image"] | None = None) -> Any:
+        """Asynchronous version of `_run`, returning the final answer."""
+        final_answer = None
+        while final_answer is None and self.step_number <= max_steps:
+            if self.interrupt_switch:
+                raise AgentError("Agent interrupted.", self.logger)
+            step_start_time = time.time()
+            if (
+                self.planning_interval is not None
+                and (self.step_number == 1 or (self.step_number - 1) % self.planning_interval == 0)
+                and not isinstance(self.memory.steps[-1], PlanningStep)
+            ):
+                planning_step = await self._agenerate_planning_step(
+                    task, is_first_step=(self.step_number == 1), step=self.step_number
+                )
+                self._append_step(planning_step)
+            action_step = ActionStep(
+                step_number=self.step_number, start_time=step_start_time, observations_images=images
+            )
+            try:
+                final_answer = await self._aexecute_step(task, action_step)
+            except AgentGenerationError as e:
+                raise e
+            except AgentError as e:
+                action_step.error = e
+            finally:
+                self._finalize_step(action_step, step_start_time)
+                self._append_step(action_step)
+                self.step_number += 1
+
+        if final_answer is None and self.step_number == max_steps + 1:
+            final_answer = self._record_max_steps_reached(
+                await self.aprovide_final_answer(task, images), step_start_time
+            )
+        final_answer_step = FinalAnswerStep(handle_agent_output_types(final_answer))
+        if self.journal is not None:
+            self.journal.append(final_answer_step)
+        return final_answer_step.final_answer
 
     def _execute_step(self, task: str, memory_step: ActionStep) -> None | Any:
         self.logger.log_rule(f"Step {self.step_number}", level=LogLevel.INFO)
@@ -419,6 +630,13 @@ You have been provided with these additional arguments, that you can access usin
             self._validate_final_answer(final_answer)
         return final_answer
 
+    async def _aexecute_step(self, task: str, memory_step: ActionStep) -> None | Any:
+        self.logger.log_rule(f"Step {self.step_number}", level=LogLevel.INFO)
+        final_answer = await self.astep(memory_step)
+        if final_answer is not None and self.final_answer_checks:
+            self._validate_final_answer(final_answer)
+        return final_answer
+
     def _validate_final_answer(self, final_answer: Any):
         for check_function in self.final_answer_checks:
             try:
@@ -436,14 +654,16 @@ You have been provided with these additional arguments, that you can access usin
             )
 
     def _handle_max_steps_reached(self, task: str, images: list["PIL.Image.Image"], step_start_time: float) -> Any:
-        final_answer = self.provide_final_answer(task, images)
+        return self._record_max_steps_reached(self.provide_final_answer(task, images), step_start_time)
+
+    def _record_max_steps_reached(self, final_answer: Any, step_start_time: float) -> Any:
         final_memory_step = ActionStep(
             step_number=self.step_number, error=AgentMaxStepsError("Reached max steps.", self.logger)
         )
         final_memory_step.action_output = final_answer
         final_memory_step.end_time = time.time()
         final_memory_step.duration = final_memory_step.end_time - step_start_time
-        self.memory.steps.append(final_memory_step)
+        self._append_step(final_memory_step)
         for callback in self.step_callbacks:
             callback(final_memory_step) if len(inspect.signature(callback).parameters) == 1 else callback(
                 final_memory_step, agent=self
@@ -451,6 +671,16 @@ You have been provided with these additional arguments, that you can access usin
         return final_answer
 
     def _generate_planning_step(self, task, is_first_step: bool, step: int) -> PlanningStep:
+        input_messages = self._planning_input_messages(task, is_first_step, step)
+        plan_message = self.model(input_messages, stop_sequences=["<end_plan>"])
+        return self._make_planning_step(input_messages, plan_message, is_first_step)
+
+    async def _agenerate_planning_step(self, task, is_first_step: bool, step: int) -> PlanningStep:
+        input_messages = self._planning_input_messages(task, is_first_step, step)
+        plan_message = await self.model.agenerate(input_messages, stop_sequences=["<end_plan>"])
+        return self._make_planning_step(input_messages, plan_message, is_first_step)
+
+    def _planning_input_messages(self, task, is_first_step: bool, step: int) -> list[Message]:
         if is_first_step:
             input_messages = [
                 {
@@ -466,10 +696,6 @@ You have been provided with these additional arguments, that you can access usin
                     ],
                 }
             ]
-            plan_message = self.model(input_messages, stop_sequences=["<end_plan>"])
-            plan = textwrap.dedent(
-                f"""Here are the facts I know and the plan of action that I will follow to solve the task:\n```\n{plan_message.content}\n```"""
-            )
         else:
             # Summary mode removes the system prompt and previous planning messages output by the model.
             # Removing previous planning messages avoids influencing too much the new plan.
@@ -503,14 +729,23 @@ You have been provided with these additional arguments, that you can access usin
                 ],
             }
             input_messages = [plan_update_pre] + memory_messages + [plan_update_post]
-            plan_message = self.model(input_messages, stop_sequences=["<end_plan>"])
+        return input_messages
+
+    def _make_planning_step(
+        self, input_messages: list[Message], plan_message: ChatMessage, is_first_step: bool
+    ) -> PlanningStep:
+        if is_first_step:
+            plan = textwrap.dedent(
+                f"""Here are the facts I know and the plan of action that I will follow to solve the task:\n```\n{plan_message.content}\n```"""
+            )
+        else:
             plan = textwrap.dedent(
                 f"""I still need to solve the task I was given:\n```\n{self.task}\n```\n\nHere are the facts I know and my new/updated plan of action to solve the task:\n```\n{plan_message.content}\n```"""
             )
         log_headline = "Initial plan" if is_first_step else "Updated plan"
         self.logger.log(Rule(f"[bold]{log_headline}", style="orange"), Text(plan), level=LogLevel.INFO)
         return PlanningStep(
-            model_input_messages=input_messages,
+            model_input_messages=self.memory.message_store.add(input_messages),
             plan=plan,
             model_output_message=plan_message,
         )
@@ -539,11 +774,9 @@ You have been provided with these additional arguments, that you can access usin
         Reads past llm_outputs, actions, and observations or errors from the memory into a series of messages
         that can be used as input to the LLM. Adds a number of keywords (such as PLAN, error, etc) to help
         the LLM.
+        Messages of steps already seen are reused from the memory's cache, see `AgentMemory.to_messages`.
         """
-        messages = self.memory.system_prompt.to_messages(summary_mode=summary_mode)
-        for memory_step in self.memory.steps:
-            messages.extend(memory_step.to_messages(summary_mode=summary_mode))
-        return messages
+        return self.memory.to_messages(summary_mode=bool(summary_mode))
 
     def visualize(self):
         """Creates a rich tree visualization of the agent's structure."""
@@ -581,6 +814,21 @@ You have been provided with these additional arguments, that you can access usin
         Returns:
             `str`: Final answer to the task.
         """
+        try:
+            chat_message: ChatMessage = self.model(self._final_answer_messages(task, images))
+            return chat_message.content
+        except Exception as e:
+            return f"Error in generating final LLM output:\n{e}"
+
+    async def aprovide_final_answer(self, task: str, images: list["PIL.Image.Image"] | None = None) -> str:
+        """Asynchronous version of `provide_final_answer`."""
+        try:
+            chat_message: ChatMessage = await self.model.agenerate(self._final_answer_messages(task, images))
+            return chat_message.content
+        except Exception as e:
+            return f"Error in generating final LLM output:\n{e}"
+
+    def _final_answer_messages(self, task: str, images: list["PIL.Image.Image"] | None = None) -> list[Message]:
         messages = [
             {
                 "role": MessageRole.SYSTEM,
@@ -608,17 +856,42 @@ You have been provided with these additional arguments, that you can access usin
                 ],
             }
         ]
-        try:
-            chat_message: ChatMessage = self.model(messages)
-            return chat_message.content
-        except Exception as e:
-            return f"Error in generating final LLM output:\n{e}"
+        return messages
 
     @abstractmethod
     def step(self, memory_step: ActionStep) -> None | Any:
         """To be implemented in children classes. Should return either None if the step is not final."""
         pass
 
+    async def astep(self, memory_step: ActionStep) -> None | Any:
+        """
+        Asynchronous version of `step`: the model is awaited with `agenerate`, then its output is processed, e.g. tools
+        are called or code is run, in a worker thread by `_process_step_output`.
+        Agents that do not implement `_prepare_step_input` run the whole `step` in a worker thread.
+        """
+        model_input = self._prepare_step_input(memory_step)
+        if model_input is None:
+            return await asyncio.to_thread(self.step, memory_step)
+        input_messages, generate_kwargs = model_input
+        try:
+            chat_message = await self._agenerate_with_retries(
+                lambda: self.model.agenerate(input_messages, **generate_kwargs)
+            )
+        except Exception as e:
+            raise AgentGenerationError(f"Error while generating output:\n{e}", self.logger) from e
+        return await asyncio.to_thread(self._process_step_output, memory_step, chat_message)
+
+    def _prepare_step_input(self, memory_step: ActionStep) -> tuple[list[Message], dict[str, Any]] | None:
+        """
+        Records the input messages of the model for the step in `memory_step`, and returns them with the keyword
+        arguments of the model call. None means that the model is called by `step` only.
+        """
+        return None
+
+    def _process_step_output(self, memory_step: ActionStep, chat_message: ChatMessage) -> None | Any:
+        """Processes the output message of the model for the step, and returns the final answer if the step is final."""
+        raise NotImplementedError
+
     def replay(self, detailed: bool = False):
         """Prints a pretty replay of the agent's steps.
 
@@ -679,20 +952,20 @@ You have been provided with these additional arguments, that you can access usin
         pattern = r'<'+tag+r'\s+filename="([^"]+)">(.*?)</'+tag+r'>'
         return re.sub(pattern, "", txt, flags=re.IGNORECASE | re.DOTALL)
         
-    def save_files_from_text(self, txt):
-        files = self.parse_tags('savetofile', txt)
+    def save_files_from_text(self, txt, skip=0):
+        files = self.parse_tags('savetofile', txt)[skip:]
         for file in files:
-              force_directories(file['filename'])
-              with open(file['filename'], 'w') as f:
+              force_directories(resolve_path(file['filename']))
+              with open(writable_path(file['filename']), 'w') as f:
                 f.write(self.replace_include_files(file['content']))
                 msg_str="Saved '"+file['filename']+"' with "+str(get_file_size(file['filename']))+" bytes."
                 self.logger.log(msg_str, LogLevel.INFO)
         return files
 
-    def append_files_from_text(self, txt):
-        files = self.parse_tags('appendtofile', txt)
+    def append_files_from_text(self, txt, skip=0):
+        files = self.parse_tags('appendtofile', txt)[skip:]
         for file in files:
-              with open(file['filename'], 'a') as f:
+              with open(writable_path(file['filename']), 'a') as f:
                 f.write(self.replace_include_files(file['content']))
                 msg_str="Appended '"+file['filename']+"'. Total size: "+str(get_file_size(file['filename']))+" bytes."
                 self.logger.log(msg_str, LogLevel.INFO)
@@ -719,7 +992,7 @@ You have been provided with these additional arguments, that you can access usin
         def replace_with_file_content(match):
             filename = match.group(1).strip()
             try:
-                with open(filename, 'r', encoding='utf-8') as file:
+                with open(resolve_path(filename), 'r', encoding='utf-8') as file:
                     txt = file.read()
                     self.logger.log("Included file "+filename+".", LogLevel.INFO)
                     return txt
@@ -1090,6 +1363,12 @@ class ToolCallingAgent(MultiStepAgent):
         model (`Callable[[list[dict[str, str]]], ChatMessage]`): Model that will generate the agent's actions.
         prompt_templates ([`~agents.PromptTemplates`], *optional*): Prompt templates.
         planning_interval (`int`, *optional*): Interval at which the agent will run a planning step.
+        max_tool_threads (`int`, default `8`): Maximum number of threads running the tool calls of a step, when the model
+            returns several tool calls at once.
+        tool_call_timeout (`float`, *optional*): Time in seconds given to each of several concurrent tool calls once started.
+            A call that times out gets an error as observation, but its thread cannot be stopped and keeps running.
+        stream_outputs (`bool`, *optional*, default `False`): Whether to stream the model outputs. Each tool call is then
+            started as soon as its arguments are complete, while the model is still generating the next calls.
         **kwargs: Additional keyword arguments.
     """
 
@@ -1099,8 +1378,18 @@ class ToolCallingAgent(MultiStepAgent):
         model: Callable[[list[dict[str, str]]], ChatMessage],
         prompt_templates: PromptTemplates | None = None,
         planning_interval: int | None = None,
+        max_tool_threads: int = 8,
+        tool_call_timeout: float | None = None,
+        stream_outputs: bool = False,
         **kwargs,
     ):
+        self.max_tool_threads = max_tool_threads
+        self.tool_call_timeout = tool_call_timeout
+        self.stream_outputs = stream_outputs
+        if self.stream_outputs and not hasattr(model, "generate_stream"):
+            raise ValueError(
+                "`stream_outputs` is set to True, but the model class implements no `generate_stream` method."
+            )
         prompt_templates = prompt_templates or yaml.safe_load(
             importlib.resources.files("smolagents.prompts").joinpath("toolcalling_agent.yaml").read_text()
         )
@@ -1124,38 +1413,112 @@ class ToolCallingAgent(MultiStepAgent):
         Perform one step in the ReAct framework: the agent thinks, acts, and observes the result.
         Returns None if the step is not final.
         """
+        input_messages, _ = self._prepare_step_input(memory_step)
+        if self.stream_outputs:
+            tool_calls, outputs = self._stream_tool_calls(memory_step, input_messages)
+        else:
+            tool_calls, outputs = self._generate_tool_calls(memory_step, input_messages), None
+        return self._execute_step_tool_calls(memory_step, tool_calls, outputs)
+
+    def _prepare_step_input(self, memory_step: ActionStep) -> tuple[list[Message], dict[str, Any]]:
         memory_messages = self.write_memory_to_messages()
 
         input_messages = memory_messages.copy()
 
         # Add new step in logs
-        memory_step.model_input_messages = input_messages
+        memory_step.model_input_messages = self.memory.message_store.add(input_messages)
+        return input_messages, {
+            "stop_sequences": ["Observation:", "Calling tools:"],
+            "tools_to_call_from": list(self.tools.values()),
+        }
 
-        try:
-            chat_message: ChatMessage = self.model(
-                input_messages,
-                stop_sequences=["Observation:", "Calling tools:"],
-                tools_to_call_from=list(self.tools.values()),
+    def _process_step_output(self, memory_step: ActionStep, chat_message: ChatMessage) -> None | Any:
+        self._process_model_output(memory_step, chat_message)
+        return self._execute_step_tool_calls(memory_step, self._make_tool_calls(chat_message), None)
+
+    def _execute_step_tool_calls(
+        self, memory_step: ActionStep, tool_calls: list[ToolCall], outputs: list[Any] | None
+    ) -> None | Any:
+        """Runs the tool calls of the step but those already started (whose `outputs` are given), and returns the
+        final answer if one of them is a call to `final_answer`."""
+        memory_step.model_output = "\n".join(
+            f"Called Tool: '{tool_call.name}' with arguments: {tool_call.arguments}" for tool_call in tool_calls
+        )
+        memory_step.tool_calls = tool_calls
+
+        # Execute
+        final_answer_call = next((tool_call for tool_call in tool_calls if tool_call.name == "final_answer"), None)
+        other_calls = [tool_call for tool_call in tool_calls if tool_call.name != "final_answer"]
+        if len(other_calls) == 1 and outputs is None:
+            tool_arguments = other_calls[0].arguments if other_calls[0].arguments is not None else {}
+            outputs = [self.execute_tool_call(other_calls[0].name, tool_arguments)]
+        elif other_calls and outputs is None:
+            outputs = self.execute_tool_calls(other_calls)
+        if len(other_calls) == 1:
+            if isinstance(outputs[0], AgentError):
+                raise outputs[0]
+            updated_information = self._process_observation(outputs[0])
+        elif other_calls:
+            # The errors of some calls don't discard the others
+            updated_information = self._format_observations(other_calls, outputs)
+        if other_calls:
+            self.logger.log(
+                f"Observations: {updated_information.replace('[', '|')}",  # escape potential rich-tag-like components
+                level=LogLevel.INFO,
             )
-            memory_step.model_output_message = chat_message
-            model_output = chat_message.content
-            self.logger.log_markdown(
-                content=model_output if model_output else str(chat_message.raw),
-                title="Output message of the LLM:",
-                level=LogLevel.DEBUG,
+            memory_step.observations = updated_information
+        if final_answer_call is None:
+            return None
+
+        tool_arguments = final_answer_call.arguments
+        if isinstance(tool_arguments, dict):
+            if "answer" in tool_arguments:
+                answer = tool_arguments["answer"]
+            else:
+                answer = tool_arguments
+        else:
+            answer = tool_arguments
+        if isinstance(answer, str) and answer in self.state.keys():  # if the answer is a state variable, return the value
+            final_answer = self.state[answer]
+            self.logger.log(
+                f"[bold {YELLOW_HEX}]Final answer:[/bold {YELLOW_HEX}] Extracting key '{answer}' from state to return value '{final_answer}'.",
+                level=LogLevel.INFO,
+            )
+        else:
+            final_answer = answer
+            self.logger.log(
+                Text(f"Final answer: {final_answer}", style=f"bold {YELLOW_HEX}"),
+                level=LogLevel.INFO,
             )
 
-            memory_step.model_output_message.content = model_output
-            memory_step.model_output = model_output
-        except Exception as e:
-            raise AgentGenerationError(f"Error while generating output:\n{e}", self.logger) from e
+        memory_step.action_output = final_answer
+        return final_answer
+
+    def _process_model_output(
+        self, memory_step: ActionStep, chat_message: ChatMessage, handled_file_tags: tuple[int, int] = (0, 0)
+    ) -> None:
+        """Records the output message of the model, and handles its file tags but the already `handled_file_tags`."""
+        memory_step.model_output_message = chat_message
+        model_output = chat_message.content
+        self.logger.log_markdown(
+            content=model_output if model_output else str(chat_message.raw),
+            title="Output message of the LLM:",
+            level=LogLevel.DEBUG,
+        )
+        memory_step.model_output = model_output
+        self._handle_file_tags(str(model_output), handled_file_tags)
 
-        model_output = str(model_output)
-        self.save_files_from_text(model_output)
+    def _handle_file_tags(self, model_output: str, handled_file_tags: tuple[int, int] = (0, 0)) -> tuple[int, int]:
+        """
+        Writes the files of the `savetofile` and `appendtofile` tags of the model output, skipping the first
+        `handled_file_tags` tags of each kind. Returns the number of tags of each kind handled so far.
+        """
+        saved_files = self.save_files_from_text(model_output, skip=handled_file_tags[0])
         model_output = self.remove_tags('savetofile', model_output)
-        self.append_files_from_text(model_output)
-        model_output = self.remove_tags('appendtofile', model_output)
+        appended_files = self.append_files_from_text(model_output, skip=handled_file_tags[1])
+        return handled_file_tags[0] + len(saved_files), handled_file_tags[1] + len(appended_files)
 
+    def _make_tool_calls(self, chat_message: ChatMessage) -> list[ToolCall]:
         if chat_message.tool_calls is None or len(chat_message.tool_calls) == 0:
             try:
                 chat_message = self.model.parse_tool_calls(chat_message)
@@ -1164,64 +1527,204 @@ class ToolCallingAgent(MultiStepAgent):
         else:
             for tool_call in chat_message.tool_calls:
                 tool_call.function.arguments = parse_json_if_needed(tool_call.function.arguments)
-        tool_call = chat_message.tool_calls[0]  # type: ignore
-        tool_name, tool_call_id = tool_call.function.name, tool_call.id
-        tool_arguments = tool_call.function.arguments
-        memory_step.model_output = str(f"Called Tool: '{tool_name}' with arguments: {tool_arguments}")
-        memory_step.tool_calls = [ToolCall(name=tool_name, arguments=tool_arguments, id=tool_call_id)]
+        tool_calls = [
+            ToolCall(name=tool_call.function.name, arguments=tool_call.function.arguments, id=tool_call.id)
+            for tool_call in chat_message.tool_calls  # type: ignore
+        ]
+        for tool_call in tool_calls:
+            self._log_tool_call(tool_call)
+        return tool_calls
 
-        # Execute
+    def _log_tool_call(self, tool_call: ToolCall) -> None:
         self.logger.log(
-            Panel(Text(f"Calling tool: '{tool_name}' with arguments: {tool_arguments}")),
+            Panel(Text(f"Calling tool: '{tool_call.name}' with arguments: {tool_call.arguments}")),
             level=LogLevel.INFO,
         )
-        if tool_name == "final_answer":
-            if isinstance(tool_arguments, dict):
-                if "answer" in tool_arguments:
-                    answer = tool_arguments["answer"]
-                else:
-                    answer = tool_arguments
-            else:
-                answer = tool_arguments
-            if (
-                isinstance(answer, str) and answer in self.state.keys()
-            ):  # if the answer is a state variable, return the value
-                final_answer = self.state[answer]
-                self.logger.log(
-                    f"[bold {YELLOW_HEX}]Final answer:[/bold {YELLOW_HEX}] Extracting key '{answer}' from state to return value '{final_answer}'.",
-                    level=LogLevel.INFO,
-                )
-            else:
-                final_answer = answer
-                self.logger.log(
-                    Text(f"Final answer: {final_answer}", style=f"bold {YELLOW_HEX}"),
-                    level=LogLevel.INFO,
+
+    def _generate_tool_calls(self, memory_step: ActionStep, input_messages: list[Message]) -> list[ToolCall]:
+        try:
+            chat_message: ChatMessage = self._generate_with_retries(
+                lambda: self.model(
+                    input_messages,
+                    stop_sequences=["Observation:", "Calling tools:"],
+                    tools_to_call_from=list(self.tools.values()),
                 )
+            )
+        except Exception as e:
+            raise AgentGenerationError(f"Error while generating output:\n{e}", self.logger) from e
+        self._process_model_output(memory_step, chat_message)
+        return self._make_tool_calls(chat_message)
 
-            memory_step.action_output = final_answer
-            return final_answer
-        else:
-            if tool_arguments is None:
-                tool_arguments = {}
-            observation = self.execute_tool_call(tool_name, tool_arguments)
-            observation_type = type(observation)
-            if observation_type in [AgentImage, AgentAudio]:
-                if observation_type == AgentImage:
-                    observation_name = "image.png"
-                elif observation_type == AgentAudio:
-                    observation_name = "audio.mp3"
-                # TODO: observation naming could allow for different names of same type
-
-                self.state[observation_name] = observation
-                updated_information = f"Stored '{observation_name}' in memory."
-            else:
-                updated_information = str(observation).strip()
-            self.logger.log(
-                f"Observations: {updated_information.replace('[', '|')}",  # escape potential rich-tag-like components
-                level=LogLevel.INFO,
+    def _stream_tool_calls(
+        self, memory_step: ActionStep, input_messages: list[Message]
+    ) -> tuple[list[ToolCall], list[Any] | None]:
+        """Streams the model output, starting each tool call but the final answer as soon as its arguments are complete.
+
+        As without streaming, the file tags of the model output are handled before the first tool call starts: only
+        tags streamed after it are handled once the calls are done.
+        Failures of the model are only retried until the stream starts. If the stream fails later, the outputs of the
+        calls already started are recorded in the step before raising the error.
+
+        Returns:
+            `tuple[list[ToolCall], list[Any] | None]`: The tool calls, and the outputs of the calls other than the
+            final answer, or None if the calls were parsed from the text output and are not started yet.
+        """
+
+        def open_stream():
+            stream = self.model.generate_stream(
+                input_messages,
+                stop_sequences=["Observation:", "Calling tools:"],
+                tools_to_call_from=list(self.tools.values()),
             )
-            memory_step.observations = updated_information
-            return None
+            # The request is sent on the first iteration: it is done here so that its failures are retried
+            first_delta = next(stream, None)
+            return stream if first_delta is None else itertools.chain([first_delta], stream)
+
+        try:
+            deltas = self._generate_with_retries(open_stream)
+        except Exception as e:
+            raise AgentGenerationError(f"Error while generating output:\n{e}", self.logger) from e
+
+        content = []
+        assembler = ToolCallStreamAssembler()
+        streamed_calls: list[ToolCall] = []
+        handled_file_tags = (0, 0)
+        stream_errors = []
+
+        def start_calls(chat_tool_calls: list[ChatMessageToolCall]) -> Generator[ToolCall]:
+            nonlocal handled_file_tags
+            for chat_tool_call in chat_tool_calls:
+                tool_call = ToolCall(
+                    name=chat_tool_call.function.name, arguments=chat_tool_call.function.arguments, id=chat_tool_call.id
+                )
+                if not streamed_calls:
+                    handled_file_tags = self._handle_file_tags("".join(content))
+                streamed_calls.append(tool_call)
+                self._log_tool_call(tool_call)
+                if tool_call.name != "final_answer":
+                    yield tool_call
+
+        def completed_calls() -> Generator[ToolCall]:
+            while True:
+                try:
+                    delta = next(deltas, None)
+                except Exception as e:
+                    # The calls already started are left to finish
+                    stream_errors.append(e)
+                    return
+                if delta is None:
+                    break
+                if delta.content:
+                    content.append(delta.content)
+                yield from start_calls(assembler.add(delta.tool_call_fragments))
+            yield from start_calls(assembler.flush())
+
+        outputs = self.execute_tool_calls(completed_calls())
+        chat_message = ChatMessage(
+            role="assistant", content="".join(content) or None, tool_calls=assembler.tool_calls or None
+        )
+        self._process_model_output(memory_step, chat_message, handled_file_tags)
+        if stream_errors:
+            memory_step.tool_calls = streamed_calls or None
+            started_calls = [tool_call for tool_call in streamed_calls if tool_call.name != "final_answer"]
+            if started_calls:
+                memory_step.observations = self._format_observations(started_calls, outputs)
+            error = stream_errors[0]
+            raise AgentGenerationError(f"Error while generating output:\n{error}", self.logger) from error
+        if not streamed_calls:
+            return self._make_tool_calls(chat_message), None
+        return streamed_calls, outputs
+
+    def _format_observations(self, tool_calls: list[ToolCall], outputs: list[Any]) -> str:
+        """Returns the observations of parallel tool calls, with their errors, in the order of the calls."""
+        return "\n".join(
+            f"Call id: {tool_call.id}\n"
+            + (f"Error: {output.message}" if isinstance(output, AgentError) else self._process_observation(output))
+            for tool_call, output in zip(tool_calls, outputs)
+        )
+
+    def _process_observation(self, observation: Any) -> str:
+        """Returns the observation of a tool output, storing images and audio in the state."""
+        observation_type = type(observation)
+        if observation_type in [AgentImage, AgentAudio]:
+            if observation_type == AgentImage:
+                observation_name = "image.png"
+            elif observation_type == AgentAudio:
+                observation_name = "audio.mp3"
+            # TODO: observation naming could allow for different names of same type
+
+            self.state[observation_name] = observation
+            return f"Stored '{observation_name}' in memory."
+        return str(observation).strip()
+
+    def _get_remaining_time(self, started_time: float | None) -> float:
+        if started_time is None:
+            return self.tool_call_timeout
+        return max(started_time + self.tool_call_timeout - time.monotonic(), 0)
+
+    def execute_tool_calls(self, tool_calls: Iterable[ToolCall]) -> list[Any]:
+        """
+        Executes tool calls concurrently, in at most `max_tool_threads` threads.
+        Calls to the same managed agent run one after the other, in the order of the calls: a managed agent keeps its
+        memory between its runs.
+
+        Args:
+            tool_calls (`Iterable[ToolCall]`): Tool calls to execute. Each call is started as soon as the iterable
+                produces it, e.g. while the model is still streaming the next calls.
+
+        Returns:
+            `list[Any]`: The output of each tool call in the order of the calls, or the `AgentError` it raised.
+        """
+        started_times = {}
+
+        def execute(index: int, tool_call: ToolCall, previous_call: Future | None) -> Any:
+            if previous_call is not None:
+                futures_wait([previous_call])
+            started_times[index] = time.monotonic()
+            return self.execute_tool_call(tool_call.name, tool_call.arguments if tool_call.arguments is not None else {})
+
+        max_workers = min(self.max_tool_threads, len(tool_calls)) if isinstance(tool_calls, list) else self.max_tool_threads
+        executor = ThreadPoolExecutor(max_workers=max(max_workers, 1))
+        try:
+            submitted_calls, futures = [], []
+            # Last call submitted to each managed agent
+            managed_agent_calls: dict[str, Future] = {}
+            for index, tool_call in enumerate(tool_calls):
+                submitted_calls.append(tool_call)
+                previous_call = managed_agent_calls.get(tool_call.name)
+                # Each call runs in its own copy of the caller's context, e.g. its `bp_utils.working_dir`
+                future = executor.submit(contextvars.copy_context().run, execute, index, tool_call, previous_call)
+                if tool_call.name in self.managed_agents:
+                    managed_agent_calls[tool_call.name] = future
+                futures.append(future)
+            outputs = []
+            for index, (tool_call, future) in enumerate(zip(submitted_calls, futures)):
+                try:
+                    if self.tool_call_timeout is None:
+                        outputs.append(future.result())
+                        continue
+                    # A call waiting for a free thread gets at most the timeout to start, then the timeout to run
+                    was_started = index in started_times
+                    try:
+                        outputs.append(future.result(timeout=self._get_remaining_time(started_times.get(index))))
+                    except FutureTimeoutError:
+                        if was_started or index not in started_times:
+                            raise
+                        outputs.append(future.result(timeout=self._get_remaining_time(started_times[index])))
+                except FutureTimeoutError:
+                    future.cancel()
+                    outputs.append(
+                        AgentToolExecutionError(
+                            f"Tool call '{tool_call.name}' timed out after {self.tool_call_timeout} seconds.",
+                            self.logger,
+                        )
+                    )
+                except AgentError as e:
+                    outputs.append(e)
+            return outputs
+        finally:
+            # Threads of timed out calls are not waited for
+            executor.shutdown(wait=False)
 
     def _substitute_state_variables(self, arguments: dict[str, str] | str) -> dict[str, Any] | str:
         """Replace string values in arguments with their corresponding state values if they exist."""
@@ -1308,7 +1811,8 @@ class CodeAgent(MultiStepAgent):
         grammar (`dict[str, str]`, *optional*): Grammar used to parse the LLM output.
         additional_authorized_imports (`list[str]`, *optional*): Additional authorized imports for the agent.
         planning_interval (`int`, *optional*): Interval at which the agent will run a planning step.
-        executor_type (`str`, default `"local"`): Which executor type to use between `"local"`, `"e2b"`, or `"docker"`.
+        executor_type (`str`, default `"exec"`): Which executor type to use between `"local"`, `"exec"`, `"exec_process"`, `"e2b"`, or `"docker"`.
+            `"exec_process"` runs code in a worker process from a pool, see `ProcessExecExecutor`.
         executor_kwargs (`dict`, *optional*): Additional arguments to pass to initialize the executor.
         max_print_outputs_length (`int`, *optional*): Maximum length of the print outputs.
         stream_outputs (`bool`, *optional*, default `False`): Whether to stream outputs during execution.
@@ -1368,6 +1872,9 @@ class CodeAgent(MultiStepAgent):
                     return DockerExecutor(self.additional_authorized_imports, self.logger, **self.executor_kwargs)
                 elif self.executor_type == "exec":
                     return LocalExecExecutor(self.additional_authorized_imports, self.logger, **self.executor_kwargs)
+            case "exec_process":
+                # Tools and managed agents stay in this process and are called from the worker through proxies
+                return ProcessExecExecutor(self.additional_authorized_imports, self.logger, **self.executor_kwargs)
             case "local":
                 return LocalPythonExecutor(
                     self.additional_authorized_imports,
@@ -1376,6 +1883,21 @@ class CodeAgent(MultiStepAgent):
             case _:  # if applicable
                 raise ValueError(f"Unsupported executor type: {self.executor_type}")
 
+    def _restore_executor_state(self):
+        for step in self.memory.steps:
+            if not isinstance(step, ActionStep) or not step.tool_calls or step.tool_calls[0].name != "python_interpreter":
+                continue
+            # Same substitutions as in `step`, without writing the files of the model output again
+            code_action = step.tool_calls[0].arguments
+            code_action = self.replace_include_tags(code_action, self.parse_tags("savetofile", step.model_output or ""))
+            code_action = self.replace_append_tags(code_action, self.parse_tags("appendtofile", step.model_output or ""))
+            code_action = self.replace_include_files(code_action)
+            try:
+                self.python_executor(code_action)
+            except Exception:
+                # The step failed in the original run too, its error is already in memory
+                pass
+
     def initialize_system_prompt(self) -> str:
         system_prompt = populate_template(
             self.prompt_templates["system_prompt"],
@@ -1396,61 +1918,45 @@ class CodeAgent(MultiStepAgent):
         Perform one step in the ReAct framework: the agent thinks, acts, and observes the result.
         Returns None if the step is not final.
         """
-        memory_messages = self.write_memory_to_messages()
-
-        input_messages = memory_messages.copy()
         ### Generate model output ###
-        memory_step.model_input_messages = input_messages
+        input_messages, generate_kwargs = self._prepare_step_input(memory_step)
         try:
-            additional_args = {"grammar": self.grammar} if self.grammar is not None else {}
-            retry_cnt = 0
-            success_flag = False
-            MAX_TRIES = 3
-            while (retry_cnt < MAX_TRIES) and (not success_flag):
-                retry_cnt = retry_cnt + 1
-                try:
-                    if self.stream_outputs:
-                        output_stream = self.model.generate_stream(
-                            input_messages,
-                            stop_sequences=["</runcode>","Calling tools:"],
-                            **additional_args,
-                        )
-                        output_text = ""
-                        with Live("", console=self.logger.console, vertical_overflow="visible") as live:
-                            for event in output_stream:
-                                if event.content is not None:
-                                    output_text += event.content
-                                    live.update(Markdown(output_text))
-
-                        model_output = output_text
-                        chat_message = ChatMessage(role="assistant", content=model_output)
-                        memory_step.model_output_message = chat_message
-                        model_output = chat_message.content
-                    else:
-                        chat_message: ChatMessage = self.model(
-                            input_messages,
-                            stop_sequences=["</runcode>","Calling tools:"],
-                            **additional_args,
-                        )
-                        memory_step.model_output_message = chat_message
-                        model_output = chat_message.content
-                    success_flag = True
-                except:
-                    if (retry_cnt == MAX_TRIES):
-                        raise
-                    else:
-                        time.sleep(30)
-
-            # This adds <end_code> sequence to the history.
-            # This will nudge ulterior LLM calls to finish with <end_code>, thus efficiently stopping generation.
-            # if model_output and str(model_output).strip().endswith("```"):
-            #     model_output += "<end_code>"
-            #     memory_step.model_output_message.content = model_output
-
-            memory_step.model_output = model_output
+
+            def generate() -> ChatMessage:
+                if self.stream_outputs:
+                    output_stream = self.model.generate_stream(input_messages, **generate_kwargs)
+                    with self.logger.stream_markdown() as renderer:
+                        for event in output_stream:
+                            if event.content is not None:
+                                renderer.update(event.content)
+                    return ChatMessage(role="assistant", content=renderer.text)
+                return self.model(input_messages, **generate_kwargs)
+
+            chat_message = self._generate_with_retries(generate)
         except Exception as e:
             raise AgentGenerationError(f"Error in generating model output:\n{e}", self.logger) from e
-        
+        return self._process_step_output(memory_step, chat_message)
+
+    def _prepare_step_input(self, memory_step: ActionStep) -> tuple[list[Message], dict[str, Any]]:
+        memory_messages = self.write_memory_to_messages()
+
+        input_messages = memory_messages.copy()
+        memory_step.model_input_messages = self.memory.message_store.add(input_messages)
+        additional_args = {"grammar": self.grammar} if self.grammar is not None else {}
+        return input_messages, {"stop_sequences": ["</runcode>","Calling tools:"], **additional_args}
+
+    def _process_step_output(self, memory_step: ActionStep, chat_message: ChatMessage) -> None | Any:
+        memory_step.model_output_message = chat_message
+        model_output = chat_message.content
+
+        # This adds <end_code> sequence to the history.
+        # This will nudge ulterior LLM calls to finish with <end_code>, thus efficiently stopping generation.
+        # if model_output and str(model_output).strip().endswith("```"):
+        #     model_output += "<end_code>"
+        #     memory_step.model_output_message.content = model_output
+
+        memory_step.model_output = model_output
+
         str_len = 0
         str_len_str = '0'
 
@@ -5,9 +5,45 @@ from .monitoring import LogLevel
 import io
 import contextlib
 import base64
+import importlib
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+import time
+import traceback
+import types
+from collections.abc import Callable
 from io import BytesIO
 import PIL.Image
-from .utils import AgentError
+from functools import lru_cache
+from .utils import AgentError, CaptureBuffer
+
+COMPILE_CACHE_SIZE = 128
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_code(code: str):
+    """
+    Compiles code for exec(), reusing the code object of a previous call with the same code.
+    Use `compile_code.cache_info()` to get the hit and miss counters of the cache.
+    """
+    return compile(code, "<string>", "exec")
+
+
+def wrap_code_action(code: str) -> str:
+    """Wraps a code action so that final_answer() and the last value `_` are captured into globals."""
+    return f"""
+_final_answer = None
+_last_value = None
+def final_answer(pfinal):
+    global _final_answer
+    _final_answer = pfinal
+{code}
+if '_' in locals():
+    _last_value = _
+"""
+
 
 class LocalExecExecutor(RemotePythonExecutor):
     """
@@ -147,7 +183,7 @@ except ImportError:
     pass
 """
         try:
-            exec(setup_code, self.globals_dict)
+            exec(compile_code(setup_code), self.globals_dict)
             # self.logger.log("Matplotlib hooks configured for graphics capture", level=LogLevel.INFO)
         except Exception as e:
             self.logger.log(f"Failed to configure matplotlib hooks: {e}", level=LogLevel.WARNING)
@@ -175,21 +211,12 @@ except ImportError:
         if self.capture_graphics:
             self._setup_matplotlib_hook()
         
-        # Create buffers for stdout and stderr
-        stdout_buffer = io.StringIO()
-        stderr_buffer = io.StringIO()
+        # Create buffers for stdout and stderr, keeping only the head and the tail of long outputs
+        stdout_buffer = CaptureBuffer()
+        stderr_buffer = CaptureBuffer()
         
         locals_dict = None
-        wrapped_code = f"""
-_final_answer = None
-_last_value = None
-def final_answer(pfinal):
-    global _final_answer
-    _final_answer = pfinal
-{code}
-if '_' in locals():
-    _last_value = _
-"""
+        wrapped_code = wrap_code_action(code)
         # print(wrapped_code)
         
         # Execute the code, capturing stdout and stderr
@@ -198,7 +225,7 @@ if '_' in locals():
                 # Add special handling for Jupyter-style last expression value
                 # Wrap the code to capture the last expression value
                 # Execute the code
-                exec(wrapped_code, self.globals_dict, locals_dict)                
+                exec(compile_code(wrapped_code), self.globals_dict, locals_dict)
             except Exception as e:
                 # Get the traceback
                 import traceback
@@ -226,3 +253,414 @@ if '_' in locals():
         #    raise AgentError("No result was returned from the code execution", self.logger)
         
         return self.globals_dict['_final_answer'], logs, is_final_answer
+
+
+class _WorkerStream(io.TextIOBase):
+    """
+    File-like object replacing sys.stdout in a worker process: writes are sent back to the executor in chunks,
+    flushed at least every `flush_interval` seconds when a line ends, or when `max_buffer_size` is reached.
+    """
+
+    def __init__(self, connection, flush_interval: float = 0.1, max_buffer_size: int = 4096):
+        self.connection = connection
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max_buffer_size
+        self.chunks = []
+        self.buffer_size = 0
+        self.last_flush_time = time.monotonic()
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if text:
+            self.chunks.append(text)
+            self.buffer_size += len(text)
+            if self.buffer_size >= self.max_buffer_size or (
+                "\n" in text and time.monotonic() - self.last_flush_time >= self.flush_interval
+            ):
+                self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.chunks:
+            self.connection.send(("stdout", "".join(self.chunks)))
+            self.chunks = []
+            self.buffer_size = 0
+        self.last_flush_time = time.monotonic()
+
+
+class _ToolProxy:
+    """Callable standing for a tool in a worker process: calls are run by the executor in the agent's process."""
+
+    def __init__(self, connection, name: str):
+        self.connection = connection
+        self.name = name
+
+    def __call__(self, *args, **kwargs):
+        sys.stdout.flush()
+        self.connection.send(("call_tool", self.name, args, kwargs))
+        is_success, value = self.connection.recv()
+        if not is_success:
+            raise value
+        return value
+
+
+def _picklable_variables(globals_dict: dict) -> dict:
+    variables = {}
+    for name, value in globals_dict.items():
+        if name.startswith("_") or isinstance(value, (types.ModuleType, _ToolProxy)):
+            continue
+        try:
+            pickle.dumps(value)
+        except Exception:
+            continue
+        variables[name] = value
+    return variables
+
+
+def _exec_worker_main(connection, preload_modules: list[str], memory_limit_mb: int | None):
+    """Main loop of a worker process of `ExecWorkerPool`."""
+    if memory_limit_mb is not None:
+        import resource
+
+        memory_limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    for module_name in preload_modules:
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            pass
+    globals_dict = {"_last_value": None, "_final_answer": None}
+    stdout = _WorkerStream(connection)
+    connection.send(("ready",))
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            break
+        command = message[0]
+        if command == "stop":
+            break
+        elif command == "chdir":
+            os.makedirs(message[1], exist_ok=True)
+            os.chdir(message[1])
+        elif command == "set_variables":
+            globals_dict.update(message[1])
+        elif command == "get_variables":
+            connection.send(("variables", _picklable_variables(globals_dict)))
+        elif command == "run":
+            _, code, tool_names = message
+            for tool_name in tool_names:
+                globals_dict[tool_name] = _ToolProxy(connection, tool_name)
+            stderr_buffer = CaptureBuffer()
+            try:
+                with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr_buffer):
+                    exec(compile_code(wrap_code_action(code)), globals_dict)
+            except Exception as e:
+                stdout.flush()
+                connection.send(("error", f"Error executing code: {str(e)}\n{traceback.format_exc()}"))
+                continue
+            stdout.flush()
+            final_answer = globals_dict["_final_answer"]
+            try:
+                pickle.dumps(final_answer)
+            except Exception:
+                final_answer = str(final_answer)
+            connection.send(
+                ("done", final_answer, str(globals_dict["_last_value"]), stderr_buffer.getvalue())
+            )
+
+
+class ExecWorker:
+    """
+    A worker process of `ExecWorkerPool`, running the code actions of one `ProcessExecExecutor` at a time.
+
+    Args:
+        context (`multiprocessing.context.BaseContext`): Multiprocessing context used to start the process.
+        preload_modules (`list[str]`): Modules imported when the process starts.
+        memory_limit_mb (`int`, *optional*): Address space limit of the process, in MiB.
+    """
+
+    def __init__(self, context, preload_modules: list[str], memory_limit_mb: int | None = None):
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(
+            target=_exec_worker_main, args=(worker_connection, preload_modules, memory_limit_mb), daemon=True
+        )
+        self.process.start()
+        worker_connection.close()
+        self.calls = 0
+        self.is_ready = False
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def wait_ready(self):
+        """Waits until the process has started and imported the preloaded modules."""
+        if not self.is_ready:
+            self.connection.recv()
+            self.is_ready = True
+
+    def stop(self, timeout: float = 1.0):
+        try:
+            self.connection.send(("stop",))
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+DEFAULT_PRELOAD_MODULES = ["json", "math", "re", "numpy", "pandas"]
+
+
+class ExecWorkerPool:
+    """
+    Pool of warm worker processes for `ProcessExecExecutor`: processes are started ahead of time with commonly used
+    modules already imported, so that starting an executor does not pay for interpreter start-up and imports.
+
+    A worker holds the variables of the executor using it, so it is never handed to another executor: released
+    workers are stopped, and the pool starts new ones in the background to keep `size` idle workers ready.
+    The pool is thread-safe and can be shared by all the agents of a process.
+
+    Args:
+        size (`int`, default `2`): Number of idle workers to keep ready.
+        preload_modules (`list[str]`, *optional*): Modules imported by workers when they start.
+        memory_limit_mb (`int`, *optional*): Address space limit of each worker, in MiB. Code actions exceeding it
+            fail with a `MemoryError` or kill their worker, without affecting the agent's process. Unix only.
+        start_method (`str`, default `"spawn"`): Multiprocessing start method. `"spawn"` is safe to use from
+            multi-threaded programs but, as with any use of multiprocessing, scripts must then guard their entry point
+            with `if __name__ == "__main__":`. `"fork"` starts workers faster.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        preload_modules: list[str] | None = None,
+        memory_limit_mb: int | None = None,
+        start_method: str = "spawn",
+    ):
+        self.size = size
+        self.preload_modules = preload_modules if preload_modules is not None else DEFAULT_PRELOAD_MODULES
+        self.memory_limit_mb = memory_limit_mb
+        self.context = multiprocessing.get_context(start_method)
+        self._idle_workers: list[ExecWorker] = []
+        self._starting_workers = 0
+        self._lock = threading.Lock()
+        self.fill()
+
+    def _new_worker(self) -> ExecWorker:
+        return ExecWorker(self.context, self.preload_modules, self.memory_limit_mb)
+
+    def fill(self):
+        """Starts workers until `size` workers are idle."""
+        while True:
+            with self._lock:
+                if len(self._idle_workers) + self._starting_workers >= self.size:
+                    return
+                self._starting_workers += 1
+            try:
+                worker = self._new_worker()
+            finally:
+                with self._lock:
+                    self._starting_workers -= 1
+            with self._lock:
+                self._idle_workers.append(worker)
+
+    def acquire(self) -> ExecWorker:
+        """Returns a worker for the exclusive use of the caller, who must give it back with `release`."""
+        with self._lock:
+            worker = self._idle_workers.pop() if self._idle_workers else None
+        if worker is None or not worker.is_alive():
+            worker = self._new_worker()
+        threading.Thread(target=self.fill, daemon=True).start()
+        return worker
+
+    def release(self, worker: ExecWorker):
+        worker.stop()
+
+    def shutdown(self):
+        """Stops the idle workers."""
+        with self._lock:
+            workers, self._idle_workers = self._idle_workers, []
+        for worker in workers:
+            worker.stop()
+
+
+_default_exec_worker_pool = None
+_default_exec_worker_pool_lock = threading.Lock()
+
+
+def get_default_exec_worker_pool() -> ExecWorkerPool:
+    """Returns the process-wide `ExecWorkerPool` used by executors created without a pool."""
+    global _default_exec_worker_pool
+    with _default_exec_worker_pool_lock:
+        if _default_exec_worker_pool is None:
+            _default_exec_worker_pool = ExecWorkerPool()
+        return _default_exec_worker_pool
+
+
+class ProcessExecExecutor(RemotePythonExecutor):
+    """
+    Executes Python code with exec() in a separate worker process taken from an `ExecWorkerPool`.
+
+    Like `LocalExecExecutor`, variables persist across code actions, but a long-running, crashing or leaking
+    code action cannot block or kill the agent's process. Tools (and managed agents) stay in the agent's process:
+    the worker calls them through proxies, so their arguments and return values must be picklable.
+    Stdout is streamed back while the code runs.
+
+    WARNING: This executor is NOT a sandbox. Code runs with the permissions of the current user.
+
+    Args:
+        additional_imports (`list[str]`): Additional packages to install.
+        logger (`Logger`): Logger to use.
+        pool (`ExecWorkerPool`, *optional*): Pool to take the worker from. Defaults to a process-wide pool.
+        timeout (`float`, *optional*): Maximum duration of a code action in seconds, not counting time spent in
+            tool calls. On timeout, the worker is killed and replaced by a new one, losing the variables.
+        max_calls_per_worker (`int`, *optional*): Number of code actions after which the worker is replaced by a
+            fresh one, to reclaim leaked memory. Variables that can be pickled are carried over to the new worker.
+        working_dir (`str`, *optional*): Working directory of the worker process, created if needed.
+        stdout_callback (`Callable[[str], None]`, *optional*): Called with each chunk of stdout as it arrives.
+        **kwargs: Additional configuration parameters.
+    """
+
+    def __init__(
+        self,
+        additional_imports: list[str],
+        logger,
+        pool: ExecWorkerPool | None = None,
+        timeout: float | None = None,
+        max_calls_per_worker: int | None = None,
+        working_dir: str | None = None,
+        stdout_callback: Callable[[str], None] | None = None,
+        **kwargs,
+    ):
+        super().__init__(additional_imports, logger)
+        self.pool = pool or get_default_exec_worker_pool()
+        self.timeout = timeout
+        self.max_calls_per_worker = max_calls_per_worker
+        self.working_dir = os.path.abspath(working_dir) if working_dir is not None else None
+        self.stdout_callback = stdout_callback
+        self.tools = {}
+        self.variables = {}
+        self.worker = None
+        self._start_worker()
+
+    def _start_worker(self, variables: dict | None = None):
+        self.worker = self.pool.acquire()
+        # Wait for the worker to be up, so that its start-up time does not count in the timeout of code actions
+        self.worker.wait_ready()
+        if self.working_dir is not None:
+            self.worker.connection.send(("chdir", self.working_dir))
+        if variables:
+            self.worker.connection.send(("set_variables", variables))
+
+    def _replace_worker(self, variables: dict | None = None):
+        self.pool.release(self.worker)
+        self._start_worker(variables)
+
+    def _recycle_worker(self):
+        self.worker.connection.send(("get_variables",))
+        _, variables = self._receive(deadline=None)
+        self.logger.log(f"Recycling the worker process after {self.worker.calls} code actions.", level=LogLevel.DEBUG)
+        self._replace_worker(variables)
+
+    def _receive(self, deadline: float | None) -> tuple:
+        connection = self.worker.connection
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            if connection.poll(timeout):
+                return connection.recv()
+        except (EOFError, OSError):
+            self._replace_worker(self.variables)
+            raise AgentError(
+                "The worker process running the code died, e.g. because it exceeded its memory limit. "
+                "It was replaced by a new one: variables defined so far were lost.",
+                self.logger,
+            )
+        self.worker.process.kill()
+        self._replace_worker(self.variables)
+        raise AgentError(
+            f"Code execution timed out after {self.timeout} seconds. "
+            "The worker process was replaced by a new one: variables defined so far were lost.",
+            self.logger,
+        )
+
+    def _call_tool(self, tool_name: str, args: tuple, kwargs: dict) -> bytes:
+        """Calls a tool for the worker, returns the pickled `(is_success, value)` reply to send back to it."""
+        try:
+            result = self.tools[tool_name](*args, **kwargs)
+        except Exception as e:
+            try:
+                return pickle.dumps((False, e))
+            except Exception:
+                return pickle.dumps((False, RuntimeError(f"{type(e).__name__}: {e}")))
+        # The reply is pickled here rather than by `send`, so that the worker waiting for it always gets one
+        try:
+            return pickle.dumps((True, result))
+        except Exception as e:
+            return pickle.dumps(
+                (False, RuntimeError(f"Tool '{tool_name}' returned an unpicklable value: {type(e).__name__}: {e}"))
+            )
+
+    def __call__(self, code_action: str) -> tuple[Any, str, bool]:
+        """Runs the code action, returns its final answer if any, the logs and whether it was a final answer"""
+        return self.run_code_raise_errors(code_action)
+
+    def run_code_raise_errors(self, code: str, return_final_answer: bool = False) -> tuple[Any, str, bool]:
+        if self.max_calls_per_worker is not None and self.worker.calls >= self.max_calls_per_worker:
+            self._recycle_worker()
+        self.worker.calls += 1
+        self.worker.connection.send(("run", code, list(self.tools)))
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        stdout_buffer = CaptureBuffer()
+        while True:
+            message = self._receive(deadline)
+            if message[0] == "stdout":
+                stdout_buffer.write(message[1])
+                if self.stdout_callback is not None:
+                    self.stdout_callback(message[1])
+            elif message[0] == "call_tool":
+                start_time = time.monotonic()
+                self.worker.connection.send_bytes(self._call_tool(*message[1:]))
+                if deadline is not None:
+                    deadline += time.monotonic() - start_time
+            elif message[0] == "error":
+                raise AgentError(stdout_buffer.getvalue() + message[1], self.logger)
+            else:  # "done"
+                _, final_answer, last_value, stderr_content = message
+                break
+
+        logs = stdout_buffer.getvalue()
+        logs += "\nLast value:\n" + last_value
+        if stderr_content:
+            logs += "\nStderr:\n" + stderr_content
+        return final_answer, logs, final_answer is not None
+
+    def send_tools(self, tools: dict[str, Tool]):
+        self.tools = tools
+
+    def send_variables(self, variables: dict):
+        self.variables = {}
+        for name, value in variables.items():
+            try:
+                pickle.dumps(value)
+                self.variables[name] = value
+            except Exception:
+                self.logger.log(f"Variable '{name}' cannot be pickled: it is not sent to the worker process.")
+        self.worker.connection.send(("set_variables", self.variables))
+
+    def install_packages(self, additional_imports: list[str]):
+        return []
+
+    def cleanup(self):
+        """Gives the worker process back to the pool, which stops it."""
+        if self.worker is not None:
+            self.pool.release(self.worker)
+            self.worker = None
+
+    def delete(self):
+        """Ensure cleanup on deletion."""
+        self.cleanup()
@@ -3,6 +3,8 @@ from .bp_tools import *
 from .bp_utils import *
 from .agents import *
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 
 STEP_CALLBACKS = []
 
@@ -181,6 +183,105 @@ final_answer('I have finished the task. YAY!')
 </runcode>
 </example>
 """
+def run_branches(branches, get_agent, local_agent=None, concurrent=False, branches_folder='.branches',
+  append_only_files=('advices.notes',)):
+  """
+  Runs independent branches of work, given as tuples (name, function, input_paths, output_paths).
+  Each function receives the agent it works with.
+
+  When concurrent is False, the branches run one after the other in the current working directory,
+  all with local_agent (or with a single new agent from get_agent(None) if local_agent is None).
+
+  When concurrent is True, each branch runs in its own thread, with its own agent from get_agent(folder)
+  and in its own working directory branches_folder/name: input_paths (files or folders) are copied
+  into it before starting, and output_paths are copied back once all branches have finished.
+  Text appended by the branches to append_only_files is appended to the original files.
+  If branches raised exceptions, the first one is raised once the outputs of the other branches
+  have been copied back.
+  """
+  if not concurrent:
+    if local_agent is None:
+      local_agent = get_agent(None)
+    for name, function, input_paths, output_paths in branches:
+      function(local_agent)
+    return
+  original_contents = {filename: load_string_from_file(filename) for filename in append_only_files}
+  branch_folders = {}
+  for name, function, input_paths, output_paths in branches:
+    branch_folder = os.path.abspath(resolve_path(os.path.join(branches_folder, name)))
+    if os.path.isdir(branch_folder):
+      shutil.rmtree(branch_folder)
+    os.makedirs(branch_folder)
+    for path in list(input_paths) + list(append_only_files):
+      copy_path(path, os.path.join(branch_folder, path))
+    branch_folders[name] = branch_folder
+
+  def run_branch(name, function):
+    with working_dir(branch_folders[name]) as branch_folder:
+      branch_agent = get_agent(branch_folder)
+      try:
+        function(branch_agent)
+      finally:
+        if hasattr(branch_agent.python_executor, 'cleanup'):
+          branch_agent.python_executor.cleanup()
+
+  with ThreadPoolExecutor(max_workers=len(branches)) as executor:
+    futures = [executor.submit(run_branch, name, function) for name, function, _, _ in branches]
+  errors = []
+  for future, (name, function, input_paths, output_paths) in zip(futures, branches):
+    if future.exception() is not None:
+      errors.append(future.exception())
+      continue
+    for path in output_paths:
+      copy_path(os.path.join(branch_folders[name], path), path)
+    for filename in append_only_files:
+      content = load_string_from_file(os.path.join(branch_folders[name], filename))
+      if content.startswith(original_contents[filename]) and len(content) > len(original_contents[filename]):
+        append_string_to_file(content[len(original_contents[filename]):], filename)
+  if errors:
+    raise errors[0]
+
+def get_branch_executor(executor_type, branch_folder=None):
+  """
+  Returns the executor type and executor kwargs for an agent working in branch_folder.
+  exec() runs code in this process, where stdout and the working directory are shared by all threads:
+  agents of parallel branches use 'exec_process' instead, with the branch folder as working directory.
+  """
+  if branch_folder is None or os.path.abspath(branch_folder) == os.getcwd():
+    return executor_type, None
+  if executor_type == 'exec':
+    executor_type = 'exec_process'
+  if executor_type == 'exec_process':
+    return executor_type, {'working_dir': branch_folder}
+  return executor_type, None
+
+def keep_best_solution(workspace, selected_solution, best_solution, solutions, edited_solutions=()):
+  """
+  Takes the snapshot best_solution of the folder selected_solution, points best_solution/ to it
+  (see Workspace.promote) and checks it out into the folders of solutions.
+  Only the folders of edited_solutions get copies of the files: the other folders share them with
+  the snapshot until they are written through the file tools or file tags.
+  """
+  workspace.snapshot(selected_solution, best_solution)
+  workspace.promote(best_solution, 'best_solution')
+  for solution in solutions:
+    workspace.checkout(best_solution, solution, shared=solution not in edited_solutions)
+
+def run_in_workspace(solver):
+  """
+  Decorator running solver with its workspace argument (a Workspace, a folder or None for the
+  current folder) as the working directory of the current thread. Several solvers can then run
+  in the same process, each in its own workspace.
+  """
+  @wraps(solver)
+  def wrapper(*args, workspace=None, **kwargs):
+    if not isinstance(workspace, Workspace):
+      workspace = Workspace(workspace or '.')
+    with workspace.activate():
+      return solver(*args, workspace=workspace, **kwargs)
+  return wrapper
+
+@run_in_workspace
 def evolutive_problem_solver(p_coder_model,
   task_str,
   agent_steps:int,
@@ -193,9 +294,19 @@ def evolutive_problem_solver(p_coder_model,
   add_base_tools=True,
   step_callbacks=STEP_CALLBACKS,
   log_level = LogLevel.DEBUG,
-  refine = True
+  refine = True,
+  concurrent = False,
+  workspace = None
   ):
-  def get_local_agent():
+  """
+  When concurrent is True, the 3 initial solutions and the 2 improvement alternatives of each
+  generation are produced in parallel, each by its own agent in its own working folder (see run_branches).
+  Files are read and written in workspace (a Workspace or a folder), the current folder by default.
+  Agents that do not run concurrently keep executor_type: with 'exec', only their file tools and file tags
+  follow workspace, code opening files directly runs in the current folder of the process.
+  """
+  def get_local_agent(branch_folder=None):
+    local_executor_type, executor_kwargs = get_branch_executor(executor_type, branch_folder)
     coder_agent = CodeAgent(
       tools=tools,
       model=p_coder_model,
@@ -203,7 +314,8 @@ def evolutive_problem_solver(p_coder_model,
       add_base_tools=add_base_tools,
       max_steps=agent_steps,
       step_callbacks=step_callbacks,
-      executor_type=executor_type
+      executor_type=local_executor_type,
+      executor_kwargs=executor_kwargs
       ) # , planning_interval=3
     coder_agent.set_system_prompt(system_prompt)
     coder_agent.logger.log_level = log_level
@@ -244,14 +356,14 @@ with any advice that you would like to give to yourself to a future version of y
       " Please, try to produce a solution that is as extensive, detailed and rich as you can." + \
       " Feel free to show your intelligence with no restrains. It is the time for you to show the world your full power." + \
       " Feel free to use your creativity and true hidden skills."
+  def generate_solution(solution_name):
+    def branch(local_agent):
+      local_agent.run(local_task_description + motivation + ' Save the solution into the file '+solution_name+fileext, reset=True)
+      if refine: test_and_refine(local_agent, solution_name+fileext)
+    return (solution_name, branch, [], [solution_name+fileext])
+
   if start_now:
-    local_agent = get_local_agent()
-    local_agent.run(local_task_description + motivation + ' Save the solution into the file solution1'+fileext, reset=True)
-    if refine: test_and_refine(local_agent, 'solution1'+fileext)
-    local_agent.run(local_task_description + motivation + ' Save the solution into the file solution2'+fileext, reset=True)
-    if refine: test_and_refine(local_agent, 'solution2'+fileext)
-    local_agent.run(local_task_description + motivation + ' Save the solution into the file solution3'+fileext, reset=True)
-    if refine: test_and_refine(local_agent, 'solution3'+fileext)
+    run_branches([generate_solution(solution_name) for solution_name in valid_solutions], get_local_agent, concurrent=concurrent)
   for i in range(steps):
     try:
       local_agent = get_local_agent()
@@ -316,12 +428,13 @@ If you believe that the solution 3 is the best, you'll call the function final_a
         if i<steps-1:
           # the past best solution is always the solution3.py
           # !cp best_solution.py solution3.py
-          shutil.copyfile('best_solution.best', 'solution3'+fileext)
-          shutil.copyfile('best_solution.best', 'best_solution_'+str(i)+fileext)
-          for alternatives_cnt in range(2):
+          copy_file('best_solution.best', 'solution3'+fileext)
+          copy_file('best_solution.best', 'best_solution_'+str(i)+fileext)
+          def improve_solution(alternatives_cnt):
             solution_cnt = alternatives_cnt+1
             solution_file = 'solution'+str(solution_cnt)+fileext
-            task_description=""" Hello super-intelligence!
+            def branch(local_agent):
+              task_description=""" Hello super-intelligence!
 """+local_task_description+"""'.
 The current solution for this task is enclosed in the tags <solution></solution>:
 <solution>"""+load_string_from_file('best_solution.best')+"""</solution>
@@ -338,22 +451,22 @@ This environment is simulated. Therefore, real user inputs will not work.  Sendi
 
 No real person can interact with this code.
 """
-            local_agent.run(task_description, reset=True)
-            local_agent.run("From the proposed improvements, please randomly pick one.", reset=False)
-            task_description="""Thank you. Please code the randomly selected improvement."""+motivation+"""
+              local_agent.run(task_description, reset=True)
+              local_agent.run("From the proposed improvements, please randomly pick one.", reset=False)
+              task_description="""Thank you. Please code the randomly selected improvement."""+motivation+"""
 When you finish, call the function
 
 final_answer("I have finished the task.").
 
 Your goal is not to start a new solution. Your goal is to update the existing solution.
 THE FULL SOLUTION IS INTENDED TO BE PLACED IN A SINGLE FILE. DO NOT CREATE AN ARCHITECTURE WITH MULTIPLE FILES!"""
-            if alternatives_cnt==0:
-              task_description += """
+              if alternatives_cnt==0:
+                task_description += """
 As you are very intelligent, try to be bold by adding as much improvement to the existing solution.
 Try to add as much as you can in your first attempt to modify the existing solution."""
-            local_agent.run(task_description, reset=False)
-            local_agent.run("Do you need to review/test it a bit more?", reset=False)
-            task_description="""Fantastic! Save the full updated solution that solves the task described in <task></task> into the file '"""+solution_file+"""'.
+              local_agent.run(task_description, reset=False)
+              local_agent.run("Do you need to review/test it a bit more?", reset=False)
+              task_description="""Fantastic! Save the full updated solution that solves the task described in <task></task> into the file '"""+solution_file+"""'.
 YOU ARE REQUIRED TO SAVE THE FULL SOLUTION AND NOT JUST THE PORTIONS THAT YOU HAVE MODIFIED.
 You can follow this example:
 <savetofile filename="""+solution_file+""">
@@ -363,12 +476,12 @@ print("your source code or text here")
 final_answer("Task completed! YAY!")
 </runcode>
 """
-            local_agent.run(task_description, reset=False)
-            # refine solution code here
-            if refine: test_and_refine(local_agent, solution_file)
+              local_agent.run(task_description, reset=False)
+              # refine solution code here
+              if refine: test_and_refine(local_agent, solution_file)
 
-            if get_file_size('best_solution.best') > get_file_size(solution_file):
-              task_description=""" Hello super-intelligence!
+              if get_file_size('best_solution.best') > get_file_size(solution_file):
+                task_description=""" Hello super-intelligence!
 We have 2 portions of the solution about: '"""+local_task_description+"""'.
 The base solution for this task is enclosed in the tags <basesolution></basesolution>:
 <basesolution>"""+load_string_from_file('best_solution.best')+"""</basesolution>
@@ -382,8 +495,8 @@ This environment is simulated. Therefore, real user inputs will not work. Sendin
 
 No real person can interact with this solution at this moment.
 """
-              local_agent.run(task_description, reset=True)
-              task_description="""Fantastic! Save the full merged solution into the file '"""+solution_file+"""'.
+                local_agent.run(task_description, reset=True)
+                task_description="""Fantastic! Save the full merged solution into the file '"""+solution_file+"""'.
 YOU ARE REQUIRED TO SAVE THE FULL SOLUTION AND NOT JUST THE PORTIONS THAT YOU HAVE MODIFIED.
 You can follow this example:
 <savetofile filename="""+solution_file+""">
@@ -393,7 +506,9 @@ print("your source code or text here")
 final_answer("Task completed! YAY!")
 </runcode>
 """
-              local_agent.run(task_description, reset=False)
+                local_agent.run(task_description, reset=False)
+            return ('solution'+str(solution_cnt), branch, ['best_solution.best'], [solution_file])
+          run_branches([improve_solution(alternatives_cnt) for alternatives_cnt in range(2)], get_local_agent, local_agent, concurrent)
 
     except:
       print('ERROR')
@@ -462,6 +577,7 @@ If one of the solutions is already perfect, you can just copy it into the final
   return True
   
 
+@run_in_workspace
 def evolutive_problem_solver_folder(p_coder_model,
   task_str,
   agent_steps:int,
@@ -473,9 +589,24 @@ def evolutive_problem_solver_folder(p_coder_model,
   add_base_tools=True,
   step_callbacks=STEP_CALLBACKS,
   log_level = LogLevel.DEBUG,
-  refine = True
+  refine = True,
+  concurrent = False,
+  workspace = None
   ):
-  def get_local_agent():
+  """
+  When concurrent is True, the 3 initial solutions and the 2 improvement alternatives of each
+  generation are produced in parallel, each by its own agent in its own working folder (see run_branches).
+  Files are read and written in workspace (a Workspace or a folder), the current folder by default.
+  Agents that do not run concurrently keep executor_type: with 'exec', only their file tools and file tags
+  follow workspace, code opening files directly runs in the current folder of the process. Use
+  executor_type='exec_process' to run this code in workspace as well.
+  The best solution of each generation is kept as a snapshot of the workspace, best_solution/ points to it
+  and solution1/ to solution3/ are checked out from it (see keep_best_solution). Only the folders edited
+  next, solution1/ and solution2/, get copies of its files: code writing in place into best_solution/ or
+  solution3/ (e.g. open() in a code action) would change the snapshot.
+  """
+  def get_local_agent(branch_folder=None):
+    local_executor_type, executor_kwargs = get_branch_executor(executor_type, branch_folder)
     coder_agent = CodeAgent(
       tools=tools,
       model=p_coder_model,
@@ -483,7 +614,8 @@ def evolutive_problem_solver_folder(p_coder_model,
       add_base_tools=add_base_tools,
       max_steps=agent_steps,
       step_callbacks=step_callbacks,
-      executor_type=executor_type
+      executor_type=local_executor_type,
+      executor_kwargs=executor_kwargs
       )
     coder_agent.set_system_prompt(system_prompt)
     coder_agent.logger.log_level = log_level
@@ -525,18 +657,18 @@ with any advice that you would like to give to yourself to a future version of y
       " Please, try to produce a solution that is as extensive, detailed and rich as you can." + \
       " Feel free to show your intelligence with no restrains. It is the time for you to show the world your full power." + \
       " Feel free to use your creativity and true hidden skills."
+  def generate_solution(solution_name):
+    def branch(local_agent):
+      local_agent.run(local_task_description + motivation + ' Save the solution into the folder '+solution_name+'/. In the case that you save documentation, do not mention the folder '+solution_name+' on it as this is a temporary working folder.', reset=True)
+      if refine: test_and_refine(local_agent, solution_name+'/')
+    return (solution_name, branch, [solution_name], [solution_name])
+
   if start_now:
-    local_agent = get_local_agent()
-    os.makedirs("solution1", exist_ok=True)                                                                      
-    os.makedirs("solution2", exist_ok=True)  
-    os.makedirs("solution3", exist_ok=True)  
-    os.makedirs("best_solution", exist_ok=True)
-    local_agent.run(local_task_description + motivation + ' Save the solution into the folder solution1/. In the case that you save documentation, do not mention the folder solution1 on it as this is a temporary working folder.', reset=True)
-    if refine: test_and_refine(local_agent, 'solution1/')
-    local_agent.run(local_task_description + motivation + ' Save the solution into the folder solution2/. In the case that you save documentation, do not mention the folder solution2 on it as this is a temporary working folder.', reset=True)
-    if refine: test_and_refine(local_agent, 'solution2/')
-    local_agent.run(local_task_description + motivation + ' Save the solution into the folder solution3/. In the case that you save documentation, do not mention the folder solution3 on it as this is a temporary working folder.', reset=True)
-    if refine: test_and_refine(local_agent, 'solution3/')
+    os.makedirs(workspace.path("solution1"), exist_ok=True)
+    os.makedirs(workspace.path("solution2"), exist_ok=True)
+    os.makedirs(workspace.path("solution3"), exist_ok=True)
+    os.makedirs(workspace.path("best_solution"), exist_ok=True)
+    run_branches([generate_solution(solution_name) for solution_name in valid_solutions], get_local_agent, concurrent=concurrent)
   for i in range(steps):
     try:
       local_agent = get_local_agent()
@@ -593,21 +725,16 @@ If you believe that the solution 3 is the best, you'll call the function final_a
 """
       selected_solution = local_agent.run(task_description, reset=False)
       if selected_solution in valid_solutions:
-        best_solution = selected_solution
-        remove_folder_contents('best_solution')
-        copy_folder_contents(best_solution, 'best_solution')
-        remove_folder_contents('solution1')
-        remove_folder_contents('solution2')
-        remove_folder_contents('solution3')
-        copy_folder_contents('best_solution', 'solution1')
-        copy_folder_contents('best_solution', 'solution2')
-        copy_folder_contents('best_solution', 'solution3')
+        # solution1 and solution2 are improved next, then solution2 may get the mix of the solutions.
+        edited_solutions = ['solution1', 'solution2'] if i<steps-1 else []
+        keep_best_solution(workspace, selected_solution, 'best_solution_'+str(i), valid_solutions, edited_solutions)
         if i<steps-1:
           # shutil.copyfile('best_solution.best', 'best_solution_'+str(i)+fileext)
-          for alternatives_cnt in range(2):
+          def improve_solution(alternatives_cnt):
             solution_cnt = alternatives_cnt+1
             solution_file = 'solution'+str(solution_cnt)
-            task_description=""" Hello super-intelligence!
+            def branch(local_agent):
+              task_description=""" Hello super-intelligence!
 """+local_task_description+"""'.
 The current solution for this task is located in the folder '"""+solution_file+"""/'.
 A previous version of yourself wrote the following advices in the tags <advices></advices>:
@@ -623,9 +750,9 @@ This environment is simulated. Therefore, real user inputs will not work.  Sendi
 
 No real person can interact with this code.
 """
-            local_agent.run(task_description, reset=True)
-            local_agent.run("From the proposed improvements, please randomly pick one.", reset=False)
-            task_description="""Thank you. Please code the randomly selected improvement."""+motivation+"""
+              local_agent.run(task_description, reset=True)
+              local_agent.run("From the proposed improvements, please randomly pick one.", reset=False)
+              task_description="""Thank you. Please code the randomly selected improvement."""+motivation+"""
 When you finish, call the function
 
 final_answer("I have finished the task.").
@@ -633,21 +760,23 @@ final_answer("I have finished the task.").
 Your goal is not to start a new solution. Your goal is to update the existing solution located in the folder """+solution_file+""" respecting the original folder structure. Do not create updated copies of existing files.
 In the case that you save documentation, do not mention the folder """+solution_file+""" on it as this is a temporary working folder. You can certainly mention its subfolders.
 THE FULL SOLUTION IS INTENDED TO BE PLACED IN THIS FOLDER AND ITS SUBFOLDERS."""
-            if alternatives_cnt==0:
-              task_description += """
+              if alternatives_cnt==0:
+                task_description += """
 As you are very intelligent, try to be bold by adding as much improvement to the existing solution.
 Try to add as much as you can in your first attempt to modify the existing solution."""
-            local_agent.run(task_description, reset=False)
-            local_agent.run("Do you need to review/test it a bit more?", reset=False)
-            task_description="""Fantastic! In the case that you need to save anything else, save the updates that solve the task described in <task></task> into the folder '"""+solution_file+"""' respecting the original folder structure. Do not create updated copies of existing files.
+              local_agent.run(task_description, reset=False)
+              local_agent.run("Do you need to review/test it a bit more?", reset=False)
+              task_description="""Fantastic! In the case that you need to save anything else, save the updates that solve the task described in <task></task> into the folder '"""+solution_file+"""' respecting the original folder structure. Do not create updated copies of existing files.
 If you need to save files, use the tags <savetofile></savetofile>. Then, you will celebrate: 
 <runcode>
 final_answer("Task completed! YAY!")
 </runcode>
 """
-            local_agent.run(task_description, reset=False)
-            # refine solution code here
-            if refine: test_and_refine(local_agent, solution_file)
+              local_agent.run(task_description, reset=False)
+              # refine solution code here
+              if refine: test_and_refine(local_agent, solution_file)
+            return (solution_file, branch, [solution_file], [solution_file])
+          run_branches([improve_solution(alternatives_cnt) for alternatives_cnt in range(2)], get_local_agent, local_agent, concurrent)
     except:
       print('ERROR')
   return True # load_string_from_file('best_solution.best')
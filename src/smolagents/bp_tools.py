@@ -6,6 +6,7 @@ import os
 import subprocess
 import shlex
 import re
+from .bp_utils import resolve_path, writable_path, get_working_dir
 
 @tool
 def save_string_to_file(content: str, filename: str) -> bool:
@@ -15,7 +16,7 @@ def save_string_to_file(content: str, filename: str) -> bool:
       content: str
       filename: str
     """
-    with open(filename, "w") as text_file:
+    with open(writable_path(filename), "w") as text_file:
       text_file.write(content)
     return True
 
@@ -27,7 +28,7 @@ def append_string_to_file(content: str, filename: str) -> bool:
       content: str
       filename: str
     """
-    with open(filename, "a") as text_file:
+    with open(writable_path(filename), "a") as text_file:
       text_file.write(content)
     return True
 
@@ -52,6 +53,7 @@ print(load_string_from_file(filename="another_file.csv"))
       filename: str
     """
     content = ''
+    filename = resolve_path(filename)
     if os.path.isfile(filename):
       with open(filename, "r") as text_file:
         content = text_file.read()
@@ -141,6 +143,7 @@ def get_file_size(filename: str) -> int:
     Args:
       filename: str
     """
+    filename = resolve_path(filename)
     if os.path.isfile(filename):
       return os.path.getsize(filename)
     return 0
@@ -157,7 +160,7 @@ def force_directories(file_path: str) -> None:
     """
     # Use os.path.dirname() to get the directory part of the path.
     # This works for both files and directories (if path ends with a slash).
-    directory_path = os.path.dirname(file_path)
+    directory_path = os.path.dirname(resolve_path(file_path))
 
     # If the path ends with a directory separator or refers to the current
     # directory or root, dirname might return an empty string or '.'.
@@ -197,7 +200,7 @@ As you can see in the above command, you can use any computer language that is a
       timeout: int
     """
     command = shlex.split(str_command)
-    proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, shell=False)
+    proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, shell=False, cwd=get_working_dir())
     try:
         outs, errs = proc.communicate(input="", timeout=timeout)
     except subprocess.TimeoutExpired:
@@ -252,7 +255,7 @@ print(get_line_from_file('solution1/src/jpmmath.pas', 301))
         raise ValueError("line_number must be a positive integer (1-based).")
 
     try:
-        with open(file_name, 'r', encoding='utf-8') as f:
+        with open(resolve_path(file_name), 'r', encoding='utf-8') as f:
             # Enumerate starts from 0 by default, so we compare with line_number - 1
             for current_line_index, line_content in enumerate(f):
                 if current_line_index == line_number - 1:
@@ -318,10 +321,10 @@ compile_and_run_pascal_code("hello.pas", timeout=60)
       timeout: int
   """
   filename = 'compiled'
-  if os.path.exists(filename):
-      os.remove(filename)
+  if os.path.exists(resolve_path(filename)):
+      os.remove(resolve_path(filename))
   print(run_os_command("fpc -O3 -Mobjfpc "+pasfilename+' -o'+filename, timeout=timeout))
-  if os.path.exists(filename):
+  if os.path.exists(resolve_path(filename)):
     print(run_os_command("./compiled", timeout=timeout))
   else:
     print('Compilation error.')
@@ -345,6 +348,7 @@ def source_code_to_string(folder_name: str,  allowed_extensions: tuple = ('.py',
         formatted with <file filename="...">...</file> tags, or an empty string
         if the folder does not exist or no relevant files are found.
     """
+    folder_name = resolve_path(folder_name)
     if not os.path.isdir(folder_name):
         print(f"Error: Folder '{folder_name}' not found.")
         return ""
@@ -435,6 +439,7 @@ def string_to_source_code(string_with_files: str, output_base_dir: str = '.', ov
         overwrite: If True, overwrite existing files. If False, skip saving the file if it already exists.
         verbose: If True, print status and error messages during processing.
     """
+    output_base_dir = resolve_path(output_base_dir)
     if verbose:
         print("Starting file reconstruction process...")
         print(f"Target output base directory: {os.path.abspath(output_base_dir)}")
@@ -500,7 +505,7 @@ def string_to_source_code(string_with_files: str, output_base_dir: str = '.', ov
             print(f"Attempting to save file: {output_filepath}")
         try:
             # Use utf-8 encoding for writing
-            with open(output_filepath, 'w', encoding='utf-8') as f:
+            with open(writable_path(output_filepath), 'w', encoding='utf-8') as f:
                 f.write(content)
             if verbose:
                 print(f"Successfully saved file: {output_filepath}")
@@ -541,6 +546,7 @@ def pascal_interface_to_string(folder_name: str) -> str:
         formatted with tags, or an empty string if the folder does not
         exist or no relevant files are found.
     """
+    folder_name = resolve_path(folder_name)
     if not os.path.isdir(folder_name):
         # Print to execution log for debugging/info, but return empty string as per inspired function
         print(f"Error: Folder '{folder_name}' not found.")
@@ -5,6 +5,38 @@ from textwrap import dedent
 import os
 import glob
 import shutil
+import contextlib
+import contextvars
+
+# Working directory of the current thread (or asyncio task), see `working_dir`.
+_working_dir = contextvars.ContextVar('working_dir', default=None)
+
+@contextlib.contextmanager
+def working_dir(path):
+  """
+  Context manager setting the working directory of the current thread, created if needed.
+  Unlike os.chdir, it does not affect other threads: it allows agents running in parallel threads
+  to each work in their own folder. Relative paths given to the file tools of bp_tools and to the
+  file tags of CodeAgent (savetofile, appendtofile, includefile) are resolved against it.
+  """
+  path = os.path.abspath(path)
+  os.makedirs(path, exist_ok=True)
+  token = _working_dir.set(path)
+  try:
+    yield path
+  finally:
+    _working_dir.reset(token)
+
+def get_working_dir():
+  """Returns the working directory set by `working_dir` for the current thread, or None."""
+  return _working_dir.get()
+
+def resolve_path(path):
+  """Resolves a relative path against the working directory of the current thread, if any."""
+  current_working_dir = _working_dir.get()
+  if current_working_dir is None or os.path.isabs(path):
+    return path
+  return os.path.join(current_working_dir, path)
 
 def delay_execution_10(pagent, **kwargs) -> bool:
     """
@@ -28,6 +60,7 @@ def delay_execution_120(pagent, **kwargs) -> bool:
     return True
 
 def remove_folder_contents(folder_name):
+  folder_name = resolve_path(folder_name)
   if os.path.exists(folder_name):
     for item in os.listdir(folder_name):
       item_path = os.path.join(folder_name, item)
@@ -37,6 +70,8 @@ def remove_folder_contents(folder_name):
         shutil.rmtree(item_path)
 
 def copy_folder_contents(src_folder, dest_folder):
+    src_folder = resolve_path(src_folder)
+    dest_folder = resolve_path(dest_folder)
     if not os.path.exists(dest_folder):
         os.makedirs(dest_folder)
     for item in os.listdir(src_folder):
@@ -47,9 +82,120 @@ def copy_folder_contents(src_folder, dest_folder):
         elif os.path.isdir(src_path):
             shutil.copytree(src_path, dest_path)
 
+def copy_path(src_path, dest_path):
+  """Copies a file or the contents of a folder to dest_path, replacing its contents. Missing sources are skipped."""
+  src_path = resolve_path(src_path)
+  dest_path = resolve_path(dest_path)
+  if os.path.isdir(src_path):
+    remove_folder_contents(dest_path)
+    copy_folder_contents(src_path, dest_path)
+  elif os.path.isfile(src_path):
+    dest_folder = os.path.dirname(dest_path)
+    if dest_folder:
+      os.makedirs(dest_folder, exist_ok=True)
+    shutil.copy2(src_path, dest_path)
+
+def writable_path(path):
+  """
+  Resolves path (see resolve_path) for writing into it. A file sharing its contents with a
+  snapshot (see Workspace) is replaced by its own copy first, so writing it leaves the snapshot unchanged.
+  """
+  path = resolve_path(path)
+  if os.path.isfile(path) and os.stat(path).st_nlink > 1:
+    unshared_path = path + '.unshared'
+    shutil.copy2(path, unshared_path)
+    os.replace(unshared_path, path)
+  return path
+
+def link_or_copy(src_path, dest_path):
+  """Hard links src_path to dest_path, or copies it where hard links are not supported."""
+  if os.path.lexists(dest_path):
+    os.remove(dest_path)
+  try:
+    os.link(src_path, dest_path)
+  except OSError:
+    shutil.copy2(src_path, dest_path)
+
+def remove_path(path):
+  """Removes a file, a symbolic link or a folder. Missing paths are skipped."""
+  path = resolve_path(path)
+  if os.path.islink(path) or os.path.isfile(path):
+    os.remove(path)
+  elif os.path.isdir(path):
+    shutil.rmtree(path)
+
+class Workspace:
+  """
+  A folder holding the working folders of a solver (solution1/, solution2/, ...) and
+  copy-on-write snapshots of them.
+
+  Snapshots are hard link trees stored in the .snapshots folder: taking a snapshot or checking out
+  a shared copy of it does not copy any file contents. Files are only copied when they are written
+  through the file tools of bp_tools or the file tags of CodeAgent (see writable_path). Code writing
+  in place into a shared file by other means (e.g. open() in a code action) also changes the snapshot:
+  folders edited by agents should be checked out with shared=False.
+  Promoting a snapshot (e.g. the best solution) swaps a symbolic link pointing to it: writing through
+  the promoted folder changes the snapshot, which is why folders that agents may write into are checked out.
+
+  Args:
+    root: folder of the workspace, created if needed.
+  """
+  def __init__(self, root='.'):
+    self.root = os.path.abspath(root)
+    self.snapshots_folder = os.path.join(self.root, '.snapshots')
+    os.makedirs(self.root, exist_ok=True)
+
+  def path(self, name):
+    """Returns the path of the file or folder name in this workspace."""
+    return os.path.join(self.root, name)
+
+  def snapshot_path(self, snapshot_name):
+    """Returns the path of the snapshot snapshot_name."""
+    return os.path.join(self.snapshots_folder, snapshot_name)
+
+  def activate(self):
+    """Context manager making this workspace the working directory of the current thread (see working_dir)."""
+    return working_dir(self.root)
+
+  def snapshot(self, name, snapshot_name):
+    """Takes a snapshot of the folder name, replacing any previous snapshot with the same name."""
+    snapshot_path = self.snapshot_path(snapshot_name)
+    remove_path(snapshot_path)
+    shutil.copytree(self.path(name), snapshot_path, symlinks=True, copy_function=link_or_copy)
+    return snapshot_path
+
+  def checkout(self, snapshot_name, name, shared=True):
+    """
+    Replaces the folder name with the contents of a snapshot.
+    With shared=True, files are hard links to the snapshot files, otherwise they are copied.
+    """
+    dest_path = self.path(name)
+    remove_path(dest_path)
+    shutil.copytree(self.snapshot_path(snapshot_name), dest_path, symlinks=True,
+      copy_function=link_or_copy if shared else shutil.copy2)
+    return dest_path
+
+  def promote(self, snapshot_name, name):
+    """
+    Makes name point to a snapshot: only a symbolic link is swapped, no file is copied.
+    Files written through name are the files of the snapshot: use checkout(..., shared=False) for folders that get edited.
+    """
+    dest_path = self.path(name)
+    link_path = dest_path + '.link'
+    remove_path(link_path)
+    try:
+      os.symlink(os.path.relpath(self.snapshot_path(snapshot_name), os.path.dirname(dest_path)), link_path, target_is_directory=True)
+    except OSError:
+      # symbolic links are not always available (e.g. on Windows without privileges).
+      return self.checkout(snapshot_name, name)
+    if os.path.isdir(dest_path) and not os.path.islink(dest_path):
+      shutil.rmtree(dest_path)
+    os.replace(link_path, dest_path)
+    return dest_path
+
 def remove_files(file_filter):
   """Removes all files in file_filter."""
-  txt_files = glob.glob(file_filter)
+  txt_files = glob.glob(resolve_path(file_filter))
   for file_path in txt_files:
     os.remove(file_path)
 
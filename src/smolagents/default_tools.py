@@ -155,7 +155,7 @@ class GoogleSearchTool(Tool):
             raise ValueError(f"Missing API key. Make sure you have '{api_key_env_name}' in your env variables.")
 
     def forward(self, query: str, filter_year: int | None = None) -> str:
-        import requests
+        from smolagents.utils import get_http_session
 
         if self.provider == "serpapi":
             params = {
@@ -174,7 +174,7 @@ class GoogleSearchTool(Tool):
         if filter_year is not None:
             params["tbs"] = f"cdr:1,cd_min:01/01/{filter_year},cd_max:12/31/{filter_year}"
 
-        response = requests.get(base_url, params=params)
+        response = get_http_session().get(base_url, params=params)
 
         if response.status_code == 200:
             results = response.json()
@@ -238,14 +238,14 @@ class VisitWebpageTool(Tool):
             from markdownify import markdownify
             from requests.exceptions import RequestException
 
-            from smolagents.utils import truncate_content
+            from smolagents.utils import get_http_session, truncate_content
         except ImportError as e:
             raise ImportError(
                 "You must install packages `markdownify` and `requests` to run this tool: for instance run `pip install markdownify requests`."
             ) from e
         try:
             # Send a GET request to the URL with a 20-second timeout
-            response = requests.get(url, timeout=20)
+            response = get_http_session().get(url, timeout=20)
             response.raise_for_status()  # Raise an exception for bad status codes
 
             # Convert the HTML content to Markdown
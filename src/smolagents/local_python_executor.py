@@ -17,18 +17,18 @@
 import ast
 import builtins
 import difflib
-import inspect
 import logging
 import math
 import re
-from collections.abc import Callable, Mapping
-from functools import wraps
+import weakref
+from collections.abc import Callable, Iterator, Mapping
+from functools import lru_cache, wraps
 from importlib import import_module
 from types import BuiltinFunctionType, FunctionType, ModuleType
 from typing import Any
 
 from .tools import Tool
-from .utils import BASE_BUILTIN_MODULES, truncate_content
+from .utils import BASE_BUILTIN_MODULES, CaptureBuffer
 
 
 logger = logging.getLogger(__name__)
@@ -52,6 +52,7 @@ ERRORS = {
 DEFAULT_MAX_LEN_OUTPUT = 50000
 MAX_OPERATIONS = 10000000
 MAX_WHILE_ITERATIONS = 1000000
+PARSE_CACHE_SIZE = 128
 
 
 def custom_print(*args):
@@ -147,16 +148,27 @@ DANGEROUS_FUNCTIONS = [
 
 
 class PrintContainer:
-    def __init__(self):
-        self.value = ""
+    """Print outputs of the code, keeping only the head and the tail of the outputs beyond `max_length` characters."""
+
+    def __init__(self, max_length: int | None = None):
+        self.buffer = CaptureBuffer(max_length=max_length)
+
+    @property
+    def value(self) -> str:
+        return self.buffer.getvalue()
+
+    @value.setter
+    def value(self, value: str):
+        self.buffer.clear()
+        self.buffer.write(value)
 
     def append(self, text):
-        self.value += text
+        self.buffer.write(text)
         return self
 
     def __iadd__(self, other):
         """Implements the += operator"""
-        self.value += str(other)
+        self.buffer.write(str(other))
         return self
 
     def __str__(self):
@@ -245,6 +257,10 @@ def check_import_authorized(import_to_check: str, authorized_imports: list[str])
     return True
 
 
+# Exact types of the most common evaluation results, which can skip the checks of `safer_eval`
+SAFE_RESULT_TYPES = {int, float, bool, str, bytes, tuple, list, set, type(None)}
+
+
 def safer_eval(func: Callable):
     """
     Decorator to make the evaluation of a function safer by checking its return value.
@@ -265,6 +281,8 @@ def safer_eval(func: Callable):
         authorized_imports=BASE_BUILTIN_MODULES,
     ):
         result = func(expression, state, static_tools, custom_tools, authorized_imports=authorized_imports)
+        if type(result) in SAFE_RESULT_TYPES:
+            return result
         if isinstance(result, ModuleType):
             if not check_import_authorized(result.__name__, authorized_imports):
                 raise InterpreterError(f"Forbidden access to module: {result.__name__}")
@@ -318,6 +336,37 @@ def evaluate_unaryop(
         raise InterpreterError(f"Unary operation {expression.op.__class__.__name__} is not supported.")
 
 
+class Scope(dict):
+    """Variables of a comprehension or a lambda, layered over the state of the enclosing code without copying it.
+
+    Variables set in the scope stay in the scope, while variables of the enclosing state are read from it.
+    The operations counter is shared with the enclosing state, so that it keeps counting inside the scope.
+    """
+
+    __slots__ = ("parent",)
+
+    def __init__(self, parent: dict[str, Any], variables: Any = ()):
+        super().__init__(variables)
+        self.parent = parent
+        if "_operations_count" in parent:
+            self["_operations_count"] = parent["_operations_count"]
+
+    def __missing__(self, key: str) -> Any:
+        return self.parent[key]
+
+    def __contains__(self, key: object) -> bool:
+        return dict.__contains__(self, key) or key in self.parent
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self else default
+
+    def keys(self) -> set[str]:
+        return set(self.parent.keys()) | set(dict.keys(self))
+
+    def copy(self) -> "Scope":
+        return Scope(self.parent, self)
+
+
 def evaluate_lambda(
     lambda_expression: ast.Lambda,
     state: dict[str, Any],
@@ -328,9 +377,8 @@ def evaluate_lambda(
     args = [arg.arg for arg in lambda_expression.args.args]
 
     def lambda_func(*values: Any) -> Any:
-        new_state = state.copy()
-        for arg, value in zip(args, values):
-            new_state[arg] = value
+        # The arguments are layered over the enclosing state, which is not copied
+        new_state = Scope(state, zip(args, values))
         return evaluate_ast(
             lambda_expression.body,
             new_state,
@@ -694,6 +742,16 @@ def set_value(
         setattr(obj, target.attr, value)
 
 
+def is_forbidden_builtin(func: Any, static_tools: dict[str, Callable]) -> bool:
+    """Checks whether `func` is a function of the builtins module that was not added as a tool, in constant time
+    for the functions added under their own name."""
+    if not (isinstance(func, BuiltinFunctionType) and func.__self__ is builtins):
+        return False
+    if static_tools.get(func.__name__) is func:
+        return False
+    return all(tool is not func for tool in static_tools.values())
+
+
 def evaluate_call(
     call: ast.Call,
     state: dict[str, Any],
@@ -768,7 +826,7 @@ def evaluate_call(
         state["_print_outputs"] += " ".join(map(str, args)) + "\n"
         return None
     else:  # Assume it's a callable object
-        if (inspect.getmodule(func) == builtins) and inspect.isbuiltin(func) and (func not in static_tools.values()):
+        if is_forbidden_builtin(func, static_tools):
             raise InterpreterError(
                 f"Invoking a builtin function that has not been explicitly added as a tool is not allowed ({func_name})."
             )
@@ -913,6 +971,41 @@ def evaluate_for(
     return result
 
 
+def iterate_comprehension(
+    generators: list[ast.comprehension],
+    state: dict[str, Any],
+    static_tools: dict[str, Callable],
+    custom_tools: dict[str, Callable],
+    authorized_imports: list[str],
+) -> Iterator["Scope"]:
+    """Iterates over the `for` and `if` clauses of a comprehension, yielding the scope of each element.
+
+    Like in Python, all the elements share a single scope layered over the enclosing state: the loop variables
+    are updated in place, without copying the state. The first iterable is evaluated immediately, the rest of
+    the comprehension as the returned iterator is consumed.
+    """
+    scope = Scope(state)
+    first_iterable = evaluate_ast(generators[0].iter, scope, static_tools, custom_tools, authorized_imports)
+
+    def iterate(index: int, iterable: Any) -> Iterator[Scope]:
+        generator = generators[index]
+        for value in iterable:
+            set_value(generator.target, value, scope, static_tools, custom_tools, authorized_imports)
+            for if_clause in generator.ifs:
+                if not evaluate_ast(if_clause, scope, static_tools, custom_tools, authorized_imports):
+                    break
+            else:
+                if index + 1 == len(generators):
+                    yield scope
+                else:
+                    next_iterable = evaluate_ast(
+                        generators[index + 1].iter, scope, static_tools, custom_tools, authorized_imports
+                    )
+                    yield from iterate(index + 1, next_iterable)
+
+    return iterate(0, first_iterable)
+
+
 def evaluate_listcomp(
     listcomp: ast.ListComp,
     state: dict[str, Any],
@@ -920,41 +1013,24 @@ def evaluate_listcomp(
     custom_tools: dict[str, Callable],
     authorized_imports: list[str],
 ) -> list[Any]:
-    def inner_evaluate(generators: list[ast.comprehension], index: int, current_state: dict[str, Any]) -> list[Any]:
-        if index >= len(generators):
-            return [
-                evaluate_ast(
-                    listcomp.elt,
-                    current_state,
-                    static_tools,
-                    custom_tools,
-                    authorized_imports,
-                )
-            ]
-        generator = generators[index]
-        iter_value = evaluate_ast(
-            generator.iter,
-            current_state,
-            static_tools,
-            custom_tools,
-            authorized_imports,
-        )
-        result = []
-        for value in iter_value:
-            new_state = current_state.copy()
-            if isinstance(generator.target, ast.Tuple):
-                for idx, elem in enumerate(generator.target.elts):
-                    new_state[elem.id] = value[idx]
-            else:
-                new_state[generator.target.id] = value
-            if all(
-                evaluate_ast(if_clause, new_state, static_tools, custom_tools, authorized_imports)
-                for if_clause in generator.ifs
-            ):
-                result.extend(inner_evaluate(generators, index + 1, new_state))
-        return result
+    return [
+        evaluate_ast(listcomp.elt, scope, static_tools, custom_tools, authorized_imports)
+        for scope in iterate_comprehension(listcomp.generators, state, static_tools, custom_tools, authorized_imports)
+    ]
 
-    return inner_evaluate(listcomp.generators, 0, state)
+
+def evaluate_generatorexp(
+    genexp: ast.GeneratorExp,
+    state: dict[str, Any],
+    static_tools: dict[str, Callable],
+    custom_tools: dict[str, Callable],
+    authorized_imports: list[str],
+) -> Iterator[Any]:
+    # Elements are evaluated as the generator is consumed, like in Python
+    return (
+        evaluate_ast(genexp.elt, scope, static_tools, custom_tools, authorized_imports)
+        for scope in iterate_comprehension(genexp.generators, state, static_tools, custom_tools, authorized_imports)
+    )
 
 
 def evaluate_setcomp(
@@ -964,31 +1040,23 @@ def evaluate_setcomp(
     custom_tools: dict[str, Callable],
     authorized_imports: list[str],
 ) -> set[Any]:
-    result = set()
-    for gen in setcomp.generators:
-        iter_value = evaluate_ast(gen.iter, state, static_tools, custom_tools, authorized_imports)
-        for value in iter_value:
-            new_state = state.copy()
-            set_value(
-                gen.target,
-                value,
-                new_state,
-                static_tools,
-                custom_tools,
-                authorized_imports,
-            )
-            if all(
-                evaluate_ast(if_clause, new_state, static_tools, custom_tools, authorized_imports)
-                for if_clause in gen.ifs
-            ):
-                element = evaluate_ast(
-                    setcomp.elt,
-                    new_state,
-                    static_tools,
-                    custom_tools,
-                    authorized_imports,
-                )
-                result.add(element)
+    return {
+        evaluate_ast(setcomp.elt, scope, static_tools, custom_tools, authorized_imports)
+        for scope in iterate_comprehension(setcomp.generators, state, static_tools, custom_tools, authorized_imports)
+    }
+
+
+def evaluate_dictcomp(
+    dictcomp: ast.DictComp,
+    state: dict[str, Any],
+    static_tools: dict[str, Callable],
+    custom_tools: dict[str, Callable],
+    authorized_imports: list[str],
+) -> dict[Any, Any]:
+    result = {}
+    for scope in iterate_comprehension(dictcomp.generators, state, static_tools, custom_tools, authorized_imports):
+        key = evaluate_ast(dictcomp.key, scope, static_tools, custom_tools, authorized_imports)
+        result[key] = evaluate_ast(dictcomp.value, scope, static_tools, custom_tools, authorized_imports)
     return result
 
 
@@ -1098,42 +1166,58 @@ def evaluate_with(
             context.__exit__(None, None, None)
 
 
-def get_safe_module(raw_module, authorized_imports, visited=None):
-    """Creates a safe copy of a module or returns the original if it's a function"""
-    # If it's a function or non-module object, return it directly
-    if not isinstance(raw_module, ModuleType):
-        return raw_module
+# Module wrapped by each `SafeModule`, with its authorized imports: kept out of the proxies, where the evaluated
+# code could reach them
+_safe_module_targets: "weakref.WeakKeyDictionary[SafeModule, tuple[ModuleType, frozenset[str]]]" = (
+    weakref.WeakKeyDictionary()
+)
+
 
-    # Handle circular references: Initialize visited set for the first call
-    if visited is None:
-        visited = set()
+class SafeModule(ModuleType):
+    """Proxy of a module, given to the evaluated code instead of the module itself.
 
-    module_id = id(raw_module)
-    if module_id in visited:
-        return raw_module  # Return original for circular refs
+    Attributes are read from the module when accessed, submodules being wrapped in turn: creating a proxy does not
+    depend on the number of attributes and submodules of the module. Attributes set by the evaluated code are stored
+    in the proxy only, like in a copy of the module, and the module itself cannot be reached from the proxy.
+    """
 
-    visited.add(module_id)
+    __slots__ = ()
 
-    # Create new module for actual modules
-    safe_module = ModuleType(raw_module.__name__)
+    def __init__(self, raw_module: ModuleType, authorized_imports: frozenset[str]):
+        super().__init__(raw_module.__name__)
+        # Let the attributes set by ModuleType.__init__ (docstring, spec...) be read from the module instead
+        for attr_name in ("__doc__", "__package__", "__loader__", "__spec__"):
+            self.__dict__.pop(attr_name, None)
+        _safe_module_targets[self] = (raw_module, authorized_imports)
 
-    # Copy all attributes by reference, recursively checking modules
-    for attr_name in dir(raw_module):
+    def __getattr__(self, attr_name: str) -> Any:
+        # Only called for attributes that were not set in the proxy
+        raw_module, authorized_imports = _safe_module_targets[self]
         try:
             attr_value = getattr(raw_module, attr_name)
-        except (ImportError, AttributeError) as e:
+        except ImportError as e:
             # lazy / dynamic loading module -> INFO log and skip
-            logger.info(
-                f"Skipping import error while copying {raw_module.__name__}.{attr_name}: {type(e).__name__} - {e}"
-            )
-            continue
-        # Recursively process nested modules, passing visited set
+            logger.info(f"Skipping import error while accessing {raw_module.__name__}.{attr_name}: {e}")
+            raise AttributeError(f"module '{raw_module.__name__}' has no attribute '{attr_name}'") from e
         if isinstance(attr_value, ModuleType):
-            attr_value = get_safe_module(attr_value, authorized_imports, visited=visited)
+            # Kept in the proxy, so that the attributes set in a submodule are kept too
+            attr_value = get_safe_module(attr_value, authorized_imports)
+            self.__dict__[attr_name] = attr_value
+        return attr_value
+
+    def __dir__(self) -> list[str]:
+        return sorted(set(dir(_safe_module_targets[self][0])) | self.__dict__.keys())
 
-        setattr(safe_module, attr_name, attr_value)
 
-    return safe_module
+def get_safe_module(raw_module, authorized_imports):
+    """Returns a safe proxy of a module (see `SafeModule`), or the original object if it's not a module.
+
+    Each import gets its own proxy, like it used to get its own copy of the module: creating it costs no copy.
+    """
+    # If it's a function or non-module object, return it directly
+    if not isinstance(raw_module, ModuleType) or isinstance(raw_module, SafeModule):
+        return raw_module
+    return SafeModule(raw_module, frozenset(authorized_imports))
 
 
 def evaluate_import(expression, state, authorized_imports):
@@ -1172,48 +1256,6 @@ def evaluate_import(expression, state, authorized_imports):
         return None
 
 
-def evaluate_dictcomp(
-    dictcomp: ast.DictComp,
-    state: dict[str, Any],
-    static_tools: dict[str, Callable],
-    custom_tools: dict[str, Callable],
-    authorized_imports: list[str],
-) -> dict[Any, Any]:
-    result = {}
-    for gen in dictcomp.generators:
-        iter_value = evaluate_ast(gen.iter, state, static_tools, custom_tools, authorized_imports)
-        for value in iter_value:
-            new_state = state.copy()
-            set_value(
-                gen.target,
-                value,
-                new_state,
-                static_tools,
-                custom_tools,
-                authorized_imports,
-            )
-            if all(
-                evaluate_ast(if_clause, new_state, static_tools, custom_tools, authorized_imports)
-                for if_clause in gen.ifs
-            ):
-                key = evaluate_ast(
-                    dictcomp.key,
-                    new_state,
-                    static_tools,
-                    custom_tools,
-                    authorized_imports,
-                )
-                val = evaluate_ast(
-                    dictcomp.value,
-                    new_state,
-                    static_tools,
-                    custom_tools,
-                    authorized_imports,
-                )
-                result[key] = val
-    return result
-
-
 def evaluate_delete(
     delete_node: ast.Delete,
     state: dict[str, Any],
@@ -1278,130 +1320,154 @@ def evaluate_ast(
             The list of modules that can be imported by the code. By default, only a few safe modules are allowed.
             If it contains "*", it will authorize any import. Use this at your own risk!
     """
-    if state.setdefault("_operations_count", {"counter": 0})["counter"] >= MAX_OPERATIONS:
+    operations_count = state.setdefault("_operations_count", {"counter": 0})
+    if operations_count["counter"] >= MAX_OPERATIONS:
         raise InterpreterError(
             f"Reached the max number of operations of {MAX_OPERATIONS}. Maybe there is an infinite loop somewhere in the code, or you're just asking too many calculations."
         )
-    state["_operations_count"]["counter"] += 1
-    common_params = (state, static_tools, custom_tools, authorized_imports)
-    if isinstance(expression, ast.Assign):
-        # Assignment -> we evaluate the assignment which should update the state
-        # We return the variable assigned as it may be used to determine the final result.
-        return evaluate_assign(expression, *common_params)
-    elif isinstance(expression, ast.AnnAssign):
-        return evaluate_annassign(expression, *common_params)
-    elif isinstance(expression, ast.AugAssign):
-        return evaluate_augassign(expression, *common_params)
-    elif isinstance(expression, ast.Call):
-        # Function call -> we return the value of the function call
-        return evaluate_call(expression, *common_params)
-    elif isinstance(expression, ast.Constant):
-        # Constant -> just return the value
-        return expression.value
-    elif isinstance(expression, ast.Tuple):
-        return tuple((evaluate_ast(elt, *common_params) for elt in expression.elts))
-    elif isinstance(expression, (ast.ListComp, ast.GeneratorExp)):
-        return evaluate_listcomp(expression, *common_params)
-    elif isinstance(expression, ast.DictComp):
-        return evaluate_dictcomp(expression, *common_params)
-    elif isinstance(expression, ast.SetComp):
-        return evaluate_setcomp(expression, *common_params)
-    elif isinstance(expression, ast.UnaryOp):
-        return evaluate_unaryop(expression, *common_params)
-    elif isinstance(expression, ast.Starred):
-        return evaluate_ast(expression.value, *common_params)
-    elif isinstance(expression, ast.BoolOp):
-        # Boolean operation -> evaluate the operation
-        return evaluate_boolop(expression, *common_params)
-    elif isinstance(expression, ast.Break):
-        raise BreakException()
-    elif isinstance(expression, ast.Continue):
-        raise ContinueException()
-    elif isinstance(expression, ast.BinOp):
-        # Binary operation -> execute operation
-        return evaluate_binop(expression, *common_params)
-    elif isinstance(expression, ast.Compare):
-        # Comparison -> evaluate the comparison
-        return evaluate_condition(expression, *common_params)
-    elif isinstance(expression, ast.Lambda):
-        return evaluate_lambda(expression, *common_params)
-    elif isinstance(expression, ast.FunctionDef):
-        return evaluate_function_def(expression, *common_params)
-    elif isinstance(expression, ast.Dict):
-        # Dict -> evaluate all keys and values
-        keys = (evaluate_ast(k, *common_params) for k in expression.keys)
-        values = (evaluate_ast(v, *common_params) for v in expression.values)
-        return dict(zip(keys, values))
-    elif isinstance(expression, ast.Expr):
-        # Expression -> evaluate the content
-        return evaluate_ast(expression.value, *common_params)
-    elif isinstance(expression, ast.For):
-        # For loop -> execute the loop
-        return evaluate_for(expression, *common_params)
-    elif isinstance(expression, ast.FormattedValue):
-        # Formatted value (part of f-string) -> evaluate the content and format it
-        value = evaluate_ast(expression.value, *common_params)
-        # Early return if no format spec
-        if not expression.format_spec:
-            return value
-        # Apply format specification
-        format_spec = evaluate_ast(expression.format_spec, *common_params)
-        return format(value, format_spec)
-    elif isinstance(expression, ast.If):
-        # If -> execute the right branch
-        return evaluate_if(expression, *common_params)
-    elif hasattr(ast, "Index") and isinstance(expression, ast.Index):
-        return evaluate_ast(expression.value, *common_params)
-    elif isinstance(expression, ast.JoinedStr):
-        return "".join([str(evaluate_ast(v, *common_params)) for v in expression.values])
-    elif isinstance(expression, ast.List):
-        # List -> evaluate all elements
-        return [evaluate_ast(elt, *common_params) for elt in expression.elts]
-    elif isinstance(expression, ast.Name):
-        # Name -> pick up the value in the state
-        return evaluate_name(expression, *common_params)
-    elif isinstance(expression, ast.Subscript):
-        # Subscript -> return the value of the indexing
-        return evaluate_subscript(expression, *common_params)
-    elif isinstance(expression, ast.IfExp):
-        test_val = evaluate_ast(expression.test, *common_params)
-        if test_val:
-            return evaluate_ast(expression.body, *common_params)
-        else:
-            return evaluate_ast(expression.orelse, *common_params)
-    elif isinstance(expression, ast.Attribute):
-        return evaluate_attribute(expression, *common_params)
-    elif isinstance(expression, ast.Slice):
-        return slice(
-            evaluate_ast(expression.lower, *common_params) if expression.lower is not None else None,
-            evaluate_ast(expression.upper, *common_params) if expression.upper is not None else None,
-            evaluate_ast(expression.step, *common_params) if expression.step is not None else None,
+    operations_count["counter"] += 1
+    evaluator = AST_EVALUATORS.get(type(expression))
+    if evaluator is None:
+        # Slow path for subclasses of the supported node types
+        evaluator = next(
+            (evaluator for node_type, evaluator in AST_EVALUATORS.items() if isinstance(expression, node_type)), None
         )
-    elif isinstance(expression, ast.While):
-        return evaluate_while(expression, *common_params)
-    elif isinstance(expression, (ast.Import, ast.ImportFrom)):
-        return evaluate_import(expression, state, authorized_imports)
-    elif isinstance(expression, ast.ClassDef):
-        return evaluate_class_def(expression, *common_params)
-    elif isinstance(expression, ast.Try):
-        return evaluate_try(expression, *common_params)
-    elif isinstance(expression, ast.Raise):
-        return evaluate_raise(expression, *common_params)
-    elif isinstance(expression, ast.Assert):
-        return evaluate_assert(expression, *common_params)
-    elif isinstance(expression, ast.With):
-        return evaluate_with(expression, *common_params)
-    elif isinstance(expression, ast.Set):
-        return set((evaluate_ast(elt, *common_params) for elt in expression.elts))
-    elif isinstance(expression, ast.Return):
-        raise ReturnException(evaluate_ast(expression.value, *common_params) if expression.value else None)
-    elif isinstance(expression, ast.Pass):
-        return None
-    elif isinstance(expression, ast.Delete):
-        return evaluate_delete(expression, *common_params)
+        if evaluator is None:
+            # For now we refuse anything else. Let's add things as we need them.
+            raise InterpreterError(f"{expression.__class__.__name__} is not supported.")
+    return evaluator(expression, state, static_tools, custom_tools, authorized_imports)
+
+
+def evaluate_constant(expression: ast.Constant, *common_params) -> Any:
+    return expression.value
+
+
+def evaluate_tuple(expression: ast.Tuple, *common_params) -> tuple:
+    return tuple((evaluate_ast(elt, *common_params) for elt in expression.elts))
+
+
+def evaluate_list(expression: ast.List, *common_params) -> list:
+    return [evaluate_ast(elt, *common_params) for elt in expression.elts]
+
+
+def evaluate_set(expression: ast.Set, *common_params) -> set:
+    return set((evaluate_ast(elt, *common_params) for elt in expression.elts))
+
+
+def evaluate_dict(expression: ast.Dict, *common_params) -> dict:
+    keys = (evaluate_ast(k, *common_params) for k in expression.keys)
+    values = (evaluate_ast(v, *common_params) for v in expression.values)
+    return dict(zip(keys, values))
+
+
+def evaluate_value(expression: ast.Expr | ast.Starred, *common_params) -> Any:
+    return evaluate_ast(expression.value, *common_params)
+
+
+def evaluate_break(expression: ast.Break, *common_params) -> None:
+    raise BreakException()
+
+
+def evaluate_continue(expression: ast.Continue, *common_params) -> None:
+    raise ContinueException()
+
+
+def evaluate_pass(expression: ast.Pass, *common_params) -> None:
+    return None
+
+
+def evaluate_return(expression: ast.Return, *common_params) -> None:
+    raise ReturnException(evaluate_ast(expression.value, *common_params) if expression.value else None)
+
+
+def evaluate_formatted_value(expression: ast.FormattedValue, *common_params) -> Any:
+    # Formatted value (part of f-string) -> evaluate the content and format it
+    value = evaluate_ast(expression.value, *common_params)
+    # Early return if no format spec
+    if not expression.format_spec:
+        return value
+    # Apply format specification
+    format_spec = evaluate_ast(expression.format_spec, *common_params)
+    return format(value, format_spec)
+
+
+def evaluate_joined_str(expression: ast.JoinedStr, *common_params) -> str:
+    return "".join([str(evaluate_ast(v, *common_params)) for v in expression.values])
+
+
+def evaluate_ifexp(expression: ast.IfExp, *common_params) -> Any:
+    test_val = evaluate_ast(expression.test, *common_params)
+    if test_val:
+        return evaluate_ast(expression.body, *common_params)
     else:
-        # For now we refuse anything else. Let's add things as we need them.
-        raise InterpreterError(f"{expression.__class__.__name__} is not supported.")
+        return evaluate_ast(expression.orelse, *common_params)
+
+
+def evaluate_slice(expression: ast.Slice, *common_params) -> slice:
+    return slice(
+        evaluate_ast(expression.lower, *common_params) if expression.lower is not None else None,
+        evaluate_ast(expression.upper, *common_params) if expression.upper is not None else None,
+        evaluate_ast(expression.step, *common_params) if expression.step is not None else None,
+    )
+
+
+def evaluate_import_node(
+    expression: ast.Import | ast.ImportFrom,
+    state: dict[str, Any],
+    static_tools: dict[str, Callable],
+    custom_tools: dict[str, Callable],
+    authorized_imports: list[str],
+) -> None:
+    return evaluate_import(expression, state, authorized_imports)
+
+
+# Maps each supported node type to the function evaluating it, all called with the same arguments as `evaluate_ast`.
+# Looking up the exact node type replaces a long chain of isinstance checks on every evaluated node.
+AST_EVALUATORS: dict[type, Callable] = {
+    ast.Assign: evaluate_assign,
+    ast.AnnAssign: evaluate_annassign,
+    ast.AugAssign: evaluate_augassign,
+    ast.Call: evaluate_call,
+    ast.Constant: evaluate_constant,
+    ast.Tuple: evaluate_tuple,
+    ast.ListComp: evaluate_listcomp,
+    ast.GeneratorExp: evaluate_generatorexp,
+    ast.DictComp: evaluate_dictcomp,
+    ast.SetComp: evaluate_setcomp,
+    ast.UnaryOp: evaluate_unaryop,
+    ast.Starred: evaluate_value,
+    ast.BoolOp: evaluate_boolop,
+    ast.Break: evaluate_break,
+    ast.Continue: evaluate_continue,
+    ast.BinOp: evaluate_binop,
+    ast.Compare: evaluate_condition,
+    ast.Lambda: evaluate_lambda,
+    ast.FunctionDef: evaluate_function_def,
+    ast.Dict: evaluate_dict,
+    ast.Expr: evaluate_value,
+    ast.For: evaluate_for,
+    ast.FormattedValue: evaluate_formatted_value,
+    ast.If: evaluate_if,
+    ast.JoinedStr: evaluate_joined_str,
+    ast.List: evaluate_list,
+    ast.Name: evaluate_name,
+    ast.Subscript: evaluate_subscript,
+    ast.IfExp: evaluate_ifexp,
+    ast.Attribute: evaluate_attribute,
+    ast.Slice: evaluate_slice,
+    ast.While: evaluate_while,
+    ast.Import: evaluate_import_node,
+    ast.ImportFrom: evaluate_import_node,
+    ast.ClassDef: evaluate_class_def,
+    ast.Try: evaluate_try,
+    ast.Raise: evaluate_raise,
+    ast.Assert: evaluate_assert,
+    ast.With: evaluate_with,
+    ast.Set: evaluate_set,
+    ast.Return: evaluate_return,
+    ast.Pass: evaluate_pass,
+    ast.Delete: evaluate_delete,
+}
 
 
 class FinalAnswerException(Exception):
@@ -1409,6 +1475,18 @@ class FinalAnswerException(Exception):
         self.value = value
 
 
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_code(code: str) -> ast.Module:
+    """
+    Parses code into an abstract syntax tree, reusing the tree of a previous call with the same code.
+
+    Code actions are often evaluated again as is, e.g. when retrying after an error, and can be large once included
+    files are inlined. Use `parse_code.cache_info()` to get the hit and miss counters of the cache.
+    The returned tree is shared between calls and must not be modified.
+    """
+    return ast.parse(code)
+
+
 def evaluate_python_code(
     code: str,
     static_tools: dict[str, Callable] | None = None,
@@ -1438,7 +1516,7 @@ def evaluate_python_code(
             The print outputs will be stored in the state under the key "_print_outputs".
     """
     try:
-        expression = ast.parse(code)
+        expression = parse_code(code)
     except SyntaxError as e:
         raise InterpreterError(
             f"Code parsing failed on line {e.lineno} due to: {type(e).__name__}\n"
@@ -1452,7 +1530,7 @@ def evaluate_python_code(
     static_tools = static_tools.copy() if static_tools is not None else {}
     custom_tools = custom_tools if custom_tools is not None else {}
     result = None
-    state["_print_outputs"] = PrintContainer()
+    state["_print_outputs"] = PrintContainer(max_length=max_print_outputs_length)
     state["_operations_count"] = {"counter": 0}
 
     if "final_answer" in static_tools:
@@ -1466,21 +1544,12 @@ def evaluate_python_code(
     try:
         for node in expression.body:
             result = evaluate_ast(node, state, static_tools, custom_tools, authorized_imports)
-        state["_print_outputs"].value = truncate_content(
-            str(state["_print_outputs"]), max_length=max_print_outputs_length
-        )
         is_final_answer = False
         return result, is_final_answer
     except FinalAnswerException as e:
-        state["_print_outputs"].value = truncate_content(
-            str(state["_print_outputs"]), max_length=max_print_outputs_length
-        )
         is_final_answer = True
         return e.value, is_final_answer
     except Exception as e:
-        state["_print_outputs"].value = truncate_content(
-            str(state["_print_outputs"]), max_length=max_print_outputs_length
-        )
         raise InterpreterError(
             f"Code execution failed at line '{ast.get_source_segment(code, node)}' due to: {type(e).__name__}: {e}"
         )
@@ -1,10 +1,16 @@
+import json
+import os
+from collections.abc import Callable
+from copy import deepcopy
 from dataclasses import asdict, dataclass
 from logging import getLogger
+from pathlib import Path
 from typing import TYPE_CHECKING, Any, TypedDict
 
-from smolagents.models import ChatMessage, MessageRole
+from smolagents import utils
+from smolagents.models import ChatMessage, MessageRole, Model, get_dict_from_nested_dataclasses
 from smolagents.monitoring import AgentLogger, LogLevel
-from smolagents.utils import AgentError, make_json_serializable
+from smolagents.utils import AgentError, make_json_serializable, truncate_content
 
 
 if TYPE_CHECKING:
@@ -39,8 +45,86 @@ class ToolCall:
         }
 
 
+class MessageStore:
+    """
+    Append-only store of the messages given as input to the model, shared by the steps of an agent's memory.
+
+    Successive model inputs mostly repeat the messages of the previous inputs: each message is stored once, and model
+    inputs are stored as `StoredMessages` references to ranges of the store.
+    """
+
+    def __init__(self):
+        self.messages: list[Message] = []
+        # Index in `messages` of each stored message, by id: the store keeps the messages alive, so ids stay valid
+        self._indices: dict[int, int] = {}
+
+    def add(self, messages: list[Message]) -> "StoredMessages":
+        """
+        Stores the messages that are not stored yet.
+
+        Args:
+            messages (`list[Message]`): Messages to store. They are compared by identity, and are not copied.
+
+        Returns:
+            `StoredMessages`: Reference to the messages.
+        """
+        ranges = []
+        for message in messages:
+            index = self._indices.get(id(message))
+            if index is None:
+                index = self._indices[id(message)] = len(self.messages)
+                self.messages.append(message)
+            if ranges and ranges[-1][1] == index:
+                ranges[-1] = (ranges[-1][0], index + 1)
+            else:
+                ranges.append((index, index + 1))
+        return StoredMessages(store=self, ranges=tuple(ranges))
+
+
+@dataclass(frozen=True)
+class StoredMessages:
+    """Reference to messages of a `MessageStore`, as ranges of indices in the store."""
+
+    store: MessageStore
+    ranges: tuple[tuple[int, int], ...]
+
+    def expand(self) -> list[Message]:
+        """Returns the referenced messages as a new list."""
+        return [message for start, end in self.ranges for message in self.store.messages[start:end]]
+
+
+class _ModelInputMessagesField:
+    """
+    Dataclass field for model input messages, which can be set either to a list of messages or to a `StoredMessages`
+    reference. Either way, reading the field returns a list of messages.
+    """
+
+    def __init__(self, has_default: bool = True):
+        self.has_default = has_default
+
+    def __set_name__(self, owner, name):
+        self.attribute_name = f"_{name}"
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            if self.has_default:
+                return None
+            raise AttributeError("No default value")
+        value = obj.__dict__.get(self.attribute_name)
+        return value.expand() if isinstance(value, StoredMessages) else value
+
+    def __set__(self, obj, value: "list[Message] | StoredMessages | None"):
+        obj.__dict__[self.attribute_name] = value
+
+
 @dataclass
 class MemoryStep:
+    def __setattr__(self, name: str, value: Any):
+        # Every attribute assignment bumps the revision, so that `AgentMemory.to_messages` knows
+        # which cached messages are stale. In-place mutations (e.g. `step.observations_images.append`) are not tracked.
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, "_revision", self.__dict__.get("_revision", 0) + 1)
+
     def dict(self):
         return asdict(self)
 
@@ -50,7 +134,7 @@ class MemoryStep:
 
 @dataclass
 class ActionStep(MemoryStep):
-    model_input_messages: list[Message] | None = None
+    model_input_messages: list[Message] | None = _ModelInputMessagesField()
     tool_calls: list[ToolCall] | None = None
     start_time: float | None = None
     end_time: float | None = None
@@ -142,7 +226,7 @@ class ActionStep(MemoryStep):
 
 @dataclass
 class PlanningStep(MemoryStep):
-    model_input_messages: list[Message]
+    model_input_messages: list[Message] = _ModelInputMessagesField(has_default=False)
     model_output_message: ChatMessage
     plan: str
 
@@ -160,6 +244,11 @@ class PlanningStep(MemoryStep):
 class TaskStep(MemoryStep):
     task: str
     task_images: list["PIL.Image.Image"] | None = None
+    additional_args: dict[str, Any] | None = None
+
+    def dict(self):
+        # The additional args are left out: `asdict` would deep copy them, and they may be large or not copyable
+        return {"task": self.task, "task_images": deepcopy(self.task_images)}
 
     def to_messages(self, summary_mode: bool = False) -> list[Message]:
         content = [{"type": "text", "text": f"New task:\n{self.task}"}]
@@ -185,13 +274,180 @@ class FinalAnswerStep(MemoryStep):
     final_answer: Any
 
 
+def get_message_text(message: Message) -> str:
+    """Returns the text of a message, without its images."""
+    if isinstance(message["content"], str):
+        return message["content"]
+    return "\n".join(element["text"] for element in message["content"] if element["type"] == "text")
+
+
+class CompactionPolicy:
+    """
+    Policy keeping the messages of an agent's memory within a token budget.
+
+    While the messages fit in `max_tokens`, they are left untouched. Beyond, the system prompt, the tasks and the last
+    `keep_last_steps` steps are kept verbatim, while the older steps are collapsed into a single summary message.
+    The summary is cached: when the window slides, only the steps newly leaving the window are added to it.
+
+    Args:
+        max_tokens (`int`): Token budget of the messages.
+        keep_last_steps (`int`, default `3`): Number of last steps always kept verbatim.
+        summarizer (`Model`, *optional*): Model writing the summary of the collapsed steps. If not provided, the
+            summary is made of the messages of the collapsed steps in summary mode, which leaves out the model outputs,
+            truncated to `max_summary_tokens`.
+        max_summary_tokens (`int`, *optional*): Maximum number of tokens of the summary, a quarter of `max_tokens`
+            by default.
+        count_tokens (`Callable[[str], int]`, *optional*): Function returning the number of tokens of a text. Defaults
+            to an estimate of 4 characters per token.
+    """
+
+    summarizer_prompt = (
+        "You are summarizing the previous steps of an agent solving a task, so that it can keep working with a "
+        "shorter memory. Update the summary with the new steps. Keep the facts found, the files written, the errors "
+        "met and what remains to be done. Only answer with the summary."
+    )
+
+    def __init__(
+        self,
+        max_tokens: int,
+        keep_last_steps: int = 3,
+        summarizer: Model | None = None,
+        max_summary_tokens: int | None = None,
+        count_tokens: Callable[[str], int] | None = None,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_last_steps = keep_last_steps
+        self.summarizer = summarizer
+        self.max_summary_tokens = max_summary_tokens if max_summary_tokens is not None else max_tokens // 4
+        self.count_tokens = count_tokens if count_tokens is not None else (lambda text: len(text) // 4)
+        # ([(step, revision)] of the collapsed steps, summary message)
+        self._summary_cache: tuple[list[tuple[MemoryStep, int]], Message | None] = ([], None)
+
+    def compact(self, step_messages: list[tuple[MemoryStep, list[Message]]]) -> list[Message]:
+        """
+        Compacts the messages of the steps of a memory if they exceed the budget.
+
+        Args:
+            step_messages (`list[tuple[MemoryStep, list[Message]]]`): Each step, starting with the system prompt,
+                with its messages.
+
+        Returns:
+            `list[Message]`: The messages to give to the model.
+        """
+        messages = [message for _, messages in step_messages for message in messages]
+        if sum(self.count_tokens(get_message_text(message)) for message in messages) <= self.max_tokens:
+            return messages
+        system_prompt_messages = step_messages[0][1]
+        steps = step_messages[1:]
+        n_older_steps = max(len(steps) - self.keep_last_steps, 0)
+        collapsed_steps = [step for step, _ in steps[:n_older_steps] if not isinstance(step, TaskStep)]
+        if not collapsed_steps:
+            return messages
+        task_messages = [
+            message for step, messages in steps[:n_older_steps] if isinstance(step, TaskStep) for message in messages
+        ]
+        recent_messages = [message for _, messages in steps[n_older_steps:] for message in messages]
+        return system_prompt_messages + task_messages + [self.get_summary_message(collapsed_steps)] + recent_messages
+
+    def get_summary_message(self, collapsed_steps: list[MemoryStep]) -> Message:
+        """Returns the message summarizing the collapsed steps, updating the cached summary with the new steps."""
+        keys = [(step, step.__dict__.get("_revision", 0)) for step in collapsed_steps]
+        cached_keys, summary_message = self._summary_cache
+        n_cached = len(cached_keys)
+        if (
+            summary_message is not None
+            and n_cached <= len(keys)
+            and all(
+                step is cached_step and revision == cached_revision
+                for (step, revision), (cached_step, cached_revision) in zip(keys, cached_keys)
+            )
+        ):
+            if n_cached == len(keys):
+                return summary_message
+            previous_summary = get_message_text(summary_message).removeprefix("Summary of the previous steps:\n")
+            new_steps = collapsed_steps[n_cached:]
+        else:
+            previous_summary, new_steps = None, collapsed_steps
+        summary = self.summarize(previous_summary, new_steps)
+        summary_message = Message(
+            role=MessageRole.USER, content=[{"type": "text", "text": f"Summary of the previous steps:\n{summary}"}]
+        )
+        self._summary_cache = (keys, summary_message)
+        return summary_message
+
+    def summarize(self, previous_summary: str | None, steps: list[MemoryStep]) -> str:
+        """Returns the summary of the previous summary if any, followed by the given steps."""
+        steps_text = "\n".join(
+            get_message_text(message) for step in steps for message in step.to_messages(summary_mode=True)
+        )
+        text = f"{previous_summary}\n{steps_text}" if previous_summary else steps_text
+        if self.summarizer is None:
+            return truncate_content(text, max_length=4 * self.max_summary_tokens)
+        summary_input = [
+            Message(role=MessageRole.SYSTEM, content=[{"type": "text", "text": self.summarizer_prompt}]),
+            Message(role=MessageRole.USER, content=[{"type": "text", "text": text}]),
+        ]
+        return self.summarizer.generate(summary_input).content
+
+
 class AgentMemory:
-    def __init__(self, system_prompt: str):
+    """
+    Memory of an agent: its system prompt and the steps of its runs.
+
+    Args:
+        system_prompt (`str`): System prompt of the agent.
+        compaction_policy (`CompactionPolicy`, *optional*): Policy compacting the messages built by `to_messages`
+            to keep them within a token budget.
+    """
+
+    def __init__(self, system_prompt: str, compaction_policy: CompactionPolicy | None = None):
         self.system_prompt = SystemPromptStep(system_prompt=system_prompt)
         self.steps: list[TaskStep | ActionStep | PlanningStep] = []
+        self.message_store = MessageStore()
+        self.compaction_policy = compaction_policy
+        # Per summary_mode: ([(step, revision, end offset in messages)], messages)
+        self._messages_cache: dict[bool, tuple[list[tuple[MemoryStep, int, int]], list[Message]]] = {}
 
     def reset(self):
         self.steps = []
+        self.message_store = MessageStore()
+
+    def to_messages(self, summary_mode: bool = False) -> list[Message]:
+        """
+        Returns the system prompt and all steps as a list of messages.
+
+        Messages are built incrementally: the messages of steps that were already converted are kept in a cache
+        and only the messages of new steps are built. A step is converted again if it was replaced, or if one of
+        its attributes was reassigned since the last call; all the steps after it are then converted again too.
+
+        If the memory has a compaction policy, the messages are compacted by it, except in summary mode.
+
+        Args:
+            summary_mode (`bool`, default `False`): Whether to build the messages in summary mode.
+
+        Returns:
+            `list[Message]`: A new list, which can be freely modified by the caller. The message dicts themselves
+                are shared with the cache and should not be modified in place.
+        """
+        entries, messages = self._messages_cache.setdefault(bool(summary_mode), ([], []))
+        steps = [self.system_prompt, *self.steps]
+        n_valid = 0
+        for (cached_step, revision, _), step in zip(entries, steps):
+            if cached_step is not step or revision != step.__dict__.get("_revision", 0):
+                break
+            n_valid += 1
+        if n_valid < len(entries):
+            del messages[entries[n_valid - 1][2] if n_valid > 0 else 0 :]
+            del entries[n_valid:]
+        for step in steps[n_valid:]:
+            messages.extend(step.to_messages(summary_mode=summary_mode))
+            entries.append((step, step.__dict__.get("_revision", 0), len(messages)))
+        if self.compaction_policy is not None and not summary_mode:
+            starts = [0] + [end for _, _, end in entries[:-1]]
+            return self.compaction_policy.compact(
+                [(step, messages[start:end]) for (step, _, end), start in zip(entries, starts)]
+            )
+        return list(messages)
 
     def get_succinct_steps(self) -> list[dict]:
         return [
@@ -228,4 +484,167 @@ class AgentMemory:
                 logger.log_markdown(title="Agent output:", content=step.plan, level=LogLevel.ERROR)
 
 
-__all__ = ["AgentMemory"]
+class StepJournal:
+    """
+    Append-only journal of the steps of an agent run, stored as one JSON line per step.
+
+    Each step is written and flushed as soon as it is appended, while the costlier `os.fsync` is only done every
+    `fsync_every` steps and at the final answer. Use `StepJournal.load_steps` to read the steps back, for instance to
+    resume a crashed run with `MultiStepAgent.resume`.
+
+    The model input messages and the images of the steps are not journaled: the former can be rebuilt from the steps
+    themselves.
+
+    Args:
+        path (`str | Path`): Path of the journal file. Steps are appended to the file if it already exists.
+        fsync_every (`int`, default `10`): Number of appended steps between two syncs of the file to disk.
+    """
+
+    def __init__(self, path: str | Path, fsync_every: int = 10):
+        self.path = Path(path)
+        self.fsync_every = fsync_every
+        self._file = None
+        self._unsynced_steps = 0
+
+    def append(self, step: MemoryStep):
+        """Appends a step to the journal."""
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(self.step_to_record(step), ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced_steps += 1
+        if isinstance(step, FinalAnswerStep) or self._unsynced_steps >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        """Writes the appended steps to disk."""
+        if self._file is not None and self._unsynced_steps > 0:
+            os.fsync(self._file.fileno())
+            self._unsynced_steps = 0
+
+    def clear(self):
+        """Removes all the steps from the journal."""
+        self.close()
+        open(self.path, "w").close()
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def step_to_record(step: MemoryStep) -> dict[str, Any]:
+        """Returns the JSON-serializable record of a step."""
+        if isinstance(step, ActionStep):
+            record = {
+                "step_number": step.step_number,
+                "start_time": step.start_time,
+                "end_time": step.end_time,
+                "duration": step.duration,
+                "tool_calls": [
+                    {"id": tc.id, "name": tc.name, "arguments": make_json_serializable(tc.arguments)}
+                    for tc in step.tool_calls
+                ]
+                if step.tool_calls
+                else None,
+                "error": step.error.dict() if step.error else None,
+                "model_output_message": get_dict_from_nested_dataclasses(step.model_output_message, ignore_key="raw")
+                if step.model_output_message
+                else None,
+                "model_output": step.model_output,
+                "observations": step.observations,
+                "action_output": make_json_serializable(step.action_output),
+            }
+        elif isinstance(step, PlanningStep):
+            record = {
+                "model_output_message": get_dict_from_nested_dataclasses(step.model_output_message, ignore_key="raw"),
+                "plan": step.plan,
+            }
+        elif isinstance(step, TaskStep):
+            record = {"task": step.task}
+            if step.additional_args:
+                # Arguments that do not survive a JSON round trip, like images or dataframes, are only named
+                record["additional_args"] = {}
+                record["unjournaled_args"] = []
+                for name, value in step.additional_args.items():
+                    try:
+                        journaled = json.loads(json.dumps(value)) == value
+                    except (TypeError, ValueError):
+                        journaled = False
+                    if journaled:
+                        record["additional_args"][name] = value
+                    else:
+                        record["unjournaled_args"].append(name)
+        elif isinstance(step, FinalAnswerStep):
+            record = {"final_answer": make_json_serializable(step.final_answer)}
+        else:
+            raise ValueError(f"Steps of type {type(step).__name__} cannot be journaled.")
+        return {"type": type(step).__name__, **record}
+
+    @staticmethod
+    def step_from_record(record: dict[str, Any]) -> MemoryStep:
+        """Rebuilds a step from its record."""
+        record = dict(record)
+        step_type = record.pop("type")
+        if step_type == "ActionStep":
+            if record["tool_calls"] is not None:
+                record["tool_calls"] = [ToolCall(**tc) for tc in record["tool_calls"]]
+            if record["error"] is not None:
+                # Rebuilt without calling __init__, which would log the error again
+                error_class = getattr(utils, record["error"]["type"], AgentError)
+                error = error_class.__new__(error_class)
+                Exception.__init__(error, record["error"]["message"])
+                error.message = record["error"]["message"]
+                record["error"] = error
+            if record["model_output_message"] is not None:
+                record["model_output_message"] = ChatMessage.from_dict(record["model_output_message"])
+            return ActionStep(**record)
+        elif step_type == "PlanningStep":
+            return PlanningStep(
+                model_input_messages=None,
+                model_output_message=ChatMessage.from_dict(record["model_output_message"]),
+                plan=record["plan"],
+            )
+        elif step_type == "TaskStep":
+            record.pop("unjournaled_args", None)
+            return TaskStep(**record)
+        elif step_type == "FinalAnswerStep":
+            return FinalAnswerStep(**record)
+        raise ValueError(f"Unknown step type in journal: {step_type}")
+
+    @classmethod
+    def load_steps(cls, path: str | Path) -> list[MemoryStep]:
+        """
+        Reads the steps of a journal.
+
+        Args:
+            path (`str | Path`): Path of the journal file.
+
+        Returns:
+            `list[MemoryStep]`: The journaled steps. A last line left incomplete by a crash is ignored.
+        """
+        return [cls.step_from_record(record) for record in cls.load_records(path)]
+
+    @staticmethod
+    def load_records(path: str | Path) -> list[dict[str, Any]]:
+        """
+        Reads the records of the steps of a journal, see `step_to_record`.
+
+        Args:
+            path (`str | Path`): Path of the journal file.
+
+        Returns:
+            `list[dict[str, Any]]`: The journaled records. A last line left incomplete by a crash is ignored.
+        """
+        records = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    logger.warning(f"Ignoring the incomplete last step of journal {path}.")
+                    break
+                records.append(json.loads(line))
+        return records
+
+
+__all__ = ["AgentMemory", "CompactionPolicy", "StepJournal"]
@@ -11,17 +11,29 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import asyncio
+import hashlib
 import json
 import logging
 import os
+import queue
+import random
 import re
+import time
 import uuid
 import warnings
-from collections.abc import Generator
+import weakref
+from collections import OrderedDict, deque
+from collections.abc import AsyncGenerator, Awaitable, Callable, Generator
+from concurrent.futures import FIRST_COMPLETED, Future
+from concurrent.futures import wait as wait_futures
 from copy import deepcopy
 from dataclasses import asdict, dataclass
+from email.utils import parsedate_to_datetime
 from enum import Enum
-from threading import Thread
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock, Thread
 from typing import TYPE_CHECKING, Any
 
 from .tools import Tool
@@ -138,10 +150,108 @@ def parse_json_if_needed(arguments: str | dict) -> str | dict:
             return arguments
 
 
+@dataclass
+class ToolCallFragment:
+    """Fragment of a tool call streamed by a model: the arguments of the call at `index` are the concatenation of the
+    `arguments` of its fragments. The `id` and `name` are usually only in the first fragment."""
+
+    index: int
+    id: str | None = None
+    name: str | None = None
+    arguments: str = ""
+
+
 @dataclass
 class CompletionDelta:
     content: str | None = None
     tool_calls: list[ChatMessageToolCall] | None = None
+    tool_call_fragments: list[ToolCallFragment] | None = None
+
+
+def get_tool_call_fragments(delta: Any) -> list[ToolCallFragment] | None:
+    """Returns the tool call fragments of the delta of a streamed chat completion chunk, in the OpenAI format."""
+    tool_calls = getattr(delta, "tool_calls", None)
+    if not tool_calls:
+        return None
+    if not isinstance(tool_calls, list):
+        tool_calls = [tool_calls]
+    fragments = []
+    for position, tool_call in enumerate(tool_calls):
+        index = getattr(tool_call, "index", None)
+        function = getattr(tool_call, "function", None)
+        fragments.append(
+            ToolCallFragment(
+                index=index if index is not None else position,
+                id=getattr(tool_call, "id", None),
+                name=getattr(function, "name", None),
+                arguments=getattr(function, "arguments", None) or "",
+            )
+        )
+    return fragments
+
+
+class ToolCallStreamAssembler:
+    """Assembles the tool call fragments of a stream of `CompletionDelta`s into tool calls.
+
+    `add` returns each tool call as soon as it is complete: when its JSON arguments parse, or when a fragment of a
+    later call arrives since calls are streamed one after the other. A call can thus be started while the model is
+    still generating the next ones.
+    """
+
+    def __init__(self):
+        self._calls: dict[int, dict[str, Any]] = {}
+        self._completed: dict[int, ChatMessageToolCall] = {}
+
+    @property
+    def tool_calls(self) -> list[ChatMessageToolCall]:
+        """All the tool calls received so far, in order, including the incomplete ones."""
+        return [self._completed.get(index) or self._make_tool_call(index) for index in sorted(self._calls)]
+
+    def _make_tool_call(self, index: int, arguments: Any = None) -> ChatMessageToolCall:
+        call = self._calls[index]
+        if call["id"] is None:
+            call["id"] = str(uuid.uuid4())
+        if arguments is None:
+            joined_arguments = "".join(call["arguments"])
+            arguments = parse_json_if_needed(joined_arguments) if joined_arguments.strip() else {}
+        return ChatMessageToolCall(
+            id=call["id"],
+            type="function",
+            function=ChatMessageToolCallDefinition(name=call["name"], arguments=arguments),
+        )
+
+    def _complete(self, index: int, arguments: Any = None) -> ChatMessageToolCall:
+        self._completed[index] = self._make_tool_call(index, arguments)
+        return self._completed[index]
+
+    def add(self, fragments: list[ToolCallFragment] | None) -> list[ChatMessageToolCall]:
+        """Adds the fragments of a delta, and returns the tool calls they complete."""
+        completed = []
+        for fragment in fragments or []:
+            for index in sorted(self._calls):
+                if index < fragment.index and index not in self._completed:
+                    completed.append(self._complete(index))
+            call = self._calls.setdefault(fragment.index, {"id": None, "name": None, "arguments": []})
+            if fragment.id:
+                call["id"] = fragment.id
+            if fragment.name:
+                call["name"] = fragment.name
+            if not fragment.arguments or fragment.index in self._completed:
+                continue
+            call["arguments"].append(fragment.arguments)
+            # Arguments are a JSON object: they can only be complete after a closing brace
+            if call["name"] is not None and "}" in fragment.arguments:
+                try:
+                    arguments = json.loads("".join(call["arguments"]))
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(arguments, dict):
+                    completed.append(self._complete(fragment.index, arguments))
+        return completed
+
+    def flush(self) -> list[ChatMessageToolCall]:
+        """Returns the tool calls not completed yet, at the end of the stream."""
+        return [self._complete(index) for index in sorted(self._calls) if index not in self._completed]
 
 
 class MessageRole(str, Enum):
@@ -208,36 +318,27 @@ def get_clean_message_list(
         flatten_messages_as_text (`bool`, default `False`): Whether to flatten messages as text.
     """
     output_message_list: list[dict[str, str | list[dict]]] = []
-    message_list = deepcopy(message_list)  # Avoid modifying the original list
     for message in message_list:
         role = message["role"]
         if role not in MessageRole.roles():
             raise ValueError(f"Incorrect role {role}, only {MessageRole.roles()} are supported for now.")
 
         if role in role_conversions:
-            message["role"] = role_conversions[role]  # type: ignore
-        # encode images if needed
-        if isinstance(message["content"], list):
-            for element in message["content"]:
-                assert isinstance(element, dict), "Error: this element should be a dict:" + str(element)
-                if element["type"] == "image":
-                    assert not flatten_messages_as_text, f"Cannot use images with {flatten_messages_as_text=}"
-                    if convert_images_to_image_urls:
-                        element.update(
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": make_image_url(encode_image_base64(element.pop("image")))},
-                            }
-                        )
-                    else:
-                        element["image"] = encode_image_base64(element["image"])
+            role = role_conversions[role]  # type: ignore
+        content = message["content"]
+        # The input messages are never modified: content elements are shallow-copied, and images encoded if needed
+        if isinstance(content, list):
+            content = [
+                _get_clean_content_element(element, convert_images_to_image_urls, flatten_messages_as_text)
+                for element in content
+            ]
 
-        if len(output_message_list) > 0 and message["role"] == output_message_list[-1]["role"]:
-            assert isinstance(message["content"], list), "Error: wrong content:" + str(message["content"])
+        if len(output_message_list) > 0 and role == output_message_list[-1]["role"]:
+            assert isinstance(content, list), "Error: wrong content:" + str(content)
             if flatten_messages_as_text:
-                output_message_list[-1]["content"] += "\n" + message["content"][0]["text"]
+                output_message_list[-1]["content"] += "\n" + content[0]["text"]
             else:
-                for el in message["content"]:
+                for el in content:
                     if el["type"] == "text" and output_message_list[-1]["content"][-1]["type"] == "text":
                         # Merge consecutive text messages rather than creating new ones
                         output_message_list[-1]["content"][-1]["text"] += "\n" + el["text"]
@@ -245,13 +346,49 @@ def get_clean_message_list(
                         output_message_list[-1]["content"].append(el)
         else:
             if flatten_messages_as_text:
-                content = message["content"][0]["text"]
-            else:
-                content = message["content"]
-            output_message_list.append({"role": message["role"], "content": content})
+                content = content[0]["text"]
+            output_message_list.append({"role": role, "content": content})
     return output_message_list
 
 
+def _get_clean_content_element(element: dict, convert_images_to_image_urls: bool, flatten_messages_as_text: bool):
+    assert isinstance(element, dict), "Error: this element should be a dict:" + str(element)
+    element = dict(element)
+    if element["type"] == "image":
+        assert not flatten_messages_as_text, f"Cannot use images with {flatten_messages_as_text=}"
+        if convert_images_to_image_urls:
+            element.update(
+                {
+                    "type": "image_url",
+                    "image_url": {"url": make_image_url(_encode_image_base64_cached(element.pop("image")))},
+                }
+            )
+        else:
+            element["image"] = _encode_image_base64_cached(element["image"])
+    return element
+
+
+# Maps id(image) to (weak reference to the image, base64 encoding), so that the images kept in the agent's memory
+# are encoded once rather than on every step. Entries are dropped when their image is garbage collected.
+_image_base64_cache: dict[int, tuple[weakref.ref, str]] = {}
+
+
+def _encode_image_base64_cached(image) -> str:
+    """Encodes an image to base64, reusing the encoding computed for the same image object if any.
+    Images are assumed not to be modified in place once they were sent to a model."""
+    key = id(image)
+    cached = _image_base64_cache.get(key)
+    if cached is not None and cached[0]() is image:
+        return cached[1]
+    encoded_image = encode_image_base64(image)
+    try:
+        image_ref = weakref.ref(image, lambda _, key=key: _image_base64_cache.pop(key, None))
+    except TypeError:  # Not weak-referenceable, e.g. bytes
+        return encoded_image
+    _image_base64_cache[key] = (image_ref, encoded_image)
+    return encoded_image
+
+
 def get_tool_call_from_text(text: str, tool_name_key: str, tool_arguments_key: str) -> ChatMessageToolCall:
     tool_call_dictionary, _ = parse_json_blob(text)
     try:
@@ -288,6 +425,300 @@ def supports_stop_parameter(model_id: str) -> bool:
     return not re.match(pattern, model_name)
 
 
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+
+def get_error_status_code(error: BaseException) -> int | None:
+    """Returns the HTTP status code of an error raised by an API client, if any."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def _parse_duration(value: str) -> float | None:
+    """Parses a duration in seconds, or in the "1m30s" / "250ms" format of the `x-ratelimit-reset-*` headers."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    matches = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value)
+    if not matches or "".join(number + unit for number, unit in matches) != value.replace(" ", ""):
+        return None
+    unit_seconds = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * unit_seconds[unit] for number, unit in matches)
+
+
+def get_retry_after(error: BaseException) -> float | None:
+    """Returns the delay in seconds requested by the provider in the response headers of an error, if any.
+
+    Honors the `retry-after-ms` and `retry-after` headers (in seconds or as an HTTP date), and for 429 errors the
+    `x-ratelimit-reset-requests` and `x-ratelimit-reset-tokens` headers.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None)
+    if not headers:
+        return None
+    try:
+        headers = {str(key).lower(): str(value) for key, value in headers.items()}
+    except AttributeError:
+        return None
+    if "retry-after-ms" in headers:
+        try:
+            return max(float(headers["retry-after-ms"]) / 1000, 0.0)
+        except ValueError:
+            pass
+    if "retry-after" in headers:
+        retry_after = _parse_duration(headers["retry-after"])
+        if retry_after is None:
+            try:
+                retry_date = parsedate_to_datetime(headers["retry-after"])
+                retry_after = retry_date.timestamp() - time.time()
+            except (TypeError, ValueError):
+                retry_after = None
+        if retry_after is not None:
+            return max(retry_after, 0.0)
+    if get_error_status_code(error) == 429:
+        resets = [
+            _parse_duration(headers[header])
+            for header in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+            if header in headers
+        ]
+        resets = [reset for reset in resets if reset is not None]
+        if resets:
+            return max(max(resets), 0.0)
+    return None
+
+
+class RateLimiter:
+    """Token bucket limiting the rate of the requests sent to a model.
+
+    Without `requests_per_minute` requests are never throttled, except after a call to `pause`, which makes every user of
+    the limiter wait, e.g. until the delay requested by a provider in a `Retry-After` header is over.
+
+    Args:
+        requests_per_minute (`float`, *optional*): Maximum sustained request rate. Defaults to no limit.
+        burst (`int`, default `1`): Number of requests that can be sent at once after an idle period.
+    """
+
+    def __init__(self, requests_per_minute: float | None = None, burst: int = 1):
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = Lock()
+
+    def _refill(self, now: float) -> None:
+        if self.requests_per_minute:
+            self._tokens = min(
+                float(self.burst), self._tokens + (now - self._last_refill) * self.requests_per_minute / 60
+            )
+        self._last_refill = now
+
+    def pause(self, seconds: float) -> None:
+        """Blocks all the requests for the next `seconds` seconds."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _try_acquire(self) -> float:
+        """Takes a token if a request can be sent now and returns 0, otherwise returns the time to wait in seconds."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = self._paused_until - now
+            if self.requests_per_minute and self._tokens < 1:
+                wait = max(wait, (1 - self._tokens) * 60 / self.requests_per_minute)
+            if wait <= 0:
+                if self.requests_per_minute:
+                    self._tokens -= 1
+                return 0.0
+            return wait
+
+    def acquire(self) -> float:
+        """Waits until a request can be sent, and returns the time waited in seconds."""
+        waited = 0.0
+        while (wait := self._try_acquire()) > 0:
+            time.sleep(wait)
+            waited += wait
+        return waited
+
+    async def aacquire(self) -> float:
+        """Asynchronous version of `acquire`, waiting without blocking the event loop."""
+        waited = 0.0
+        while (wait := self._try_acquire()) > 0:
+            await asyncio.sleep(wait)
+            waited += wait
+        return waited
+
+
+_rate_limiters: dict[tuple[str, str | None], RateLimiter] = {}
+_rate_limiters_lock = Lock()
+
+
+def get_rate_limiter(
+    provider: str, model_id: str | None, requests_per_minute: float | None = None, burst: int | None = None
+) -> RateLimiter:
+    """Returns the rate limiter of a provider and model, shared by all the agents of the process.
+
+    Args:
+        provider (`str`): Name of the provider serving the model.
+        model_id (`str`, *optional*): Identifier of the model.
+        requests_per_minute (`float`, *optional*): If set, updates the maximum request rate of the limiter.
+        burst (`int`, *optional*): If set, updates the number of requests that can be sent at once.
+    """
+    with _rate_limiters_lock:
+        rate_limiter = _rate_limiters.get((provider, model_id))
+        if rate_limiter is None:
+            rate_limiter = _rate_limiters[(provider, model_id)] = RateLimiter()
+    with rate_limiter._lock:
+        if requests_per_minute is not None:
+            rate_limiter.requests_per_minute = requests_per_minute
+        if burst is not None:
+            rate_limiter.burst = burst
+    return rate_limiter
+
+
+_shared_clients: dict[tuple, Any] = {}
+_shared_clients_lock = Lock()
+
+
+def get_shared_client(key: tuple, create_client: Callable[[], Any]) -> Any:
+    """Returns the API client registered under `key`, creating it with `create_client` on first use.
+
+    The clients are shared by all the models of the process, so their connection pools are reused across agents.
+
+    Args:
+        key (`tuple`): Key identifying the client configuration, like the client class, base URL and credentials.
+        create_client (`Callable[[], Any]`): Function creating the client.
+    """
+    with _shared_clients_lock:
+        if key not in _shared_clients:
+            _shared_clients[key] = create_client()
+        return _shared_clients[key]
+
+
+def clear_shared_clients() -> None:
+    """Forgets all the shared API clients, e.g. after their credentials were rotated."""
+    with _shared_clients_lock:
+        _shared_clients.clear()
+
+
+class RetryPolicy:
+    """Retries the transient failures of model calls with exponential backoff and jitter.
+
+    Rate limit (429), timeout and server errors, as well as connection errors, are retried. When the provider sends
+    a `Retry-After` (or equivalent) header, its delay is used instead of the backoff, and the rate limiter passed to
+    `call` is paused for that delay so that every agent using the same model waits too.
+
+    Args:
+        max_retries (`int`, default `3`): Maximum number of retries after the first attempt.
+        initial_delay (`float`, default `1.0`): Backoff delay in seconds before the first retry.
+        max_delay (`float`, default `60.0`): Maximum backoff delay in seconds.
+        backoff_factor (`float`, default `2.0`): Factor by which the backoff delay grows with each retry.
+        jitter (`bool`, default `True`): Whether to wait a random delay between 0 and the backoff delay ("full jitter"),
+            so that concurrent clients do not retry in lockstep.
+        retryable_errors (`tuple[type[BaseException], ...]`, *optional*): Additional error types to retry.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        initial_delay: float = 1.0,
+        max_delay: float = 60.0,
+        backoff_factor: float = 2.0,
+        jitter: bool = True,
+        retryable_errors: tuple[type[BaseException], ...] = (),
+    ):
+        self.max_retries = max_retries
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.retryable_errors = (ConnectionError, TimeoutError) + tuple(retryable_errors)
+
+    def is_retryable(self, error: BaseException) -> bool:
+        if isinstance(error, self.retryable_errors):
+            return True
+        status_code = get_error_status_code(error)
+        if status_code is not None:
+            return status_code in RETRYABLE_STATUS_CODES
+        # Client libraries (httpx, requests, openai, litellm...) have their own connection and timeout errors
+        return any(
+            hint in error_type.__name__
+            for error_type in type(error).__mro__
+            for hint in ("Timeout", "Connection", "RateLimit")
+        )
+
+    def get_delay(self, retry_number: int, error: BaseException | None = None) -> float:
+        """Returns the delay in seconds before the retry `retry_number` (starting at 1) of a call that raised `error`."""
+        if error is not None:
+            retry_after = get_retry_after(error)
+            if retry_after is not None:
+                return retry_after
+        delay = min(self.max_delay, self.initial_delay * self.backoff_factor ** (retry_number - 1))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def call(
+        self,
+        func: Callable[[], Any],
+        rate_limiter: RateLimiter | None = None,
+        on_retry: Callable[[BaseException, int, float], None] | None = None,
+    ) -> Any:
+        """Calls `func` until it succeeds, a non transient error is raised, or the retries are exhausted.
+
+        Args:
+            func (`Callable[[], Any]`): Function performing the model call.
+            rate_limiter (`RateLimiter`, *optional*): Rate limiter to acquire before each attempt.
+            on_retry (`Callable[[BaseException, int, float], None]`, *optional*): Called before each retry with the error,
+                the retry number and the delay before the retry.
+        """
+        retry_number = 0
+        while True:
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            try:
+                return func()
+            except Exception as e:
+                retry_number += 1
+                time.sleep(self._prepare_retry(e, retry_number, rate_limiter, on_retry))
+
+    async def acall(
+        self,
+        func: Callable[[], Awaitable[Any]],
+        rate_limiter: RateLimiter | None = None,
+        on_retry: Callable[[BaseException, int, float], None] | None = None,
+    ) -> Any:
+        """Asynchronous version of `call`, where `func` returns an awaitable performing the model call."""
+        retry_number = 0
+        while True:
+            if rate_limiter is not None:
+                await rate_limiter.aacquire()
+            try:
+                return await func()
+            except Exception as e:
+                retry_number += 1
+                await asyncio.sleep(self._prepare_retry(e, retry_number, rate_limiter, on_retry))
+
+    def _prepare_retry(
+        self,
+        error: Exception,
+        retry_number: int,
+        rate_limiter: RateLimiter | None,
+        on_retry: Callable[[BaseException, int, float], None] | None,
+    ) -> float:
+        """Raises `error` if it must not be retried, otherwise returns the delay to sleep before the retry."""
+        if retry_number > self.max_retries or not self.is_retryable(error):
+            raise error
+        delay = self.get_delay(retry_number, error)
+        if on_retry is not None:
+            on_retry(error, retry_number, delay)
+        if rate_limiter is not None and get_retry_after(error) is not None:
+            # The provider asked every client to wait: the next `acquire` waits for everyone
+            rate_limiter.pause(delay)
+            return 0.0
+        return delay
+
+
 class Model:
     def __init__(
         self,
@@ -394,6 +825,52 @@ class Model:
         """
         raise NotImplementedError("This method must be implemented in child classes")
 
+    async def agenerate(
+        self,
+        messages: list[dict[str, str | list[dict]]],
+        stop_sequences: list[str] | None = None,
+        grammar: str | None = None,
+        tools_to_call_from: list[Tool] | None = None,
+        **kwargs,
+    ) -> ChatMessage:
+        """Asynchronous version of `generate`, taking the same arguments.
+
+        Models whose client has no asynchronous API run `generate` in a worker thread.
+        """
+        return await asyncio.to_thread(
+            self.generate,
+            messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            **kwargs,
+        )
+
+    async def agenerate_stream(
+        self,
+        messages: list[dict[str, str | list[dict]]],
+        stop_sequences: list[str] | None = None,
+        grammar: str | None = None,
+        tools_to_call_from: list[Tool] | None = None,
+        **kwargs,
+    ) -> AsyncGenerator[CompletionDelta]:
+        """Asynchronous version of `generate_stream`, taking the same arguments.
+
+        Models whose client has no asynchronous API iterate over `generate_stream` in a worker thread.
+        """
+        stream = iter(
+            self.generate_stream(
+                messages,
+                stop_sequences=stop_sequences,
+                grammar=grammar,
+                tools_to_call_from=tools_to_call_from,
+                **kwargs,
+            )
+        )
+        end_of_stream = object()
+        while (delta := await asyncio.to_thread(next, stream, end_of_stream)) is not end_of_stream:
+            yield delta
+
     def __call__(self, *args, **kwargs):
         return self.generate(*args, **kwargs)
 
@@ -458,6 +935,192 @@ class Model:
         return model_instance
 
 
+class CachedModel(Model):
+    """Wrapper caching the responses of a model on disk, to replay agent runs without querying the model again.
+
+    Requests are keyed by a hash of the cleaned messages, the stop sequences, the grammar, the tools and the other
+    generation arguments, including those of the wrapped model. Each response is stored with its token counts in a
+    JSON file of `cache_dir`. When the files exceed `max_size` bytes, the least recently used ones are evicted.
+
+    Parameters:
+        model (`Model`):
+            The model whose responses are cached.
+        cache_dir (`str | Path`, default `".model_cache"`):
+            Directory of the cache, created if needed. It can be shared by several models: the model id is part of the key.
+        mode (`str`, default `"record"`):
+            - `"record"`: Returns the cached response if any, otherwise queries the model and caches its response.
+            - `"replay"`: Only returns cached responses, and raises a `KeyError` for requests that are not cached.
+            - `"passthrough"`: Always queries the model, without reading nor writing the cache.
+        max_size (`int`, default `1_000_000_000`):
+            Maximum total size in bytes of the cached responses.
+
+    Example:
+    ```python
+    >>> model = CachedModel(InferenceClientModel(), cache_dir="runs_cache")
+    >>> agent = CodeAgent(tools=[], model=model)
+    >>> agent.run("What is 2 ** 10?")  # The second run of the same task replays the first one
+    ```
+    """
+
+    def __init__(
+        self,
+        model: Model,
+        cache_dir: str | Path = ".model_cache",
+        mode: str = "record",
+        max_size: int = 1_000_000_000,
+    ):
+        if mode not in ("record", "replay", "passthrough"):
+            raise ValueError(f"Unknown cache mode {mode!r}: should be 'record', 'replay' or 'passthrough'.")
+        super().__init__(model_id=model.model_id)
+        self.model = model
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.mode = mode
+        self.max_size = max_size
+        # Size of each cached response by key, from the least to the most recently used
+        self._sizes: OrderedDict[str, int] = OrderedDict(
+            (path.stem, path.stat().st_size)
+            for path in sorted(self.cache_dir.glob("*.json"), key=lambda path: path.stat().st_mtime)
+        )
+        self._total_size = sum(self._sizes.values())
+        self._lock = Lock()
+
+    def get_cache_key(
+        self,
+        messages: list[dict[str, str | list[dict]]],
+        stop_sequences: list[str] | None = None,
+        grammar: str | None = None,
+        tools_to_call_from: list[Tool] | None = None,
+        stream: bool = False,
+        **kwargs,
+    ) -> str:
+        """Returns the stable hash identifying a request in the cache."""
+        request = {
+            "model_id": self.model.model_id,
+            "model_kwargs": self.model.kwargs,
+            "messages": get_clean_message_list(messages, role_conversions=tool_role_conversions),
+            "stop_sequences": stop_sequences,
+            "grammar": grammar,
+            "tools": [get_tool_json_schema(tool) for tool in tools_to_call_from] if tools_to_call_from else None,
+            "stream": stream,
+            "kwargs": kwargs,
+        }
+        serialized_request = json.dumps(request, sort_keys=True, ensure_ascii=False, default=repr)
+        return hashlib.sha256(serialized_request.encode("utf-8")).hexdigest()
+
+    def _load(self, key: str) -> dict | None:
+        with self._lock:
+            if key not in self._sizes:
+                return None
+            self._sizes.move_to_end(key)
+        path = self.cache_dir / f"{key}.json"
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)
+        except (OSError, ValueError):  # Evicted or removed meanwhile
+            return None
+        self.last_input_token_count = entry["input_token_count"]
+        self.last_output_token_count = entry["output_token_count"]
+        return entry
+
+    def _store(self, key: str, entry: dict):
+        serialized_entry = json.dumps(
+            {
+                **entry,
+                "input_token_count": self.last_input_token_count,
+                "output_token_count": self.last_output_token_count,
+            },
+            ensure_ascii=False,
+        )
+        path = self.cache_dir / f"{key}.json"
+        temporary_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        temporary_path.write_text(serialized_entry, encoding="utf-8")
+        os.replace(temporary_path, path)
+        with self._lock:
+            self._total_size += path.stat().st_size - self._sizes.pop(key, 0)
+            self._sizes[key] = path.stat().st_size
+            while self._total_size > self.max_size and len(self._sizes) > 1:
+                evicted_key, evicted_size = self._sizes.popitem(last=False)
+                self._total_size -= evicted_size
+                (self.cache_dir / f"{evicted_key}.json").unlink(missing_ok=True)
+
+    def _get_cached_entry(self, key: str) -> dict | None:
+        if self.mode == "passthrough":
+            return None
+        entry = self._load(key)
+        if entry is None and self.mode == "replay":
+            raise KeyError(f"No cached response for request {key} in {self.cache_dir}.")
+        return entry
+
+    def _copy_token_counts(self):
+        self.last_input_token_count = self.model.last_input_token_count
+        self.last_output_token_count = self.model.last_output_token_count
+
+    def generate(
+        self,
+        messages: list[dict[str, str | list[dict]]],
+        stop_sequences: list[str] | None = None,
+        grammar: str | None = None,
+        tools_to_call_from: list[Tool] | None = None,
+        **kwargs,
+    ) -> ChatMessage:
+        key = self.get_cache_key(messages, stop_sequences, grammar, tools_to_call_from, **kwargs)
+        entry = self._get_cached_entry(key)
+        if entry is not None:
+            return ChatMessage.from_dict(entry["message"])
+        message = self.model.generate(
+            messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            **kwargs,
+        )
+        self._copy_token_counts()
+        if self.mode == "record":
+            self._store(key, {"message": get_dict_from_nested_dataclasses(message, ignore_key="raw")})
+        return message
+
+    def generate_stream(
+        self,
+        messages: list[dict[str, str | list[dict]]],
+        stop_sequences: list[str] | None = None,
+        grammar: str | None = None,
+        tools_to_call_from: list[Tool] | None = None,
+        **kwargs,
+    ) -> Generator[CompletionDelta]:
+        key = self.get_cache_key(messages, stop_sequences, grammar, tools_to_call_from, stream=True, **kwargs)
+        entry = self._get_cached_entry(key)
+        if entry is not None:
+            for delta in entry["deltas"]:
+                tool_calls = ChatMessage.from_dict({"role": MessageRole.ASSISTANT, **delta}).tool_calls
+                tool_call_fragments = [
+                    ToolCallFragment(**fragment) for fragment in delta.get("tool_call_fragments") or []
+                ]
+                yield CompletionDelta(
+                    content=delta.get("content"),
+                    tool_calls=tool_calls,
+                    tool_call_fragments=tool_call_fragments or None,
+                )
+            return
+        deltas = []
+        for delta in self.model.generate_stream(
+            messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            **kwargs,
+        ):
+            deltas.append(delta)
+            yield delta
+        self._copy_token_counts()
+        # Only complete streams are stored
+        if self.mode == "record":
+            self._store(key, {"deltas": [get_dict_from_nested_dataclasses(delta) for delta in deltas]})
+
+    def parse_tool_calls(self, message: ChatMessage) -> ChatMessage:
+        return self.model.parse_tool_calls(message)
+
+
 class VLLMModel(Model):
     """Model to use [vLLM](https://docs.vllm.ai/) for fast LLM inference and serving.
 
@@ -666,6 +1329,184 @@ class MLXModel(Model):
         )
 
 
+class StopSequenceMatcher:
+    """Aho-Corasick automaton matching stop sequences in a text received incrementally.
+
+    The state of the matcher for a given text is a single integer: feeding new text to it costs a constant
+    amortized time per character, whatever the length of the text already received, which is never stored.
+
+    Parameters:
+        stop_sequences (`list[str]`): Stop sequences to match.
+    """
+
+    def __init__(self, stop_sequences: list[str]):
+        # State 0 is the root, each state is a prefix of a stop sequence.
+        self.transitions: list[dict[str, int]] = [{}]
+        self.is_match: list[bool] = [False]
+        for stop_sequence in stop_sequences:
+            if not stop_sequence:
+                continue
+            state = 0
+            for character in stop_sequence:
+                if character not in self.transitions[state]:
+                    self.transitions.append({})
+                    self.is_match.append(False)
+                    self.transitions[state][character] = len(self.transitions) - 1
+                state = self.transitions[state][character]
+            self.is_match[state] = True
+        # Failure links: longest proper suffix of a state that is also a state, computed breadth-first.
+        self.failures = [0] * len(self.transitions)
+        states_to_visit = list(self.transitions[0].values())
+        for state in states_to_visit:
+            for character, next_state in self.transitions[state].items():
+                failure = self.failures[state]
+                while failure and character not in self.transitions[failure]:
+                    failure = self.failures[failure]
+                self.failures[next_state] = self.transitions[failure].get(character, 0)
+                self.is_match[next_state] = self.is_match[next_state] or self.is_match[self.failures[next_state]]
+                states_to_visit.append(next_state)
+
+    def feed(self, state: int, text: str) -> tuple[int, bool]:
+        """Feeds text to the matcher in `state` (0 for a new text).
+
+        Returns:
+            `tuple[int, bool]`: The new state, and whether a stop sequence was found in the text received so far.
+        """
+        found = False
+        for character in text:
+            while state and character not in self.transitions[state]:
+                state = self.failures[state]
+            state = self.transitions[state].get(character, 0)
+            found = found or self.is_match[state]
+        return state, found
+
+
+@lru_cache(maxsize=128)
+def get_stop_sequence_matcher(stop_sequences: tuple[str, ...]) -> StopSequenceMatcher:
+    """Returns the `StopSequenceMatcher` for the given stop sequences, built once for each tuple of stop sequences."""
+    return StopSequenceMatcher(list(stop_sequences))
+
+
+class GenerationBatcher:
+    """Collects concurrent generation requests into batches processed by a single function call.
+
+    A background thread waits for a first request, then for up to `batch_window` seconds for more requests,
+    and calls `generate_batch` with up to `max_batch_size` requests sharing the same batch key.
+    Requests with different batch keys (e.g. different generation parameters) are processed in separate calls.
+
+    Parameters:
+        generate_batch (`Callable[[list[Any]], list[Any]]`):
+            Function processing a list of requests and returning the list of their results, in the same order.
+        max_batch_size (`int`, default `8`):
+            Maximum number of requests processed in a single call.
+        batch_window (`float`, default `0.01`):
+            Time to wait for more requests after the first one of a batch, in seconds.
+    """
+
+    def __init__(
+        self,
+        generate_batch: Callable[[list[Any]], list[Any]],
+        max_batch_size: int = 8,
+        batch_window: float = 0.01,
+    ):
+        self.generate_batch = generate_batch
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self._requests: queue.Queue = queue.Queue()
+        self._thread: Thread | None = None
+        self._lock = Lock()
+
+    def submit(self, request: Any, batch_key: Any = None) -> Future:
+        """Queues a request and returns a future resolved with its result."""
+        future: Future = Future()
+        self._requests.put((batch_key, request, future))
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._process_requests, daemon=True)
+                self._thread.start()
+        return future
+
+    def _collect_batch(self) -> list[tuple[Any, Any, Future]]:
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining_time = deadline - time.monotonic()
+            if remaining_time <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=remaining_time))
+            except queue.Empty:
+                break
+        return batch
+
+    def _process_requests(self):
+        while True:
+            groups: dict[Any, list[tuple[Any, Future]]] = {}
+            for batch_key, request, future in self._collect_batch():
+                groups.setdefault(batch_key, []).append((request, future))
+            for group in groups.values():
+                try:
+                    results = self.generate_batch([request for request, _ in group])
+                except Exception as e:
+                    for _, future in group:
+                        future.set_exception(e)
+                else:
+                    for (_, future), result in zip(group, results):
+                        future.set_result(result)
+
+
+def _common_prefix_length(token_ids: list[int], other_token_ids: list[int]) -> int:
+    length = 0
+    for token_id, other_token_id in zip(token_ids, other_token_ids):
+        if token_id != other_token_id:
+            break
+        length += 1
+    return length
+
+
+class PrefixCache:
+    """LRU of the key/value caches of previous generations, indexed by the token ids they were computed for.
+
+    An agent conversation only grows by appending messages, so the prompt of a step starts with the tokens of the
+    previous step: its prefill can resume from the key/value cache of the previous generation instead of starting over.
+
+    Args:
+        max_entries (`int`): Maximum number of caches kept, e.g. one per concurrent conversation.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int, tuple[list[int], Any]] = OrderedDict()
+        self._next_key = 0
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def pop(self, token_ids: list[int]) -> tuple[Any | None, int]:
+        """Removes the cache sharing the longest token prefix with `token_ids`, and returns it with the prefix length.
+
+        The cache is removed since generating from it modifies it: it is to be given back with `put` afterwards.
+        """
+        with self._lock:
+            best_key, best_length = None, 0
+            for key, (entry_token_ids, _) in self._entries.items():
+                length = _common_prefix_length(entry_token_ids, token_ids)
+                if length > best_length:
+                    best_key, best_length = key, length
+            if best_key is None:
+                return None, 0
+            return self._entries.pop(best_key)[1], best_length
+
+    def put(self, token_ids: list[int], cache: Any) -> None:
+        """Adds the cache computed for `token_ids`, evicting the least recently used caches beyond `max_entries`."""
+        with self._lock:
+            self._entries[self._next_key] = (token_ids, cache)
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
 class TransformersModel(Model):
     """A class that uses Hugging Face's Transformers library for language model interaction.
 
@@ -684,6 +1525,15 @@ class TransformersModel(Model):
             The torch_dtype to initialize your model with.
         trust_remote_code (bool, default `False`):
             Some models on the Hub require running remote code: for this model, you would have to set this flag to True.
+        max_batch_size (`int`, default `1`):
+            Maximum number of concurrent `generate` calls (e.g. from agents running in parallel threads) batched
+            into a single `model.generate()` call. Defaults to 1, i.e. no batching. `generate_stream` is not batched.
+        batch_window (`float`, default `0.01`):
+            When batching, time to wait for concurrent `generate` calls after the first one, in seconds.
+        prefix_cache_size (`int`, default `2`):
+            Number of key/value caches of previous generations kept in memory, e.g. one per concurrent conversation.
+            A prompt starting with the tokens of a cached generation, like the next step of an agent, only prefills
+            its new tokens. Set to 0 to disable. Not used by batched generations.
         kwargs (dict, *optional*):
             Any additional keyword arguments that you want to use in model.generate(), for instance `max_new_tokens` or `device`.
         **kwargs:
@@ -712,6 +1562,9 @@ class TransformersModel(Model):
         device_map: str | None = None,
         torch_dtype: str | None = None,
         trust_remote_code: bool = False,
+        max_batch_size: int = 1,
+        batch_window: float = 0.01,
+        prefix_cache_size: int = 2,
         **kwargs,
     ):
         try:
@@ -774,28 +1627,94 @@ class TransformersModel(Model):
                 raise e
         except Exception as e:
             raise ValueError(f"Failed to load tokenizer and model for {model_id=}: {e}") from e
+        # Decoded text of each token id, filled by the stopping criteria
+        self._token_texts: dict[int, str] = {}
+        self.batcher = (
+            GenerationBatcher(self._generate_batch, max_batch_size=max_batch_size, batch_window=batch_window)
+            if max_batch_size > 1
+            else None
+        )
+        self.prefix_cache = PrefixCache(prefix_cache_size) if prefix_cache_size > 0 else None
         super().__init__(flatten_messages_as_text=not self._is_vlm, model_id=model_id, **kwargs)
 
+    def _get_prefix_cache_kwargs(self, generation_kwargs: dict[str, Any]) -> dict[str, Any]:
+        """
+        Returns the additional `model.generate()` kwargs to get back the key/value cache of the generation and, if a
+        cached generation shares a prefix with the prompt, to start from the cache of this prefix.
+        The cache class of the model is left unchanged when no cache is reused.
+        """
+        if (
+            self.prefix_cache is None
+            or generation_kwargs.get("num_return_sequences", 1) > 1
+            or "past_key_values" in generation_kwargs
+            or "return_dict_in_generate" in generation_kwargs
+        ):
+            return {}
+        token_ids = generation_kwargs["inputs"][0].tolist()
+        past_key_values, prefix_length = self.prefix_cache.pop(token_ids)
+        # At least the last prompt token is prefilled, to get the logits of the first generated token
+        prefix_length = min(prefix_length, len(token_ids) - 1)
+        if past_key_values is None or prefix_length <= 0:
+            return {"return_dict_in_generate": True}
+        past_key_values.crop(prefix_length)
+        return {"return_dict_in_generate": True, "past_key_values": past_key_values}
+
+    def _put_prefix_cache(self, token_ids: list[int], past_key_values: Any | None) -> None:
+        # Only caches that can be cropped back to a prefix can be reused, e.g. not sliding window caches
+        if past_key_values is None or not hasattr(past_key_values, "crop"):
+            return
+        # The cache holds the keys and values of every token but the last generated one
+        self.prefix_cache.put(token_ids[: past_key_values.get_seq_length()], past_key_values)
+
     def make_stopping_criteria(self, stop_sequences: list[str], tokenizer) -> "StoppingCriteriaList":
+        """Stopping criteria stopping each generated sequence as soon as it contains one of `stop_sequences`."""
+        return self.make_batch_stopping_criteria([stop_sequences], tokenizer)
+
+    def make_batch_stopping_criteria(
+        self, stop_sequences_per_row: list[list[str]], tokenizer
+    ) -> "StoppingCriteriaList":
+        """Stopping criteria for a batch of generations, where each row has its own stop sequences.
+
+        The text of each generated token is decoded once per token id, and fed to a `StopSequenceMatcher` whose
+        state is kept per row: the work per generated token does not depend on the length of the output.
+        """
+        import torch
         from transformers import StoppingCriteria, StoppingCriteriaList
 
+        token_texts = self._token_texts
+
         class StopOnStrings(StoppingCriteria):
-            def __init__(self, stop_strings: list[str], tokenizer):
-                self.stop_strings = stop_strings
-                self.tokenizer = tokenizer
-                self.stream = ""
+            def __init__(self, matchers: list[StopSequenceMatcher]):
+                self.matchers = matchers
+                self.states = [0] * len(matchers)
+                self.done = [False] * len(matchers)
 
             def reset(self):
-                self.stream = ""
+                self.states = [0] * len(self.matchers)
+                self.done = [False] * len(self.matchers)
 
             def __call__(self, input_ids, scores, **kwargs):
-                generated = self.tokenizer.decode(input_ids[0][-1], skip_special_tokens=True)
-                self.stream += generated
-                if any([self.stream.endswith(stop_string) for stop_string in self.stop_strings]):
-                    return True
-                return False
-
-        return StoppingCriteriaList([StopOnStrings(stop_sequences, tokenizer)])
+                if len(self.matchers) == 1 and input_ids.shape[0] > 1:
+                    # The same stop sequences apply to all rows, e.g. with num_return_sequences > 1
+                    self.matchers = self.matchers * input_ids.shape[0]
+                    self.states = self.states * input_ids.shape[0]
+                    self.done = self.done * input_ids.shape[0]
+                for row, token_id in enumerate(input_ids[:, -1].tolist()):
+                    if self.done[row]:
+                        continue
+                    text = token_texts.get(token_id)
+                    if text is None:
+                        text = token_texts[token_id] = tokenizer.decode(token_id, skip_special_tokens=True)
+                    self.states[row], self.done[row] = self.matchers[row].feed(self.states[row], text)
+                return torch.tensor(self.done, dtype=torch.bool, device=input_ids.device)
+
+        return StoppingCriteriaList(
+            [
+                StopOnStrings(
+                    [get_stop_sequence_matcher(tuple(stop_sequences)) for stop_sequences in stop_sequences_per_row]
+                )
+            ]
+        )
 
     def _prepare_completion_args(
         self,
@@ -862,10 +1781,25 @@ class TransformersModel(Model):
             **kwargs,
         )
         count_prompt_tokens = generation_kwargs["inputs"].shape[1]  # type: ignore
-        out = self.model.generate(
-            **generation_kwargs,
-        )
-        generated_tokens = out[0, count_prompt_tokens:]
+        if self.batcher is not None:
+            batch_key = repr(
+                sorted(
+                    (key, value)
+                    for key, value in generation_kwargs.items()
+                    if key not in ("inputs", "stopping_criteria")
+                )
+            )
+            generated_tokens = self.batcher.submit((generation_kwargs, stop_sequences), batch_key=batch_key).result()
+        else:
+            prefix_cache_kwargs = self._get_prefix_cache_kwargs(generation_kwargs)
+            out = self.model.generate(
+                **generation_kwargs,
+                **prefix_cache_kwargs,
+            )
+            if prefix_cache_kwargs:
+                self._put_prefix_cache(out.sequences[0].tolist(), out.past_key_values)
+                out = out.sequences
+            generated_tokens = out[0, count_prompt_tokens:]
         if hasattr(self, "processor"):
             output_text = self.processor.decode(generated_tokens, skip_special_tokens=True)
         else:
@@ -882,9 +1816,52 @@ class TransformersModel(Model):
             raw={
                 "out": output_text,
                 "completion_kwargs": {key: value for key, value in generation_kwargs.items() if key != "inputs"},
+                "input_token_count": count_prompt_tokens,
+                "output_token_count": len(generated_tokens),
             },
         )
 
+    def _generate_batch(self, requests: list[tuple[dict[str, Any], list[str] | None]]) -> list[Any]:
+        """Runs a single `model.generate()` call for requests `(generation_kwargs, stop_sequences)` with the same
+        generation parameters: prompts are left-padded, and each row stops on its own stop sequences.
+        Returns the generated tokens of each request, without padding.
+        """
+        import torch
+
+        tokenizer = self.processor.tokenizer if hasattr(self, "processor") else self.tokenizer
+        pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        prompts = [generation_kwargs["inputs"][0] for generation_kwargs, _ in requests]
+        max_prompt_length = max(len(prompt) for prompt in prompts)
+        input_ids = torch.full(
+            (len(prompts), max_prompt_length), pad_token_id, dtype=prompts[0].dtype, device=prompts[0].device
+        )
+        attention_mask = torch.zeros((len(prompts), max_prompt_length), dtype=torch.long, device=prompts[0].device)
+        for row, prompt in enumerate(prompts):
+            input_ids[row, max_prompt_length - len(prompt) :] = prompt
+            attention_mask[row, max_prompt_length - len(prompt) :] = 1
+
+        stop_sequences_per_row = [stop_sequences or [] for _, stop_sequences in requests]
+        generation_kwargs = {
+            key: value for key, value in requests[0][0].items() if key not in ("inputs", "stopping_criteria")
+        }
+        out = self.model.generate(
+            inputs=input_ids,
+            attention_mask=attention_mask,
+            pad_token_id=pad_token_id,
+            stopping_criteria=self.make_batch_stopping_criteria(stop_sequences_per_row, tokenizer=tokenizer)
+            if any(stop_sequences_per_row)
+            else None,
+            **generation_kwargs,
+        )
+        generated_tokens = []
+        for row_tokens in out[:, max_prompt_length:]:
+            # Rows finished before the longest one are right-padded
+            length = len(row_tokens)
+            while length > 0 and row_tokens[length - 1] == pad_token_id:
+                length -= 1
+            generated_tokens.append(row_tokens[:length])
+        return generated_tokens
+
     def generate_stream(
         self,
         messages: list[dict[str, str | list[dict]]],
@@ -902,7 +1879,13 @@ class TransformersModel(Model):
         )
         count_prompt_tokens = generation_kwargs["inputs"].shape[1]  # type: ignore
 
-        thread = Thread(target=self.model.generate, kwargs={"streamer": self.streamer, **generation_kwargs})
+        prefix_cache_kwargs = self._get_prefix_cache_kwargs(generation_kwargs)
+        outputs = []
+        thread = Thread(
+            target=lambda: outputs.append(
+                self.model.generate(streamer=self.streamer, **generation_kwargs, **prefix_cache_kwargs)
+            ),
+        )
         thread.start()
 
         self.last_output_token_count = 0
@@ -914,6 +1897,12 @@ class TransformersModel(Model):
 
         self.last_input_token_count = count_prompt_tokens
         thread.join()
+        if prefix_cache_kwargs and outputs:
+            # Only the prompt part of the cache is kept
+            past_key_values = outputs[0].past_key_values
+            if hasattr(past_key_values, "crop"):
+                past_key_values.crop(count_prompt_tokens)
+            self._put_prefix_cache(generation_kwargs["inputs"][0].tolist(), past_key_values)
 
 
 class ApiModel(Model):
@@ -931,20 +1920,75 @@ class ApiModel(Model):
             Mapping to convert  between internal role names and API-specific role names. Defaults to None.
         client (`Any`, **optional**):
             Pre-configured API client instance. If not provided, a default client will be created. Defaults to None.
+        async_client (`Any`, **optional**):
+            Pre-configured asynchronous API client instance, used by `agenerate` and `agenerate_stream`.
+            If not provided, a default client will be created on first use. Defaults to None.
+        share_client (`bool`, default `False`):
+            Whether to use the clients shared by all the models of the process with the same client class and
+            configuration (base URL, credentials, client kwargs), instead of creating new ones. This reuses their
+            connection pools across agents. See `get_shared_client`.
+        max_connections (`int`, default `100`):
+            Maximum number of connections of the connection pool of shared clients, for the clients that support it.
         **kwargs: Additional keyword arguments to pass to the parent class.
     """
 
     def __init__(
-        self, model_id: str, custom_role_conversions: dict[str, str] | None = None, client: Any | None = None, **kwargs
+        self,
+        model_id: str,
+        custom_role_conversions: dict[str, str] | None = None,
+        client: Any | None = None,
+        async_client: Any | None = None,
+        share_client: bool = False,
+        max_connections: int = 100,
+        **kwargs,
     ):
         super().__init__(model_id=model_id, **kwargs)
         self.custom_role_conversions = custom_role_conversions or {}
-        self.client = client or self.create_client()
+        self.share_client = share_client
+        self.max_connections = max_connections
+        self.client = client or self._get_client(self.create_client)
+        self._async_client = async_client
+
+    def _get_client(self, create_client: Callable[[], Any]) -> Any:
+        if not self.share_client:
+            return create_client()
+        client_kwargs = getattr(self, "client_kwargs", None) or {}
+        configuration = json.dumps(client_kwargs, sort_keys=True, default=repr)
+        key = (type(self).__name__, create_client.__name__, self.max_connections, configuration)
+        return get_shared_client(key, create_client)
 
     def create_client(self):
         """Create the API client for the specific service."""
         raise NotImplementedError("Subclasses must implement this method to create a client")
 
+    @property
+    def async_client(self):
+        """The asynchronous API client, created with `create_async_client` on first use."""
+        if self._async_client is None:
+            self._async_client = self._get_client(self.create_async_client)
+        return self._async_client
+
+    def create_async_client(self):
+        """Create the asynchronous API client for the specific service."""
+        raise NotImplementedError("Subclasses must implement this method to create an asynchronous client")
+
+    def _process_stream_event(self, event) -> CompletionDelta | None:
+        """Record the token counts of a streamed chat completion chunk and return its content delta, if any."""
+        delta = None
+        if event.choices:
+            if event.choices[0].delta is None:
+                if not getattr(event.choices[0], "finish_reason", None):
+                    raise ValueError(f"No content or tool calls in event: {event}")
+            else:
+                delta = CompletionDelta(
+                    content=event.choices[0].delta.content,
+                    tool_call_fragments=get_tool_call_fragments(event.choices[0].delta),
+                )
+        if getattr(event, "usage", None):
+            self.last_input_token_count = event.usage.prompt_tokens
+            self.last_output_token_count = event.usage.completion_tokens
+        return delta
+
 
 class LiteLLMModel(ApiModel):
     """Model to use [LiteLLM Python SDK](https://docs.litellm.ai/docs/#litellm-python-sdk) to access hundreds of LLMs.
@@ -1007,6 +2051,9 @@ class LiteLLMModel(ApiModel):
 
         return litellm
 
+    def _completion(self, completion_kwargs: dict[str, Any]) -> Any:
+        return self.client.completion(**completion_kwargs)
+
     def generate(
         self,
         messages: list[dict[str, str | list[dict]]],
@@ -1028,7 +2075,7 @@ class LiteLLMModel(ApiModel):
             **kwargs,
         )
 
-        response = self.client.completion(**completion_kwargs)
+        response = self._completion(completion_kwargs)
 
         self.last_input_token_count = response.usage.prompt_tokens
         self.last_output_token_count = response.usage.completion_tokens
@@ -1045,8 +2092,6 @@ class LiteLLMModel(ApiModel):
         tools_to_call_from: list[Tool] | None = None,
         **kwargs,
     ) -> Generator:
-        if tools_to_call_from:
-            raise NotImplementedError("Streaming is not yet supported for tool calling")
         completion_kwargs = self._prepare_completion_kwargs(
             messages=messages,
             stop_sequences=stop_sequences,
@@ -1058,17 +2103,188 @@ class LiteLLMModel(ApiModel):
             **kwargs,
         )
         for event in self.client.completion(**completion_kwargs, stream=True, stream_options={"include_usage": True}):
-            if event.choices:
-                if event.choices[0].delta is None:
-                    if not getattr(event.choices[0], "finish_reason", None):
-                        raise ValueError(f"No content or tool calls in event: {event}")
-                else:
-                    yield CompletionDelta(
-                        content=event.choices[0].delta.content,
-                    )
-            if getattr(event, "usage", None):
-                self.last_input_token_count = event.usage.prompt_tokens
-                self.last_output_token_count = event.usage.completion_tokens
+            delta = self._process_stream_event(event)
+            if delta is not None:
+                yield delta
+
+    async def agenerate(
+        self,
+        messages: list[dict[str, str | list[dict]]],
+        stop_sequences: list[str] | None = None,
+        grammar: str | None = None,
+        tools_to_call_from: list[Tool] | None = None,
+        **kwargs,
+    ) -> ChatMessage:
+        completion_kwargs = self._prepare_completion_kwargs(
+            messages=messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            model=self.model_id,
+            api_base=self.api_base,
+            api_key=self.api_key,
+            convert_images_to_image_urls=True,
+            custom_role_conversions=self.custom_role_conversions,
+            **kwargs,
+        )
+
+        response = await self.client.acompletion(**completion_kwargs)
+
+        self.last_input_token_count = response.usage.prompt_tokens
+        self.last_output_token_count = response.usage.completion_tokens
+        return ChatMessage.from_dict(
+            response.choices[0].message.model_dump(include={"role", "content", "tool_calls"}),
+            raw=response,
+        )
+
+    async def agenerate_stream(
+        self,
+        messages: list[dict[str, str | list[dict]]],
+        stop_sequences: list[str] | None = None,
+        grammar: str | None = None,
+        tools_to_call_from: list[Tool] | None = None,
+        **kwargs,
+    ) -> AsyncGenerator[CompletionDelta]:
+        completion_kwargs = self._prepare_completion_kwargs(
+            messages=messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            model=self.model_id,
+            custom_role_conversions=self.custom_role_conversions,
+            convert_images_to_image_urls=True,
+            **kwargs,
+        )
+        async for event in await self.client.acompletion(
+            **completion_kwargs, stream=True, stream_options={"include_usage": True}
+        ):
+            delta = self._process_stream_event(event)
+            if delta is not None:
+                yield delta
+
+
+class LatencyTracker:
+    """Tracks the latency of the requests sent to each deployment of a model, to predict which one is the fastest.
+
+    Args:
+        alpha (`float`, default `0.3`): Smoothing factor of the exponentially weighted moving average (EWMA) of the
+            latencies of a deployment, used as its predicted latency.
+        window (`int`, default `100`): Number of most recent latencies kept per deployment to compute percentiles.
+        failure_latency (`float`, default `60.0`): Latency in seconds counted in the EWMA of a deployment for a failed
+            request, so that failing deployments are avoided.
+        decay_half_life (`float`, *optional*, default `30.0`): Time in seconds after which the predicted latency of a
+            deployment that got no request is halved. Deployments avoided after failures or slow requests are thus
+            tried again later. If None, predicted latencies only change with new requests.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.3,
+        window: int = 100,
+        failure_latency: float = 60.0,
+        decay_half_life: float | None = 30.0,
+    ):
+        self.alpha = alpha
+        self.window = window
+        self.failure_latency = failure_latency
+        self.decay_half_life = decay_half_life
+        # EWMA of each deployment, with the time it was last updated
+        self._ewma: dict[str, tuple[float, float]] = {}
+        self._latencies: dict[str, deque[float]] = {}
+        self._lock = Lock()
+
+    def _update_ewma(self, deployment: str, latency: float) -> None:
+        previous = self.predict(deployment) if deployment in self._ewma else None
+        ewma = latency if previous is None else self.alpha * latency + (1 - self.alpha) * previous
+        self._ewma[deployment] = (ewma, time.monotonic())
+
+    def record(self, deployment: str, latency: float) -> None:
+        """Records the latency in seconds of a successful request."""
+        with self._lock:
+            self._update_ewma(deployment, latency)
+            self._latencies.setdefault(deployment, deque(maxlen=self.window)).append(latency)
+
+    def record_failure(self, deployment: str, latency: float) -> None:
+        """Records a failed request, which only counts in the predicted latency."""
+        with self._lock:
+            self._update_ewma(deployment, max(latency, self.failure_latency))
+
+    def predict(self, deployment: str) -> float:
+        """Returns the predicted latency of a deployment, 0 for a deployment never used so that it gets tried."""
+        if deployment not in self._ewma:
+            return 0.0
+        ewma, updated_at = self._ewma[deployment]
+        if self.decay_half_life is None:
+            return ewma
+        return ewma * 0.5 ** ((time.monotonic() - updated_at) / self.decay_half_life)
+
+    def percentile(self, deployment: str, percentile: float) -> float | None:
+        """Returns a percentile of the recent latencies of a deployment, or None if it has no successful request."""
+        with self._lock:
+            latencies = sorted(self._latencies.get(deployment, ()))
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, round(percentile / 100 * (len(latencies) - 1)))]
+
+    def sample_count(self, deployment: str) -> int:
+        return len(self._latencies.get(deployment, ()))
+
+    def rank(self, deployments: list[str]) -> list[str]:
+        """Returns the deployments sorted by increasing predicted latency."""
+        return sorted(deployments, key=self.predict)
+
+
+def hedged_call(
+    primary: Callable[[], Any],
+    backup: Callable[[], Any] | None,
+    hedge_delay: float,
+    on_discarded: Callable[[Any], None] | None = None,
+) -> Any:
+    """Calls `primary`, and `backup` too if `primary` did not succeed within `hedge_delay` seconds.
+
+    Returns the result of the first call to succeed, or raises the error of the primary call if both fail. A losing
+    call cannot be interrupted: it completes in a background thread, then its result is passed to `on_discarded`,
+    e.g. to account for its token usage.
+
+    Args:
+        primary (`Callable[[], Any]`): Call to run first.
+        backup (`Callable[[], Any]`, *optional*): Duplicate call, run if the primary one is too slow or fails.
+        hedge_delay (`float`): Delay in seconds after which the backup call is started.
+        on_discarded (`Callable[[Any], None]`, *optional*): Called with the result of a successful losing call.
+    """
+
+    def start(call: Callable[[], Any]) -> Future:
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(call())
+            except BaseException as e:
+                future.set_exception(e)
+
+        Thread(target=run, daemon=True).start()
+        return future
+
+    def discard(future: Future) -> None:
+        if on_discarded is not None and future.exception() is None:
+            on_discarded(future.result())
+
+    futures = [start(primary)]
+    wait_futures(futures, timeout=hedge_delay)
+    if backup is not None and (not futures[0].done() or futures[0].exception() is not None):
+        futures.append(start(backup))
+
+    pending = set(futures)
+    while pending:
+        done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+        successful = [future for future in futures if future in done and future.exception() is None]
+        if successful:
+            for future in successful[1:]:
+                discard(future)
+            for future in pending:
+                future.add_done_callback(discard)
+            return successful[0].result()
+    raise futures[0].exception()
 
 
 class LiteLLMRouterModel(LiteLLMModel):
@@ -1093,6 +2309,17 @@ class LiteLLMRouterModel(LiteLLMModel):
             Useful for specific models that do not support specific message roles like "system".
         flatten_messages_as_text (`bool`, *optional*): Whether to flatten messages as text.
             Defaults to `True` for models that start with "ollama", "groq", "cerebras".
+        latency_routing (`bool`, default `False`):
+            Whether to send each `generate` request to the deployment of the model group with the lowest predicted
+            latency, instead of letting the router choose. The latencies of each deployment, identified by its router id
+            (`model_info["id"]`, listed in `deployments`), are tracked in `latency_tracker`. Predictions of deployments
+            left unused, e.g. after a failure, decay over time so that they get tried again.
+        hedge_percentile (`float`, *optional*):
+            If set, e.g. to 95, `generate` sends a duplicate ("hedged") request to the next fastest deployment when the
+            first one did not answer after this percentile of its recent latencies, and uses the first answer. The
+            token usage of the discarded answers is accumulated in `hedge_token_counts`. Implies `latency_routing`.
+        hedge_min_samples (`int`, default `5`):
+            Number of latencies observed for a deployment before requests to it are hedged.
         **kwargs:
             Additional keyword arguments to pass to the LiteLLM Router completion method.
 
@@ -1141,18 +2368,37 @@ class LiteLLMRouterModel(LiteLLMModel):
         client_kwargs: dict[str, Any] | None = None,
         custom_role_conversions: dict[str, str] | None = None,
         flatten_messages_as_text: bool | None = None,
+        latency_routing: bool = False,
+        hedge_percentile: float | None = None,
+        hedge_min_samples: int = 5,
         **kwargs,
     ):
         self.client_kwargs = {
             "model_list": model_list,
             **(client_kwargs or {}),
         }
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency_tracker = LatencyTracker() if latency_routing or hedge_percentile is not None else None
+        self.hedge_token_counts = {"input_token_count": 0, "output_token_count": 0}
+        self._hedge_token_counts_lock = Lock()
         super().__init__(
             model_id=model_id,
             custom_role_conversions=custom_role_conversions,
             flatten_messages_as_text=flatten_messages_as_text,
             **kwargs,
         )
+        # Ids given by the router to the deployments of the model group: replicas of a model, e.g. on several
+        # `api_base`, share the same model name but not the same id
+        self.deployments = (
+            [
+                deployment["model_info"]["id"]
+                for deployment in self.client.model_list
+                if deployment.get("model_name") == model_id
+            ]
+            if self.latency_tracker is not None
+            else []
+        )
 
     def create_client(self):
         try:
@@ -1163,6 +2409,41 @@ class LiteLLMRouterModel(LiteLLMModel):
             ) from e
         return Router(**self.client_kwargs)
 
+    def _deployment_completion(self, deployment: str, completion_kwargs: dict[str, Any]) -> Any:
+        start_time = time.monotonic()
+        try:
+            # The router sends requests whose model is a deployment id to this deployment
+            response = self.client.completion(**{**completion_kwargs, "model": deployment})
+        except Exception:
+            self.latency_tracker.record_failure(deployment, time.monotonic() - start_time)
+            raise
+        self.latency_tracker.record(deployment, time.monotonic() - start_time)
+        return response
+
+    def _count_hedge_tokens(self, response: Any) -> None:
+        with self._hedge_token_counts_lock:
+            self.hedge_token_counts["input_token_count"] += response.usage.prompt_tokens
+            self.hedge_token_counts["output_token_count"] += response.usage.completion_tokens
+
+    def _completion(self, completion_kwargs: dict[str, Any]) -> Any:
+        if self.latency_tracker is None or not self.deployments:
+            return super()._completion(completion_kwargs)
+        ranked_deployments = self.latency_tracker.rank(self.deployments)
+        primary = ranked_deployments[0]
+        hedge_delay = None
+        if self.hedge_percentile is not None and self.latency_tracker.sample_count(primary) >= self.hedge_min_samples:
+            hedge_delay = self.latency_tracker.percentile(primary, self.hedge_percentile)
+        if hedge_delay is None:
+            return self._deployment_completion(primary, completion_kwargs)
+        # With a single deployment, the duplicate request may still be served faster
+        backup = ranked_deployments[1] if len(ranked_deployments) > 1 else primary
+        return hedged_call(
+            lambda: self._deployment_completion(primary, completion_kwargs),
+            lambda: self._deployment_completion(backup, completion_kwargs),
+            hedge_delay,
+            on_discarded=self._count_hedge_tokens,
+        )
+
 
 class InferenceClientModel(ApiModel):
     """A class to interact with Hugging Face's Inference Providers for language model interaction.
@@ -1250,6 +2531,12 @@ class InferenceClientModel(ApiModel):
 
         return InferenceClient(**self.client_kwargs)
 
+    def create_async_client(self):
+        """Create the asynchronous Hugging Face client."""
+        from huggingface_hub import AsyncInferenceClient
+
+        return AsyncInferenceClient(**self.client_kwargs)
+
     def generate(
         self,
         messages: list[dict[str, str | list[dict]]],
@@ -1281,8 +2568,6 @@ class InferenceClientModel(ApiModel):
         tools_to_call_from: list[Tool] | None = None,
         **kwargs,
     ) -> Generator:
-        if tools_to_call_from:
-            raise NotImplementedError("Streaming is not yet supported for tool calling")
         completion_kwargs = self._prepare_completion_kwargs(
             messages=messages,
             stop_sequences=stop_sequences,
@@ -1296,17 +2581,57 @@ class InferenceClientModel(ApiModel):
         for event in self.client.chat.completions.create(
             **completion_kwargs, stream=True, stream_options={"include_usage": True}
         ):
-            if event.choices:
-                if event.choices[0].delta is None:
-                    if not getattr(event.choices[0], "finish_reason", None):
-                        raise ValueError(f"No content or tool calls in event: {event}")
-                else:
-                    yield CompletionDelta(
-                        content=event.choices[0].delta.content,
-                    )
-            if getattr(event, "usage", None):
-                self.last_input_token_count = event.usage.prompt_tokens
-                self.last_output_token_count = event.usage.completion_tokens
+            delta = self._process_stream_event(event)
+            if delta is not None:
+                yield delta
+
+    async def agenerate(
+        self,
+        messages: list[dict[str, str | list[dict]]],
+        stop_sequences: list[str] | None = None,
+        grammar: str | None = None,
+        tools_to_call_from: list[Tool] | None = None,
+        **kwargs,
+    ) -> ChatMessage:
+        completion_kwargs = self._prepare_completion_kwargs(
+            messages=messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            convert_images_to_image_urls=True,
+            custom_role_conversions=self.custom_role_conversions,
+            **kwargs,
+        )
+        response = await self.async_client.chat_completion(**completion_kwargs)
+
+        self.last_input_token_count = response.usage.prompt_tokens
+        self.last_output_token_count = response.usage.completion_tokens
+        return ChatMessage.from_dict(asdict(response.choices[0].message), raw=response)
+
+    async def agenerate_stream(
+        self,
+        messages: list[dict[str, str | list[dict]]],
+        stop_sequences: list[str] | None = None,
+        grammar: str | None = None,
+        tools_to_call_from: list[Tool] | None = None,
+        **kwargs,
+    ) -> AsyncGenerator[CompletionDelta]:
+        completion_kwargs = self._prepare_completion_kwargs(
+            messages=messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            model=self.model_id,
+            custom_role_conversions=self.custom_role_conversions,
+            convert_images_to_image_urls=True,
+            **kwargs,
+        )
+        async for event in await self.async_client.chat.completions.create(
+            **completion_kwargs, stream=True, stream_options={"include_usage": True}
+        ):
+            delta = self._process_stream_event(event)
+            if delta is not None:
+                yield delta
 
 
 class HfApiModel(InferenceClientModel):
@@ -1377,7 +2702,33 @@ class OpenAIServerModel(ApiModel):
                 "Please install 'openai' extra to use OpenAIServerModel: `pip install 'smolagents[openai]'`"
             ) from e
 
-        return openai.OpenAI(**self.client_kwargs)
+        return openai.OpenAI(**self._get_pooled_client_kwargs(openai))
+
+    def create_async_client(self):
+        try:
+            import openai
+        except ModuleNotFoundError as e:
+            raise ModuleNotFoundError(
+                "Please install 'openai' extra to use OpenAIServerModel: `pip install 'smolagents[openai]'`"
+            ) from e
+
+        return openai.AsyncOpenAI(**self._get_pooled_client_kwargs(openai, asynchronous=True))
+
+    def _get_pooled_client_kwargs(self, openai, asynchronous: bool = False) -> dict[str, Any]:
+        """Returns the client kwargs, with an HTTP client sized to `max_connections` for shared clients.
+
+        HTTP/2 is used if the `h2` package is installed.
+        """
+        if not self.share_client or "http_client" in self.client_kwargs:
+            return self.client_kwargs
+        import httpx
+
+        http_client_class = openai.DefaultAsyncHttpxClient if asynchronous else openai.DefaultHttpxClient
+        http_client = http_client_class(
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            http2=_is_package_available("h2"),
+        )
+        return {**self.client_kwargs, "http_client": http_client}
 
     def generate_stream(
         self,
@@ -1387,8 +2738,6 @@ class OpenAIServerModel(ApiModel):
         tools_to_call_from: list[Tool] | None = None,
         **kwargs,
     ) -> Generator:
-        if tools_to_call_from:
-            raise NotImplementedError("Streaming is not yet supported for tool calling")
         completion_kwargs = self._prepare_completion_kwargs(
             messages=messages,
             stop_sequences=stop_sequences,
@@ -1402,17 +2751,9 @@ class OpenAIServerModel(ApiModel):
         for event in self.client.chat.completions.create(
             **completion_kwargs, stream=True, stream_options={"include_usage": True}
         ):
-            if event.choices:
-                if event.choices[0].delta is None:
-                    if not getattr(event.choices[0], "finish_reason", None):
-                        raise ValueError(f"No content or tool calls in event: {event}")
-                else:
-                    yield CompletionDelta(
-                        content=event.choices[0].delta.content,
-                    )
-            if getattr(event, "usage", None):
-                self.last_input_token_count = event.usage.prompt_tokens
-                self.last_output_token_count = event.usage.completion_tokens
+            delta = self._process_stream_event(event)
+            if delta is not None:
+                yield delta
 
     def generate(
         self,
@@ -1441,6 +2782,58 @@ class OpenAIServerModel(ApiModel):
             raw=response,
         )
 
+    async def agenerate_stream(
+        self,
+        messages: list[dict[str, str | list[dict]]],
+        stop_sequences: list[str] | None = None,
+        grammar: str | None = None,
+        tools_to_call_from: list[Tool] | None = None,
+        **kwargs,
+    ) -> AsyncGenerator[CompletionDelta]:
+        completion_kwargs = self._prepare_completion_kwargs(
+            messages=messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            model=self.model_id,
+            custom_role_conversions=self.custom_role_conversions,
+            convert_images_to_image_urls=True,
+            **kwargs,
+        )
+        async for event in await self.async_client.chat.completions.create(
+            **completion_kwargs, stream=True, stream_options={"include_usage": True}
+        ):
+            delta = self._process_stream_event(event)
+            if delta is not None:
+                yield delta
+
+    async def agenerate(
+        self,
+        messages: list[dict[str, str | list[dict]]],
+        stop_sequences: list[str] | None = None,
+        grammar: str | None = None,
+        tools_to_call_from: list[Tool] | None = None,
+        **kwargs,
+    ) -> ChatMessage:
+        completion_kwargs = self._prepare_completion_kwargs(
+            messages=messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            model=self.model_id,
+            custom_role_conversions=self.custom_role_conversions,
+            convert_images_to_image_urls=True,
+            **kwargs,
+        )
+        response = await self.async_client.chat.completions.create(**completion_kwargs)
+        self.last_input_token_count = response.usage.prompt_tokens
+        self.last_output_token_count = response.usage.completion_tokens
+
+        return ChatMessage.from_dict(
+            response.choices[0].message.model_dump(include={"role", "content", "tool_calls"}),
+            raw=response,
+        )
+
 
 class AzureOpenAIServerModel(OpenAIServerModel):
     """This model connects to an Azure OpenAI deployment.
@@ -1496,7 +2889,17 @@ class AzureOpenAIServerModel(OpenAIServerModel):
                 "Please install 'openai' extra to use AzureOpenAIServerModel: `pip install 'smolagents[openai]'`"
             ) from e
 
-        return openai.AzureOpenAI(**self.client_kwargs)
+        return openai.AzureOpenAI(**self._get_pooled_client_kwargs(openai))
+
+    def create_async_client(self):
+        try:
+            import openai
+        except ModuleNotFoundError as e:
+            raise ModuleNotFoundError(
+                "Please install 'openai' extra to use AzureOpenAIServerModel: `pip install 'smolagents[openai]'`"
+            ) from e
+
+        return openai.AsyncAzureOpenAI(**self._get_pooled_client_kwargs(openai, asynchronous=True))
 
 
 class AmazonBedrockServerModel(ApiModel):
@@ -1674,6 +3077,8 @@ __all__ = [
     "tool_role_conversions",
     "get_clean_message_list",
     "Model",
+    "GenerationBatcher",
+    "CachedModel",
     "MLXModel",
     "TransformersModel",
     "ApiModel",
@@ -1686,4 +3091,14 @@ __all__ = [
     "AzureOpenAIServerModel",
     "AmazonBedrockServerModel",
     "ChatMessage",
+    "RateLimiter",
+    "RetryPolicy",
+    "get_rate_limiter",
+    "get_shared_client",
+    "clear_shared_clients",
+    "LatencyTracker",
+    "hedged_call",
+    "CompletionDelta",
+    "ToolCallFragment",
+    "ToolCallStreamAssembler",
 ]
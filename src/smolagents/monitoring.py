@@ -15,10 +15,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import json
+import time
 from enum import IntEnum
 
 from rich import box
 from rich.console import Console, Group
+from rich.live import Live
+from rich.markdown import Markdown
 from rich.panel import Panel
 from rich.rule import Rule
 from rich.syntax import Syntax
@@ -82,6 +85,119 @@ class LogLevel(IntEnum):
 YELLOW_HEX = "#d4b702"
 
 
+def _find_markdown_block_end(text: str) -> int:
+    """Returns the offset right after the last complete top-level block of a Markdown text, or 0 if there is none.
+
+    A block is complete once it is followed by a blank line, or once its closing code fence line is complete.
+    The text is assumed to start outside of a code fence.
+    """
+    block_end = 0
+    position = 0
+    in_fence = False
+    lines = text.split("\n")
+    # The last element is either empty or a line still being written
+    for line in lines[:-1]:
+        position += len(line) + 1
+        stripped = line.strip()
+        if stripped.startswith(("```", "~~~")):
+            in_fence = not in_fence
+            if not in_fence:
+                block_end = position
+        elif not in_fence and not stripped:
+            block_end = position
+    return block_end
+
+
+class MarkdownStreamRenderer:
+    """Renders a stream of Markdown deltas to a console with a bounded rendering overhead.
+
+    Deltas are accumulated in a list and only rendered every `refresh_interval` seconds, or as soon as
+    `refresh_chars` characters are pending. Completed blocks (paragraphs followed by a blank line, closed code fences)
+    are printed once above the live display, so that each refresh only parses and renders the last, still open, block.
+
+    Args:
+        console (`Console`): Console to render to.
+        refresh_interval (`float`, default `0.1`): Minimum delay in seconds between two renders.
+        refresh_chars (`int`, default `1024`): Number of pending characters that triggers a render before the delay.
+        enabled (`bool`, default `True`): If False, deltas are only accumulated and nothing is rendered.
+    """
+
+    def __init__(
+        self,
+        console: Console,
+        refresh_interval: float = 0.1,
+        refresh_chars: int = 1024,
+        enabled: bool = True,
+    ):
+        self.console = console
+        self.refresh_interval = refresh_interval
+        self.refresh_chars = refresh_chars
+        self.enabled = enabled
+        self.render_count = 0
+        self._chunks: list[str] = []
+        self._tail: list[str] = []
+        self._pending_chars = 0
+        self._last_render_time = 0.0
+        self._live: Live | None = None
+
+    def __enter__(self) -> "MarkdownStreamRenderer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def text(self) -> str:
+        """The full text received so far."""
+        return "".join(self._chunks)
+
+    def start(self) -> None:
+        if self.enabled and self._live is None:
+            self._live = Live("", console=self.console, vertical_overflow="visible", auto_refresh=False)
+            self._live.start()
+            self._last_render_time = time.monotonic()
+
+    def update(self, delta: str) -> None:
+        """Adds a delta to the stream, and renders the pending ones if the time or size interval is reached."""
+        self._chunks.append(delta)
+        if self._live is None:
+            return
+        self._tail.append(delta)
+        self._pending_chars += len(delta)
+        if (
+            self._pending_chars >= self.refresh_chars
+            or time.monotonic() - self._last_render_time >= self.refresh_interval
+        ):
+            self.refresh()
+
+    def refresh(self) -> None:
+        """Renders the pending deltas."""
+        if self._live is None:
+            return
+        tail = "".join(self._tail)
+        block_end = _find_markdown_block_end(tail)
+        completed, tail = tail[:block_end], tail[block_end:]
+        self._tail = [tail] if tail else []
+        self._live.update(Markdown(tail))
+        if completed:
+            # Printing while live redraws the live display below the printed blocks
+            self.console.print(Markdown(completed), Text(""))
+        else:
+            self._live.refresh()
+        self._pending_chars = 0
+        self._last_render_time = time.monotonic()
+        self.render_count += 1
+
+    def close(self) -> None:
+        """Renders the remaining deltas and stops the live display."""
+        if self._live is None:
+            return
+        self.refresh()
+        self._live.stop()
+        self._live = None
+
+
 class AgentLogger:
     def __init__(self, level: LogLevel = LogLevel.INFO, console: Console | None = None):
         self.level = level
@@ -126,6 +242,23 @@ class AgentLogger:
         else:
             self.log(markdown_content, level=level)
 
+    def stream_markdown(
+        self, level: LogLevel = LogLevel.INFO, refresh_interval: float = 0.1, refresh_chars: int = 1024
+    ) -> MarkdownStreamRenderer:
+        """Returns a renderer displaying streamed Markdown deltas, to be used as a context manager.
+
+        Args:
+            level (LogLevel, optional): Defaults to LogLevel.INFO.
+            refresh_interval (`float`, default `0.1`): Minimum delay in seconds between two renders.
+            refresh_chars (`int`, default `1024`): Number of pending characters that triggers a render before the delay.
+        """
+        return MarkdownStreamRenderer(
+            self.console,
+            refresh_interval=refresh_interval,
+            refresh_chars=refresh_chars,
+            enabled=level <= self.level,
+        )
+
     def log_code(self, title: str, content: str, level: int = LogLevel.INFO) -> None:
         self.log(
             Panel(
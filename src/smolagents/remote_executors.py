@@ -30,7 +30,7 @@ import requests
 from .local_python_executor import PythonExecutor
 from .monitoring import LogLevel
 from .tools import Tool, get_tools_definition_code
-from .utils import AgentError
+from .utils import AgentError, CaptureBuffer
 
 
 try:
@@ -304,8 +304,8 @@ CMD ["jupyter", "kernelgateway", "--KernelGatewayApp.ip='0.0.0.0'", "--KernelGat
             # Send execute request
             msg_id = self._send_execute_request(wrapped_code)
 
-            # Collect output and results
-            outputs = []
+            # Collect output and results, keeping only the head and the tail of long outputs
+            outputs = CaptureBuffer()
             result = None
             waiting_for_idle = False
 
@@ -325,7 +325,7 @@ CMD ["jupyter", "kernelgateway", "--KernelGatewayApp.ip='0.0.0.0'", "--KernelGat
                         result = pickle.loads(base64.b64decode(pickle_data))
                         waiting_for_idle = True
                     else:
-                        outputs.append(text)
+                        outputs.write(text)
                 elif msg_type == "error":
                     traceback = msg["content"].get("traceback", [])
                     raise AgentError("\n".join(traceback), self.logger)
@@ -333,7 +333,7 @@ CMD ["jupyter", "kernelgateway", "--KernelGatewayApp.ip='0.0.0.0'", "--KernelGat
                     if not return_final_answer or waiting_for_idle:
                         break
 
-            return result, "".join(outputs)
+            return result, outputs.getvalue()
 
         except Exception as e:
             self.logger.log_error(f"Code execution failed: {e}")
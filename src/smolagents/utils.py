@@ -19,11 +19,14 @@ import base64
 import importlib.metadata
 import importlib.util
 import inspect
+import io
 import json
 import keyword
 import os
 import re
+import threading
 import types
+from collections import deque
 from functools import lru_cache
 from io import BytesIO
 from pathlib import Path
@@ -32,6 +35,8 @@ from typing import TYPE_CHECKING, Any
 
 
 if TYPE_CHECKING:
+    import requests
+
     from smolagents.memory import AgentLogger
 
 
@@ -243,6 +248,78 @@ def truncate_content(content: str, max_length: int = MAX_LENGTH_TRUNCATE_CONTENT
         )
 
 
+class CaptureBuffer(io.TextIOBase):
+    """
+    Text buffer capturing an output with bounded memory: only the head and the tail of the output are kept.
+
+    `getvalue()` returns the same string as `truncate_content` would on the full output, without ever holding the
+    full output in memory. Can be used as a replacement for `sys.stdout` or `sys.stderr`.
+
+    Args:
+        max_length (`int | None`, default `MAX_LENGTH_TRUNCATE_CONTENT`): Maximum length of the captured output,
+            `None` to keep all of it.
+    """
+
+    def __init__(self, max_length: int | None = MAX_LENGTH_TRUNCATE_CONTENT):
+        self.max_length = max_length
+        self.clear()
+
+    def clear(self):
+        """Discards the captured output."""
+        self.head = ""
+        self.tail = deque()
+        self.tail_length = 0
+        self.length = 0
+
+    @property
+    def dropped(self) -> int:
+        """Number of characters dropped from the middle of the output."""
+        if self.max_length is None:
+            return 0
+        return max(self.length - self.max_length, 0)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self.length += len(text)
+        if self.max_length is None:
+            self.head += text
+            return len(text)
+        head_length = self.max_length // 2
+        if len(self.head) < head_length:
+            remaining = text[head_length - len(self.head) :]
+            self.head += text[: head_length - len(self.head)]
+        else:
+            remaining = text
+        if remaining:
+            # The tail is a ring of chunks: the oldest chunks are dropped once the newer ones fill the tail
+            tail_max_length = self.max_length - head_length
+            if len(remaining) >= tail_max_length:
+                self.tail.clear()
+                remaining = remaining[len(remaining) - tail_max_length :]
+                self.tail_length = 0
+            self.tail.append(remaining)
+            self.tail_length += len(remaining)
+            while len(self.tail) > 1 and self.tail_length - len(self.tail[0]) >= tail_max_length:
+                self.tail_length -= len(self.tail.popleft())
+        return len(text)
+
+    def __len__(self) -> int:
+        return len(self.getvalue())
+
+    def getvalue(self) -> str:
+        """Returns the captured output, truncated like `truncate_content` if it went over `max_length`."""
+        tail = "".join(self.tail)
+        if self.dropped == 0:
+            return self.head + tail
+        return (
+            self.head
+            + f"\n..._This content has been truncated to stay below {self.max_length} characters_...\n"
+            + tail[self.tail_length - (self.max_length - self.max_length // 2) :]
+        )
+
+
 class ImportFinder(ast.NodeVisitor):
     def __init__(self):
         self.packages = set()
@@ -454,3 +531,20 @@ def make_init_file(folder: str | Path):
 
 def is_valid_name(name: str) -> bool:
     return name.isidentifier() and not keyword.iskeyword(name) if isinstance(name, str) else False
+
+
+_http_sessions = threading.local()
+
+
+def get_http_session() -> "requests.Session":
+    """Returns the `requests` session of the current thread.
+
+    Successive requests of the thread reuse the connections of its pool instead of opening a new connection (and
+    doing a new TLS handshake) each time, as the module-level `requests.get` does.
+    """
+    session = getattr(_http_sessions, "session", None)
+    if session is None:
+        import requests
+
+        session = _http_sessions.session = requests.Session()
+    return session
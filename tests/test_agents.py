@@ -12,9 +12,12 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import asyncio
 import io
 import os
 import tempfile
+import threading
+import time
 import unittest
 import uuid
 from contextlib import nullcontext as does_not_raise
@@ -41,15 +44,20 @@ from smolagents.agents import (
     ToolCallingAgent,
     populate_template,
 )
+from smolagents.bp_tools import load_string_from_file
+from smolagents.bp_utils import get_working_dir, working_dir
 from smolagents.default_tools import DuckDuckGoSearchTool, FinalAnswerTool, PythonInterpreterTool, VisitWebpageTool
-from smolagents.memory import ActionStep, PlanningStep
+from smolagents.memory import ActionStep, PlanningStep, StepJournal, TaskStep
 from smolagents.models import (
     ChatMessage,
     ChatMessageToolCall,
     ChatMessageToolCallDefinition,
+    CompletionDelta,
     InferenceClientModel,
     MessageRole,
     Model,
+    RetryPolicy,
+    ToolCallFragment,
     TransformersModel,
 )
 from smolagents.monitoring import AgentLogger, LogLevel
@@ -378,6 +386,127 @@ class TestAgent:
         output = agent.run("Caption this image.", images=[image])
         assert output == "The image is a cat."
 
+    def test_fake_toolcalling_agent_arun(self):
+        agents = [ToolCallingAgent(tools=[PythonInterpreterTool()], model=FakeToolCallModel()) for _ in range(3)]
+
+        async def run_agents():
+            return await asyncio.gather(*(agent.arun("What is 2 multiplied by 3.6452?") for agent in agents))
+
+        outputs = asyncio.run(run_agents())
+        assert all("7.2904" in output for output in outputs)
+
+    def test_arun_waits_for_the_model_without_taking_a_worker_thread(self):
+        # The default executor of the event loop has at most 32 workers
+        agents_count = 64
+
+        class WaitingModel(FakeToolCallModel):
+            """Answers the first call of each agent only once all the agents wait for it."""
+
+            def __init__(self):
+                super().__init__()
+                self.waiting_count = 0
+                self.all_waiting = asyncio.Event()
+
+            async def agenerate(self, messages, stop_sequences=None, grammar=None, tools_to_call_from=None):
+                if len(messages) < 3:
+                    self.waiting_count += 1
+                    if self.waiting_count == agents_count:
+                        self.all_waiting.set()
+                    await asyncio.wait_for(self.all_waiting.wait(), timeout=30)
+                return self.generate(messages, tools_to_call_from, stop_sequences, grammar)
+
+        async def run_agents():
+            agents = [ToolCallingAgent(tools=[PythonInterpreterTool()], model=model) for _ in range(agents_count)]
+            return await asyncio.gather(*(agent.arun("What is 2 multiplied by 3.6452?") for agent in agents))
+
+        model = WaitingModel()
+        outputs = asyncio.run(run_agents())
+        assert outputs == ["7.2904"] * agents_count
+        assert model.all_waiting.is_set()
+
+    def test_code_agent_resumes_from_journal(self, tmp_path):
+        journal_path = tmp_path / "journal.jsonl"
+
+        class CrashingCodeModel(FakeCodeModel):
+            def generate(self, messages, stop_sequences=None, grammar=None):
+                if "special_marker" in str(messages):
+                    raise RuntimeError("Connection error")
+                return super().generate(messages, stop_sequences=stop_sequences, grammar=grammar)
+
+        agent = CodeAgent(tools=[], model=CrashingCodeModel(), journal=journal_path)
+        with pytest.raises(AgentGenerationError):
+            agent.run("What is 2 multiplied by 3.6452?")
+
+        model_calls = []
+
+        class RecordingCodeModel(FakeCodeModel):
+            def generate(self, messages, stop_sequences=None, grammar=None):
+                model_calls.append(messages)
+                return super().generate(messages, stop_sequences=stop_sequences, grammar=grammar)
+
+        agent = CodeAgent(tools=[], model=RecordingCodeModel())
+        output = agent.resume(journal_path)
+        assert output == 7.2904
+        assert len(model_calls) == 1
+        assert agent.python_executor("final_answer(result)")[0] == 2**3.6452
+        assert agent.memory.steps[0].task == "What is 2 multiplied by 3.6452?"
+        assert agent.memory.steps[1].model_output == agent.memory.steps[1].model_output_message.content
+        assert isinstance(StepJournal.load_steps(journal_path)[-1].final_answer, float)
+        assert agent.resume(journal_path) == 7.2904
+        assert len(model_calls) == 1
+
+    def test_code_agent_resume_restores_additional_args(self, tmp_path):
+        journal_path = tmp_path / "journal.jsonl"
+
+        class ArgsCodeModel(Model):
+            def __init__(self, crash=False):
+                super().__init__()
+                self.crash = crash
+
+            def generate(self, messages, stop_sequences=None, grammar=None):
+                if "special_marker" not in str(messages):
+                    code = "result = base**exponent + len(letters)"
+                elif self.crash:
+                    raise RuntimeError("Connection error")
+                else:
+                    code = "final_answer(result)"
+                return ChatMessage(
+                    role="assistant", content=f"Thought: special_marker\nCode:\n```py\n{code}\n```<end_code>"
+                )
+
+        additional_args = {"base": 2, "exponent": 3, "letters": {"a", "b"}}
+        agent = CodeAgent(tools=[], model=ArgsCodeModel(crash=True), journal=journal_path)
+        with pytest.raises(AgentGenerationError):
+            agent.run("Compute the result.", additional_args=additional_args)
+
+        agent = CodeAgent(tools=[], model=ArgsCodeModel())
+        # The set is not JSON-serializable: it could not be journaled and must be given again
+        with pytest.raises(ValueError, match="letters"):
+            agent.resume(journal_path)
+        assert agent.resume(journal_path, additional_args={"letters": {"a", "b"}}) == 10
+        assert agent.state["exponent"] == 3
+
+    def test_resume_numbers_steps_from_the_last_run(self, tmp_path):
+        journal_path = tmp_path / "journal.jsonl"
+        agent = CodeAgent(tools=[], model=FakeCodeModel(), journal=journal_path)
+        agent.run("What is 2 multiplied by 3.6452?")
+
+        class CrashingPlanningModel(FakeCodeModel):
+            def generate(self, messages, stop_sequences=None, grammar=None):
+                raise RuntimeError("Connection error")
+
+        agent.model = CrashingPlanningModel()
+        agent.planning_interval = 1
+        with pytest.raises(Exception):
+            agent.run("What is 2 multiplied by 3.6452 again?", reset=False)
+        agent.journal.close()
+
+        agent = CodeAgent(tools=[], model=FakeCodeModel(), max_steps=2)
+        assert agent.resume(journal_path) == 7.2904
+        last_task_index = max(i for i, step in enumerate(agent.memory.steps) if isinstance(step, TaskStep))
+        new_steps = agent.memory.steps[last_task_index:]
+        assert [step.step_number for step in new_steps if isinstance(step, ActionStep)] == [1]
+
     def test_fake_code_agent(self):
         agent = CodeAgent(tools=[PythonInterpreterTool()], model=FakeCodeModel())
         output = agent.run("What is 2 multiplied by 3.6452?")
@@ -1014,6 +1143,245 @@ class TestToolCallingAgent(unittest.TestCase):
         assert agent.memory.steps[1].tool_calls[0].arguments == {"location": "Paris", "date": "today"}
         assert agent.memory.steps[1].observations == "The weather in Paris on date:today is sunny."
 
+    @staticmethod
+    def make_parallel_tool_call_model(texts, tool_name="wait_and_echo"):
+        class ParallelToolCallModel(Model):
+            def generate(self, messages, tools_to_call_from=None, stop_sequences=None, grammar=None):
+                tool_calls = [
+                    ChatMessageToolCall(
+                        id=f"call_{i}",
+                        type="function",
+                        function=ChatMessageToolCallDefinition(name=tool_name, arguments={"text": text}),
+                    )
+                    for i, text in enumerate(texts)
+                ]
+                tool_calls.append(
+                    ChatMessageToolCall(
+                        id="call_final",
+                        type="function",
+                        function=ChatMessageToolCallDefinition(name="final_answer", arguments={"answer": "done"}),
+                    )
+                )
+                return ChatMessage(role="assistant", content="", tool_calls=tool_calls)
+
+        return ParallelToolCallModel()
+
+    @staticmethod
+    def make_wait_and_echo(barrier=None, release=None):
+        @tool
+        def wait_and_echo(text: str) -> str:
+            """
+            Waits, then returns the text in upper case.
+            Args:
+                text: the text
+            """
+            if text == "slow":
+                release.wait(timeout=10)
+            elif barrier is not None:
+                # Only passes if all the calls run at the same time
+                barrier.wait(timeout=10)
+            if text == "fail":
+                raise ValueError("failed")
+            return text.upper()
+
+        return wait_and_echo
+
+    def test_toolcalling_agent_executes_parallel_tool_calls_concurrently(self):
+        model = self.make_parallel_tool_call_model(["a", "fail", "c"])
+        wait_and_echo = self.make_wait_and_echo(barrier=threading.Barrier(3))
+        agent = ToolCallingAgent(model=model, tools=[wait_and_echo], max_steps=1)
+        assert agent.run("Echo the texts.") == "done"
+        assert [tool_call.id for tool_call in agent.memory.steps[1].tool_calls] == [
+            "call_0",
+            "call_1",
+            "call_2",
+            "call_final",
+        ]
+        observations = agent.memory.steps[1].observations.split("\n")
+        assert observations[:2] == ["Call id: call_0", "A"]
+        assert observations[2] == "Call id: call_1"
+        assert observations[3].startswith("Error: Error executing tool 'wait_and_echo'")
+        assert "failed" in observations[3]
+        assert observations[-2:] == ["Call id: call_2", "C"]
+
+    def test_toolcalling_agent_calls_the_same_managed_agent_one_after_the_other(self):
+        active_runs = []
+        overlapping_runs = []
+
+        class SubAgentModel(Model):
+            def generate(self, messages, tools_to_call_from=None, stop_sequences=None, grammar=None):
+                active_runs.append(1)
+                if len(active_runs) > 1:
+                    overlapping_runs.append(1)
+                # Leaves time for another run to start, if runs overlap
+                time.sleep(0.05)
+                active_runs.pop()
+                answer = "A" if "alpha" in str(messages[-1]) else "B"
+                return ChatMessage(
+                    role="assistant",
+                    content="",
+                    tool_calls=[
+                        ChatMessageToolCall(
+                            id="call_final",
+                            type="function",
+                            function=ChatMessageToolCallDefinition(name="final_answer", arguments={"answer": answer}),
+                        )
+                    ],
+                )
+
+        class ManagerModel(Model):
+            def generate(self, messages, tools_to_call_from=None, stop_sequences=None, grammar=None):
+                tool_calls = [
+                    ChatMessageToolCall(
+                        id=f"call_{task}",
+                        type="function",
+                        function=ChatMessageToolCallDefinition(name="sub", arguments={"task": task}),
+                    )
+                    for task in ["alpha", "beta"]
+                ]
+                tool_calls.append(
+                    ChatMessageToolCall(
+                        id="call_final",
+                        type="function",
+                        function=ChatMessageToolCallDefinition(name="final_answer", arguments={"answer": "done"}),
+                    )
+                )
+                return ChatMessage(role="assistant", content="", tool_calls=tool_calls)
+
+        sub_agent = ToolCallingAgent(tools=[], model=SubAgentModel(), name="sub", description="Answers tasks.")
+        agent = ToolCallingAgent(tools=[], model=ManagerModel(), managed_agents=[sub_agent], max_steps=1)
+        assert agent.run("Delegate the tasks.") == "done"
+        assert overlapping_runs == []
+        report = "Here is the final answer from your managed agent 'sub':\n"
+        assert agent.memory.steps[1].observations == f"Call id: call_alpha\n{report}A\nCall id: call_beta\n{report}B"
+
+    def test_toolcalling_agent_parallel_tool_call_timeout(self):
+        release = threading.Event()
+        model = self.make_parallel_tool_call_model(["slow", "a"])
+        wait_and_echo = self.make_wait_and_echo(release=release)
+        agent = ToolCallingAgent(model=model, tools=[wait_and_echo], max_steps=1, tool_call_timeout=0.5)
+        try:
+            agent.run("Echo the texts.")
+        finally:
+            release.set()
+        assert "Error: Tool call 'wait_and_echo' timed out after 0.5 seconds." in agent.memory.steps[1].observations
+        assert agent.memory.steps[1].observations.endswith("Call id: call_1\nA")
+
+    def test_toolcalling_agent_parallel_tool_calls_keep_the_working_dir(self):
+        barrier = threading.Barrier(2)
+        working_dirs = {}
+
+        @tool
+        def record_working_dir(text: str) -> str:
+            """
+            Records the working directory the tool sees.
+            Args:
+                text: the text
+            """
+            barrier.wait(timeout=10)
+            working_dirs[text] = get_working_dir()
+            return text
+
+        model = self.make_parallel_tool_call_model(["a", "b"], tool_name="record_working_dir")
+        agent = ToolCallingAgent(model=model, tools=[record_working_dir], max_steps=1)
+        with tempfile.TemporaryDirectory() as temp_dir, working_dir(temp_dir) as path:
+            assert agent.run("Record the working dirs.") == "done"
+        assert working_dirs == {"a": path, "b": path}
+
+    def test_toolcalling_agent_starts_streamed_tool_calls_before_the_stream_ends(self):
+        events = []
+        first_call_started = threading.Event()
+
+        class StreamingToolCallModel(Model):
+            def generate_stream(self, messages, stop_sequences=None, tools_to_call_from=None, **kwargs):
+                calls = [
+                    ("call_0", "echo", '{"text": "a"}'),
+                    ("call_1", "echo", '{"text": "b"}'),
+                    ("call_final", "final_answer", '{"answer": "done"}'),
+                ]
+                for index, (call_id, name, arguments) in enumerate(calls):
+                    yield CompletionDelta(tool_call_fragments=[ToolCallFragment(index=index, id=call_id, name=name)])
+                    for position in range(0, len(arguments), 4):
+                        fragment = ToolCallFragment(index=index, arguments=arguments[position : position + 4])
+                        yield CompletionDelta(tool_call_fragments=[fragment])
+                # The first call is complete: it must start before the stream ends
+                first_call_started.wait(timeout=10)
+                events.append("stream end")
+
+        @tool
+        def echo(text: str) -> str:
+            """
+            Returns the text in upper case.
+            Args:
+                text: the text
+            """
+            events.append(f"start {text}")
+            if text == "a":
+                first_call_started.set()
+            return text.upper()
+
+        agent = ToolCallingAgent(model=StreamingToolCallModel(), tools=[echo], max_steps=1, stream_outputs=True)
+        assert agent.run("Echo the texts.") == "done"
+        assert events.index("start a") < events.index("stream end")
+        assert [tool_call.id for tool_call in agent.memory.steps[1].tool_calls] == ["call_0", "call_1", "call_final"]
+        assert agent.memory.steps[1].observations == "Call id: call_0\nA\nCall id: call_1\nB"
+
+    @staticmethod
+    def make_streaming_tool_call_model(content, calls, error=None):
+        class StreamingToolCallModel(Model):
+            def generate_stream(self, messages, stop_sequences=None, tools_to_call_from=None, **kwargs):
+                yield CompletionDelta(content=content)
+                for index, (call_id, name, arguments) in enumerate(calls):
+                    fragment = ToolCallFragment(index=index, id=call_id, name=name, arguments=arguments)
+                    yield CompletionDelta(tool_call_fragments=[fragment])
+                if error is not None:
+                    raise error
+
+        return StreamingToolCallModel()
+
+    def test_toolcalling_agent_streams_files_saved_before_the_tool_calls(self):
+        @tool
+        def read_file(filename: str) -> str:
+            """
+            Returns the content of a file.
+            Args:
+                filename: the file name
+            """
+            return load_string_from_file(filename)
+
+        model = self.make_streaming_tool_call_model(
+            '<savetofile filename="data.txt">hello</savetofile>',
+            [
+                ("call_0", "read_file", '{"filename": "data.txt"}'),
+                ("call_final", "final_answer", '{"answer": "done"}'),
+            ],
+        )
+        agent = ToolCallingAgent(model=model, tools=[read_file], max_steps=1, stream_outputs=True)
+        with tempfile.TemporaryDirectory() as temp_dir, working_dir(temp_dir):
+            assert agent.run("Read the file.") == "done"
+        assert agent.memory.steps[1].observations == "hello"
+
+    def test_toolcalling_agent_records_started_calls_when_the_stream_fails(self):
+        @tool
+        def echo(text: str) -> str:
+            """
+            Returns the text in upper case.
+            Args:
+                text: the text
+            """
+            return text.upper()
+
+        model = self.make_streaming_tool_call_model(
+            "",
+            [("call_0", "echo", '{"text": "a"}'), ("call_1", "echo", '{"text": ')],
+            error=RuntimeError("Connection reset"),
+        )
+        agent = ToolCallingAgent(model=model, tools=[echo], max_steps=1, stream_outputs=True)
+        with pytest.raises(AgentGenerationError, match="Connection reset"):
+            agent.run("Echo the texts.")
+        assert [tool_call.id for tool_call in agent.memory.steps[1].tool_calls] == ["call_0"]
+        assert agent.memory.steps[1].observations == "Call id: call_0\nA"
+
     @patch("huggingface_hub.InferenceClient")
     def test_toolcalling_agent_api_misformatted_output(self, mock_inference_client):
         """Test that even misformatted json blobs don't interrupt the run for a ToolCallingAgent."""
@@ -1059,6 +1427,25 @@ class TestCodeAgent:
             )
         assert result == expected_summary
 
+    def test_transient_model_errors_are_retried(self):
+        class RateLimitError(Exception):
+            status_code = 429
+
+        class FlakyCodeModel(FakeCodeModel):
+            calls = 0
+
+            def generate(self, messages, stop_sequences=None, grammar=None):
+                self.calls += 1
+                if self.calls == 1:
+                    raise RateLimitError("Too many requests")
+                return super().generate(messages, stop_sequences=stop_sequences, grammar=grammar)
+
+        model = FlakyCodeModel()
+        agent = CodeAgent(tools=[], model=model, retry_policy=RetryPolicy(initial_delay=0))
+        output = agent.run("What is 2 multiplied by 3.6452?")
+        assert output == 7.2904
+        assert model.calls == 3
+
     def test_errors_logging(self):
         class FakeCodeModel(Model):
             def generate(self, messages, stop_sequences=None, grammar=None):
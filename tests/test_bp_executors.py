@@ -0,0 +1,87 @@
+import io
+
+import pytest
+from rich.console import Console
+
+from smolagents.bp_executors import ExecWorkerPool, ProcessExecExecutor
+from smolagents.monitoring import AgentLogger, LogLevel
+from smolagents.utils import AgentError
+
+
+@pytest.fixture(scope="module")
+def worker_pool():
+    pool = ExecWorkerPool(size=1, preload_modules=[])
+    yield pool
+    pool.shutdown()
+
+
+@pytest.fixture
+def process_executor(worker_pool):
+    executor = ProcessExecExecutor(
+        additional_imports=[],
+        logger=AgentLogger(LogLevel.INFO, Console(force_terminal=False, file=io.StringIO())),
+        pool=worker_pool,
+        timeout=5,
+    )
+    yield executor
+    executor.cleanup()
+
+
+class TestProcessExecExecutor:
+    def test_state_persistence_and_final_answer(self, process_executor):
+        process_executor.send_variables({"a": 2})
+        output, logs, is_final_answer = process_executor("b = a * 3\nprint('b is', b)")
+        assert (output, is_final_answer) == (None, False)
+        assert logs.startswith("b is 6\n")
+        output, _, is_final_answer = process_executor("final_answer(a + b)")
+        assert (output, is_final_answer) == (8, True)
+
+    def test_tools_are_called_in_the_agent_process(self, process_executor):
+        calls = []
+
+        def record(value):
+            calls.append(value)
+            return value.upper()
+
+        process_executor.send_tools({"record": record})
+        output, _, _ = process_executor("final_answer(record('hello'))")
+        assert output == "HELLO"
+        assert calls == ["hello"]
+
+    def test_unpicklable_tool_result_raises_in_the_worker(self, process_executor):
+        def numbers():
+            return (i for i in range(3))
+
+        process_executor.send_tools({"numbers": numbers, "double": lambda x: 2 * x})
+        with pytest.raises(AgentError, match="Tool 'numbers' returned an unpicklable value"):
+            process_executor("numbers()")
+        # The worker is still in sync with the executor
+        output, _, _ = process_executor("final_answer(double(21))")
+        assert output == 42
+
+    def test_stdout_is_streamed(self, process_executor):
+        chunks = []
+        process_executor.stdout_callback = chunks.append
+        _, logs, _ = process_executor("for i in range(3):\n    print(i)")
+        assert "".join(chunks) == "0\n1\n2\n"
+        assert logs.startswith("0\n1\n2\n")
+
+    def test_error_raises_agent_error(self, process_executor):
+        with pytest.raises(AgentError, match="ValueError: boom"):
+            process_executor("print('before')\nraise ValueError('boom')")
+
+    def test_timeout_replaces_worker(self, process_executor):
+        process_executor.timeout = 0.5
+        process_executor("a = 1")
+        with pytest.raises(AgentError, match="timed out"):
+            process_executor("while True:\n    pass")
+        with pytest.raises(AgentError, match="name 'a' is not defined"):
+            process_executor("print(a)")
+
+    def test_recycled_worker_keeps_picklable_variables(self, process_executor):
+        process_executor.max_calls_per_worker = 1
+        process_executor("a = [1, 2]")
+        first_worker = process_executor.worker
+        output, _, _ = process_executor("final_answer(sum(a))")
+        assert process_executor.worker is not first_worker
+        assert output == 3
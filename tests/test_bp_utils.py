@@ -0,0 +1,155 @@
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from smolagents.bp_thinkers import get_branch_executor, keep_best_solution, run_branches
+from smolagents.bp_tools import append_string_to_file, load_string_from_file, save_string_to_file
+from smolagents.bp_utils import Workspace, get_working_dir, resolve_path, working_dir, writable_path
+
+
+class TestWorkingDir:
+    def test_relative_paths_are_resolved_against_working_dir(self, tmp_path):
+        assert resolve_path("a.txt") == "a.txt"
+        with working_dir(tmp_path / "branch") as folder:
+            assert get_working_dir() == folder
+            save_string_to_file("hello", "a.txt")
+            assert load_string_from_file("a.txt") == "hello"
+        assert get_working_dir() is None
+        assert (tmp_path / "branch" / "a.txt").read_text() == "hello"
+
+    def test_each_thread_resolves_paths_in_its_own_working_dir(self, tmp_path):
+        barrier = threading.Barrier(2)
+        resolved_paths = {}
+
+        def resolve_in(name):
+            with working_dir(tmp_path / name):
+                # Both threads are inside their working_dir at the same time
+                barrier.wait(timeout=10)
+                resolved_paths[name] = resolve_path("a.txt")
+
+        threads = [threading.Thread(target=resolve_in, args=(name,)) for name in ["branch1", "branch2"]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert resolved_paths == {name: str(tmp_path / name / "a.txt") for name in ["branch1", "branch2"]}
+        assert resolve_path("a.txt") == "a.txt"
+        assert resolve_path(str(tmp_path / "b.txt")) == str(tmp_path / "b.txt")
+
+
+class TestWorkspace:
+    def test_snapshot_shares_files_until_written(self, tmp_path):
+        workspace = Workspace(tmp_path)
+        os.makedirs(workspace.path("solution1"))
+        with workspace.activate():
+            save_string_to_file("v1", "solution1/main.py")
+            snapshot_path = workspace.snapshot("solution1", "best")
+            assert os.path.samefile(os.path.join(snapshot_path, "main.py"), workspace.path("solution1/main.py"))
+            append_string_to_file(" v2", "solution1/main.py")
+            save_string_to_file("v3", writable_path("solution1/main.py"))
+        assert (tmp_path / "solution1" / "main.py").read_text() == "v3"
+        assert open(os.path.join(snapshot_path, "main.py")).read() == "v1"
+
+    def test_checkout_and_promote(self, tmp_path):
+        workspace = Workspace(tmp_path)
+        os.makedirs(workspace.path("solution1"))
+        (tmp_path / "solution1" / "main.py").write_text("v1")
+        workspace.snapshot("solution1", "best_solution_0")
+        workspace.checkout("best_solution_0", "solution2", shared=False)
+        assert not os.path.samefile(workspace.path("solution2/main.py"), workspace.path("solution1/main.py"))
+        assert (tmp_path / "solution2" / "main.py").read_text() == "v1"
+
+        os.makedirs(workspace.path("best_solution"))
+        workspace.promote("best_solution_0", "best_solution")
+        assert os.path.islink(workspace.path("best_solution"))
+        (tmp_path / "solution2" / "main.py").write_text("v2")
+        workspace.snapshot("solution2", "best_solution_1")
+        workspace.promote("best_solution_1", "best_solution")
+        assert (tmp_path / "best_solution" / "main.py").read_text() == "v2"
+        assert (tmp_path / ".snapshots" / "best_solution_0" / "main.py").read_text() == "v1"
+
+    def test_keep_best_solution_only_copies_edited_folders(self, tmp_path):
+        workspace = Workspace(tmp_path)
+        for solution in ["solution1", "solution2", "solution3", "best_solution"]:
+            os.makedirs(workspace.path(solution))
+        (tmp_path / "solution2" / "main.py").write_text("v1")
+        solutions = ["solution1", "solution2", "solution3"]
+        keep_best_solution(workspace, "solution2", "best_solution_0", solutions, ["solution1", "solution2"])
+        snapshot_file = workspace.snapshot_path("best_solution_0/main.py")
+        assert os.path.islink(workspace.path("best_solution"))
+        assert not os.path.samefile(workspace.path("solution1/main.py"), snapshot_file)
+        assert not os.path.samefile(workspace.path("solution2/main.py"), snapshot_file)
+        assert os.path.samefile(workspace.path("solution3/main.py"), snapshot_file)
+        with workspace.activate():
+            save_string_to_file("v2", "solution3/main.py")
+        assert (tmp_path / "best_solution" / "main.py").read_text() == "v1"
+
+        keep_best_solution(workspace, "solution3", "best_solution_1", solutions)
+        assert (tmp_path / "best_solution" / "main.py").read_text() == "v2"
+        assert os.path.samefile(
+            workspace.path("solution1/main.py"), workspace.snapshot_path("best_solution_1/main.py")
+        )
+        assert (tmp_path / ".snapshots" / "best_solution_0" / "main.py").read_text() == "v1"
+
+
+class TestBranchExecutor:
+    def test_only_branch_folders_switch_exec_to_a_worker_process(self, tmp_path):
+        # Sequential agents get no branch folder, even in a workspace other than the current folder
+        with Workspace(tmp_path).activate():
+            assert get_branch_executor("exec") == ("exec", None)
+        assert get_branch_executor("exec", tmp_path) == ("exec_process", {"working_dir": tmp_path})
+        assert get_branch_executor("local", tmp_path) == ("local", None)
+
+
+class TestRunBranches:
+    @staticmethod
+    def get_agent(folder):
+        """Fake agent factory: branches only need the folder of their agent."""
+        return SimpleNamespace(folder=folder, python_executor=SimpleNamespace())
+
+    @staticmethod
+    def make_branch(name, barrier, fail=False):
+        def branch(agent):
+            # All the branches run at the same time, each in its own folder
+            barrier.wait(timeout=10)
+            assert get_working_dir() == agent.folder
+            assert load_string_from_file(f"{name}/main.py") == "v1"
+            save_string_to_file(f"v2 of {name}", f"{name}/main.py")
+            append_string_to_file(f"advice of {name}\n", "advices.notes")
+            if fail:
+                raise RuntimeError(f"{name} failed")
+
+        return (name, branch, [name], [name])
+
+    @staticmethod
+    def make_workspace(tmp_path, names):
+        for name in names:
+            os.makedirs(tmp_path / name)
+            (tmp_path / name / "main.py").write_text("v1")
+        (tmp_path / "advices.notes").write_text("advice of the past\n")
+
+    def test_concurrent_branches_copy_their_files_in_and_out(self, tmp_path):
+        names = ["solution1", "solution2", "solution3"]
+        self.make_workspace(tmp_path, names)
+        barrier = threading.Barrier(len(names))
+        with working_dir(tmp_path):
+            run_branches([self.make_branch(name, barrier) for name in names], self.get_agent, concurrent=True)
+        for name in names:
+            assert (tmp_path / name / "main.py").read_text() == f"v2 of {name}"
+            assert (tmp_path / ".branches" / name / name / "main.py").exists()
+        advices = (tmp_path / "advices.notes").read_text().splitlines()
+        assert advices[0] == "advice of the past"
+        assert sorted(advices[1:]) == [f"advice of {name}" for name in names]
+
+    def test_failed_branch_does_not_discard_the_others(self, tmp_path):
+        names = ["solution1", "solution2"]
+        self.make_workspace(tmp_path, names)
+        barrier = threading.Barrier(len(names))
+        branches = [self.make_branch("solution1", barrier, fail=True), self.make_branch("solution2", barrier)]
+        with working_dir(tmp_path), pytest.raises(RuntimeError, match="solution1 failed"):
+            run_branches(branches, self.get_agent, concurrent=True)
+        assert (tmp_path / "solution1" / "main.py").read_text() == "v1"
+        assert (tmp_path / "solution2" / "main.py").read_text() == "v2 of solution2"
+        assert (tmp_path / "advices.notes").read_text() == "advice of the past\nadvice of solution2\n"
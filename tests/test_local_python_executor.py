@@ -39,6 +39,7 @@ from smolagents.local_python_executor import (
     evaluate_subscript,
     fix_final_answer_code,
     get_safe_module,
+    parse_code,
 )
 
 
@@ -458,6 +459,32 @@ shift_minutes = {worker: ('a', 'b') for worker, (start, end) in shifts.items()}
         result, _ = evaluate_python_code(code, BASE_PYTHON_TOOLS, state={})
         assert result == [1, 4, 9, 16, 25]
 
+    def test_generator_is_lazy(self):
+        code = dedent(
+            """
+            import itertools
+            squares = (n * n for n in itertools.count(1))
+            list(itertools.islice(squares, 3))
+            """
+        )
+        result, _ = evaluate_python_code(code, BASE_PYTHON_TOOLS, state={})
+        assert result == [1, 4, 9]
+
+    def test_comprehension_scopes(self):
+        code = dedent(
+            """
+            x = "outer"
+            pairs = {(x, y) for x in range(2) for y in range(x, 2)}
+            squares = {x: x * x for x in [1, 2] if x > 1}
+            add = lambda x, y: x + y
+            (pairs, squares, add(1, 2), x)
+            """
+        )
+        state = {}
+        result, _ = evaluate_python_code(code, BASE_PYTHON_TOOLS, state=state)
+        assert result == ({(0, 0), (0, 1), (1, 1)}, {2: 4}, 3, "outer")
+        assert "y" not in state
+
     def test_boolops(self):
         code = """if (not (a > b and a > c)) or d > e:
     best_city = "Brooklyn"
@@ -1080,6 +1107,14 @@ exec(compile('{unsafe_code}', 'no filename', 'exec'))
             dangerous_code, static_tools={"compile": compile, "eval": eval, "exec": exec} | BASE_PYTHON_TOOLS
         )
 
+    def test_dangerous_builtins_are_callable_if_added_under_another_name(self):
+        result, _ = evaluate_python_code(
+            "run('x = 1 + 1', {})", static_tools={"run": exec} | BASE_PYTHON_TOOLS, state={}
+        )
+        assert result is None
+        with pytest.raises(InterpreterError, match="Invoking a builtin function that has not been explicitly added"):
+            evaluate_python_code("run('1')", static_tools=BASE_PYTHON_TOOLS, state={"run": exec})
+
     def test_can_import_os_if_explicitly_authorized(self):
         dangerous_code = "import os; os.listdir('./')"
         evaluate_python_code(dangerous_code, authorized_imports=["os"])
@@ -1608,6 +1643,46 @@ def test_get_safe_module_handle_lazy_imports():
     assert getattr(safe_module, "non_lazy_attribute") == "ok"
 
 
+def test_get_safe_module_keeps_writes_in_the_proxy():
+    import numpy
+
+    safe_module = get_safe_module(numpy, authorized_imports=["numpy"])
+    assert safe_module.array is numpy.array
+    assert safe_module.linalg is safe_module.linalg
+    safe_module.array = None
+    safe_module.linalg.norm = None
+    assert safe_module.array is None
+    assert numpy.array is not None and numpy.linalg.norm is not None
+    # Each import gets its own proxy
+    assert get_safe_module(numpy, authorized_imports=["numpy"]).array is numpy.array
+
+
+def test_host_module_cannot_be_mutated_through_the_proxy():
+    import numpy
+
+    executor = LocalPythonExecutor(additional_authorized_imports=["numpy"])
+    executor.send_tools({})
+    with pytest.raises(InterpreterError, match="_raw_module"):
+        executor("import numpy as np\nnp._raw_module.array = 5")
+    executor("import numpy as np\nnp.array = 5")
+    assert callable(numpy.array)
+    output, _, _ = executor("import numpy as np\nnp.array([1, 2]).sum()")
+    assert output == 3
+
+
+def test_evaluate_python_code_reuses_parsed_code():
+    parse_code.cache_clear()
+    code = "x = 2\nx * 3"
+    assert evaluate_python_code(code, {}, state={}) == (6, False)
+    assert evaluate_python_code(code, {}, state={}) == (6, False)
+    assert evaluate_python_code("x = 3\nx * 3", {}, state={}) == (9, False)
+    cache_info = parse_code.cache_info()
+    assert (cache_info.hits, cache_info.misses) == (1, 2)
+
+    with pytest.raises(InterpreterError, match="Code parsing failed"):
+        evaluate_python_code("x = (", {}, state={})
+
+
 def test_non_standard_comparisons():
     code = dedent("""\
         class NonStdEqualsResult:
@@ -1663,6 +1738,12 @@ class TestPrintContainer:
         pc.append("Hello")
         assert len(pc) == 5
 
+    def test_max_length(self):
+        pc = PrintContainer(max_length=10)
+        for i in range(1000):
+            pc += f"{i}\n"
+        assert pc.value == "0\n1\n2\n..._This content has been truncated to stay below 10 characters_...\n\n999\n"
+
 
 @pytest.mark.parametrize(
     "module,authorized_imports,expected",
@@ -1,3 +1,5 @@
+import threading
+
 import pytest
 
 from smolagents.agents import ToolCall
@@ -5,13 +7,19 @@ from smolagents.memory import (
     ActionStep,
     AgentMemory,
     ChatMessage,
+    CompactionPolicy,
     MemoryStep,
     Message,
     MessageRole,
+    MessageStore,
     PlanningStep,
+    StepJournal,
     SystemPromptStep,
     TaskStep,
 )
+from smolagents.models import Model
+from smolagents.monitoring import AgentLogger, LogLevel
+from smolagents.utils import AgentExecutionError
 
 
 class TestAgentMemory:
@@ -133,6 +141,13 @@ def test_planning_step_to_messages():
     assert messages[1]["role"] == MessageRole.USER
 
 
+def test_task_step_dict_leaves_out_additional_args():
+    memory = AgentMemory(system_prompt="System prompt")
+    memory.steps.append(TaskStep(task="Task", additional_args={"lock": threading.Lock()}))
+    assert memory.get_full_steps() == [{"task": "Task", "task_images": None}]
+    assert memory.get_succinct_steps() == [{"task": "Task", "task_images": None}]
+
+
 def test_task_step_to_messages():
     task_step = TaskStep(task="This is a task.", task_images=["task_image1.png"])
     messages = task_step.to_messages(summary_mode=False)
@@ -171,3 +186,178 @@ def test_system_prompt_step_to_messages():
             assert isinstance(content, dict)
             assert "type" in content
             assert "text" in content
+
+
+class TestAgentMemoryToMessages:
+    def test_to_messages_matches_steps(self):
+        memory = AgentMemory(system_prompt="System prompt")
+        memory.steps.append(TaskStep(task="Task"))
+        memory.steps.append(ActionStep(step_number=1, model_output="Thought", observations="Observation"))
+        expected = memory.system_prompt.to_messages()
+        for step in memory.steps:
+            expected.extend(step.to_messages())
+        assert memory.to_messages() == expected
+        assert memory.to_messages(summary_mode=True) == [
+            message for step in memory.steps for message in step.to_messages(summary_mode=True)
+        ]
+
+    def test_to_messages_reuses_messages_of_previous_steps(self):
+        memory = AgentMemory(system_prompt="System prompt")
+        memory.steps.append(TaskStep(task="Task"))
+        first_messages = memory.to_messages()
+        memory.steps.append(ActionStep(step_number=1, model_output="Thought", observations="Observation"))
+        second_messages = memory.to_messages()
+        assert len(second_messages) == len(first_messages) + 2
+        assert all(new is old for new, old in zip(second_messages, first_messages))
+
+    def test_to_messages_returns_a_new_list(self):
+        memory = AgentMemory(system_prompt="System prompt")
+        messages = memory.to_messages()
+        messages.append(Message(role=MessageRole.USER, content="Extra message"))
+        assert len(memory.to_messages()) == 1
+
+    def test_to_messages_rebuilds_modified_steps(self):
+        memory = AgentMemory(system_prompt="System prompt")
+        memory.steps.append(ActionStep(step_number=1, observations="First observation"))
+        memory.steps.append(ActionStep(step_number=2, observations="Second observation"))
+        assert len(memory.to_messages()) == 3
+        memory.steps[0].observations = "Updated observation"
+        messages = memory.to_messages()
+        assert messages[1]["content"][0]["text"] == "Observation:\nUpdated observation"
+        assert messages[2]["content"][0]["text"] == "Observation:\nSecond observation"
+
+    def test_to_messages_after_reset_and_new_system_prompt(self):
+        memory = AgentMemory(system_prompt="System prompt")
+        memory.steps.append(TaskStep(task="Task"))
+        memory.to_messages()
+        memory.system_prompt = SystemPromptStep(system_prompt="New system prompt")
+        memory.reset()
+        assert memory.to_messages() == [
+            Message(role=MessageRole.SYSTEM, content=[{"type": "text", "text": "New system prompt"}])
+        ]
+
+
+class TestMessageStore:
+    def test_add_stores_each_message_once(self):
+        store = MessageStore()
+        first, second, third = [Message(role=MessageRole.USER, content=str(i)) for i in range(3)]
+        first_input = store.add([first, second])
+        second_input = store.add([first, second, third])
+        third_input = store.add([third, first])
+        assert store.messages == [first, second, third]
+        assert second_input.ranges == ((0, 3),)
+        assert first_input.expand() == [first, second]
+        assert third_input.expand() == [third, first]
+        assert all(message is stored for message, stored in zip(third_input.expand(), [third, first]))
+
+    def test_steps_expand_stored_model_input_messages(self):
+        memory = AgentMemory(system_prompt="System prompt")
+        memory.steps.append(TaskStep(task="Task"))
+        step = ActionStep(step_number=1, model_input_messages=memory.message_store.add(memory.to_messages()))
+        assert isinstance(step.model_input_messages, list)
+        assert step.model_input_messages == memory.to_messages()
+        assert step.dict()["model_input_messages"] == memory.to_messages()
+        memory.steps.append(step)
+        planning_step = PlanningStep(
+            model_input_messages=memory.message_store.add(memory.to_messages()),
+            model_output_message=ChatMessage(role=MessageRole.ASSISTANT, content="Plan"),
+            plan="Plan",
+        )
+        assert planning_step.dict()["model_input_messages"] == memory.to_messages()
+        assert len(memory.message_store.messages) == 2
+
+
+class TestStepJournal:
+    def test_steps_round_trip(self, tmp_path):
+        journal = StepJournal(tmp_path / "journal.jsonl", fsync_every=2)
+        error = AgentExecutionError("Code failed", logger=AgentLogger(LogLevel.OFF))
+        journal.append(TaskStep(task="Task"))
+        journal.append(
+            ActionStep(
+                model_input_messages=[Message(role=MessageRole.USER, content="Hello")],
+                tool_calls=[ToolCall(id="id", name="python_interpreter", arguments="print(1)")],
+                step_number=1,
+                error=error,
+                model_output_message=ChatMessage(role=MessageRole.ASSISTANT, content="Hi", raw=object()),
+                model_output="Hi",
+                observations="Observation",
+                action_output=[1, 2],
+            )
+        )
+        journal.append(
+            PlanningStep(
+                model_input_messages=[],
+                model_output_message=ChatMessage(role=MessageRole.ASSISTANT, content="Plan"),
+                plan="Plan",
+            )
+        )
+        journal.close()
+        task_step, action_step, planning_step = StepJournal.load_steps(tmp_path / "journal.jsonl")
+        assert task_step.task == "Task"
+        assert (
+            action_step.to_messages()
+            == ActionStep(
+                tool_calls=[ToolCall(id="id", name="python_interpreter", arguments="print(1)")],
+                error=error,
+                model_output="Hi",
+                observations="Observation",
+            ).to_messages()
+        )
+        assert isinstance(action_step.error, AgentExecutionError)
+        assert action_step.model_output_message == ChatMessage(role=MessageRole.ASSISTANT, content="Hi")
+        assert action_step.action_output == [1, 2]
+        assert planning_step.plan == "Plan"
+
+    def test_incomplete_last_step_is_ignored(self, tmp_path):
+        journal = StepJournal(tmp_path / "journal.jsonl")
+        journal.append(TaskStep(task="Task"))
+        journal.close()
+        with open(tmp_path / "journal.jsonl", "a") as f:
+            f.write('{"type": "TaskStep", "ta')
+        assert [step.task for step in StepJournal.load_steps(tmp_path / "journal.jsonl")] == ["Task"]
+
+
+class TestCompactionPolicy:
+    @staticmethod
+    def make_memory(compaction_policy, n_steps):
+        memory = AgentMemory(system_prompt="System prompt", compaction_policy=compaction_policy)
+        memory.steps.append(TaskStep(task="Task"))
+        for step_number in range(1, n_steps + 1):
+            memory.steps.append(
+                ActionStep(
+                    step_number=step_number, model_output="Thought " * 20, observations=f"Observation {step_number}"
+                )
+            )
+        return memory
+
+    def test_messages_within_budget_are_unchanged(self):
+        memory = self.make_memory(CompactionPolicy(max_tokens=10_000), n_steps=5)
+        memory_without_policy = self.make_memory(None, n_steps=5)
+        assert memory.to_messages() == memory_without_policy.to_messages()
+
+    def test_older_steps_are_collapsed_into_a_summary(self):
+        memory = self.make_memory(CompactionPolicy(max_tokens=100, keep_last_steps=2), n_steps=5)
+        messages = memory.to_messages()
+        assert messages[:2] == memory.system_prompt.to_messages() + memory.steps[0].to_messages()
+        summary = messages[2]["content"][0]["text"]
+        assert summary.startswith("Summary of the previous steps:\n")
+        assert "Observation 3" in summary and "Observation 4" not in summary and "Thought" not in summary
+        assert messages[3:] == memory.steps[4].to_messages() + memory.steps[5].to_messages()
+        assert memory.to_messages()[2] is messages[2]
+        assert len(memory.to_messages(summary_mode=True)) == 6
+
+    def test_summary_is_updated_with_steps_leaving_the_window(self):
+        summarizer_inputs = []
+
+        class FakeSummarizer(Model):
+            def generate(self, messages, stop_sequences=None, grammar=None, tools_to_call_from=None, **kwargs):
+                summarizer_inputs.append(messages[1]["content"][0]["text"])
+                return ChatMessage(role=MessageRole.ASSISTANT, content=f"Summary {len(summarizer_inputs)}")
+
+        memory = self.make_memory(CompactionPolicy(max_tokens=100, keep_last_steps=2, summarizer=FakeSummarizer()), 4)
+        assert memory.to_messages()[2]["content"][0]["text"] == "Summary of the previous steps:\nSummary 1"
+        memory.to_messages()
+        memory.steps.append(ActionStep(step_number=5, model_output="Thought", observations="Observation 5"))
+        assert memory.to_messages()[2]["content"][0]["text"] == "Summary of the previous steps:\nSummary 2"
+        assert len(summarizer_inputs) == 2
+        assert summarizer_inputs[1] == "Summary 1\nObservation:\nObservation 3"
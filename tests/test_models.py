@@ -12,32 +12,52 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import asyncio
 import json
 import sys
+import threading
+import time
 import unittest
 from contextlib import ExitStack
-from unittest.mock import MagicMock, patch
+from copy import deepcopy
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import numpy as np
+import PIL.Image
 import pytest
 from huggingface_hub import ChatCompletionOutputMessage
 
 from smolagents.models import (
     AmazonBedrockServerModel,
     AzureOpenAIServerModel,
+    CachedModel,
     ChatMessage,
     ChatMessageToolCall,
+    CompletionDelta,
+    GenerationBatcher,
     HfApiModel,
     InferenceClientModel,
+    LatencyTracker,
     LiteLLMModel,
     LiteLLMRouterModel,
     MessageRole,
     MLXModel,
     Model,
     OpenAIServerModel,
+    PrefixCache,
+    RateLimiter,
+    RetryPolicy,
+    StopSequenceMatcher,
+    ToolCallFragment,
+    ToolCallStreamAssembler,
     TransformersModel,
+    clear_shared_clients,
     get_clean_message_list,
+    get_rate_limiter,
     get_tool_call_from_text,
     get_tool_json_schema,
+    hedged_call,
     parse_json_if_needed,
     supports_stop_parameter,
 )
@@ -169,6 +189,227 @@ class TestModel:
         parsed_args = parse_json_if_needed(args)
         assert parsed_args == 3
 
+    def test_agenerate_stream_falls_back_to_generate_stream(self):
+        class StreamingModel(Model):
+            def generate_stream(self, messages, **kwargs):
+                yield from (CompletionDelta(content=word) for word in ["Hello", " world"])
+
+        async def collect():
+            return [delta.content async for delta in StreamingModel().agenerate_stream([])]
+
+        assert asyncio.run(collect()) == ["Hello", " world"]
+
+
+class TestStopSequenceMatcher:
+    @pytest.mark.parametrize(
+        "stop_sequences, chunks, expected_found",
+        [
+            (
+                ["<end_code>"],
+                ["Code:", "```py\nprint(1)\n```", "<end", "_code", ">"],
+                [False, False, False, False, True],
+            ),
+            (["Observation:"], ["Obs", "erv", "Observation", ":"], [False, False, False, True]),
+            (["abcd", "bc"], ["a", "b", "c"], [False, False, True]),
+            (["aab"], ["a", "a", "a", "b"], [False, False, False, True]),
+            (["stop"], ["no", " match", " here"], [False, False, False]),
+        ],
+    )
+    def test_feed(self, stop_sequences, chunks, expected_found):
+        matcher = StopSequenceMatcher(stop_sequences)
+        state = 0
+        found = []
+        for chunk in chunks:
+            state, chunk_found = matcher.feed(state, chunk)
+            found.append(chunk_found)
+        assert found == expected_found
+
+    def test_state_is_independent_per_text(self):
+        matcher = StopSequenceMatcher(["END"])
+        first_state, _ = matcher.feed(0, "The E")
+        second_state, _ = matcher.feed(0, "Hello")
+        assert matcher.feed(first_state, "ND") == (matcher.feed(0, "END")[0], True)
+        assert matcher.feed(second_state, "ND")[1] is False
+
+
+class TestGenerationBatcher:
+    def test_concurrent_requests_are_batched_by_key(self):
+        batches = []
+
+        def generate_batch(requests):
+            batches.append(requests)
+            return [request.upper() for request in requests]
+
+        batcher = GenerationBatcher(generate_batch, max_batch_size=8, batch_window=0.5)
+        barrier = threading.Barrier(4)
+        results = {}
+
+        def submit(request, batch_key):
+            barrier.wait()
+            results[request] = batcher.submit(request, batch_key=batch_key).result()
+
+        threads = [
+            threading.Thread(target=submit, args=(request, batch_key))
+            for request, batch_key in [("a", 1), ("b", 1), ("c", 1), ("d", 2)]
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == {"a": "A", "b": "B", "c": "C", "d": "D"}
+        assert sorted(sorted(batch) for batch in batches) == [["a", "b", "c"], ["d"]]
+
+    def test_errors_are_raised_to_each_request_of_the_batch(self):
+        def generate_batch(requests):
+            raise RuntimeError("out of memory")
+
+        batcher = GenerationBatcher(generate_batch, max_batch_size=2, batch_window=0.0)
+        with pytest.raises(RuntimeError, match="out of memory"):
+            batcher.submit("a").result()
+
+
+class CountingModel(Model):
+    def __init__(self, **kwargs):
+        super().__init__(model_id="counting-model", **kwargs)
+        self.calls = 0
+
+    def generate(self, messages, stop_sequences=None, grammar=None, tools_to_call_from=None, **kwargs):
+        self.calls += 1
+        self.last_input_token_count, self.last_output_token_count = 10, 2
+        return ChatMessage(role=MessageRole.ASSISTANT, content=f"Answer {self.calls}", raw=object())
+
+    def generate_stream(self, messages, stop_sequences=None, grammar=None, tools_to_call_from=None, **kwargs):
+        self.calls += 1
+        self.last_input_token_count, self.last_output_token_count = 10, 2
+        yield CompletionDelta(content="Ans")
+        yield CompletionDelta(content="wer")
+
+
+class TestCachedModel:
+    messages = [{"role": MessageRole.USER, "content": [{"type": "text", "text": "Hello"}]}]
+
+    def test_record_then_replay(self, tmp_path):
+        model = CountingModel()
+        cached_model = CachedModel(model, cache_dir=tmp_path)
+        assert cached_model.generate(self.messages, stop_sequences=["<end>"]).content == "Answer 1"
+        assert cached_model.generate(self.messages, stop_sequences=["<end>"]).content == "Answer 1"
+        assert cached_model.generate(self.messages, stop_sequences=["<stop>"]).content == "Answer 2"
+        assert model.calls == 2
+
+        replaying_model = CachedModel(CountingModel(), cache_dir=tmp_path, mode="replay")
+        message = replaying_model.generate(deepcopy(self.messages), stop_sequences=["<end>"])
+        assert message.content == "Answer 1"
+        assert replaying_model.get_token_counts() == {"input_token_count": 10, "output_token_count": 2}
+        assert replaying_model.model.calls == 0
+        with pytest.raises(KeyError):
+            replaying_model.generate(self.messages, stop_sequences=["<end>"], temperature=0.5)
+
+    def test_passthrough_does_not_use_the_cache(self, tmp_path):
+        model = CountingModel()
+        CachedModel(model, cache_dir=tmp_path).generate(self.messages)
+        assert CachedModel(model, cache_dir=tmp_path, mode="passthrough").generate(self.messages).content == "Answer 2"
+        assert len(list(tmp_path.glob("*.json"))) == 1
+
+    def test_stream_record_then_replay(self, tmp_path):
+        model = CountingModel()
+        cached_model = CachedModel(model, cache_dir=tmp_path)
+        assert [delta.content for delta in cached_model.generate_stream(self.messages)] == ["Ans", "wer"]
+        assert [delta.content for delta in cached_model.generate_stream(self.messages)] == ["Ans", "wer"]
+        assert model.calls == 1
+
+    def test_least_recently_used_responses_are_evicted(self, tmp_path):
+        model = CountingModel()
+        cached_model = CachedModel(model, cache_dir=tmp_path)
+        cached_model.generate(self.messages, stop_sequences=["a"])
+        cached_model.max_size = 2 * next(tmp_path.glob("*.json")).stat().st_size
+        cached_model.generate(self.messages, stop_sequences=["b"])
+        cached_model.generate(self.messages, stop_sequences=["a"])
+        cached_model.generate(self.messages, stop_sequences=["c"])
+        assert len(list(tmp_path.glob("*.json"))) == 2
+        assert cached_model.generate(self.messages, stop_sequences=["a"]).content == "Answer 1"
+        assert cached_model.generate(self.messages, stop_sequences=["b"]).content == "Answer 4"
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+        self.response = MagicMock(status_code=status_code, headers=headers or {})
+
+
+class TestRetryPolicy:
+    @staticmethod
+    def failing_call(errors):
+        errors = list(errors)
+
+        def call():
+            if errors:
+                raise errors.pop(0)
+            return "success"
+
+        return call
+
+    def test_transient_errors_are_retried_with_backoff(self):
+        policy = RetryPolicy(max_retries=3, initial_delay=1.0, jitter=False)
+        retries = []
+        with patch("smolagents.models.time.sleep") as sleep:
+            result = policy.call(
+                self.failing_call([FakeAPIError(503), ConnectionError(), FakeAPIError(429)]),
+                on_retry=lambda error, retry_number, delay: retries.append((retry_number, delay)),
+            )
+        assert result == "success"
+        assert retries == [(1, 1.0), (2, 2.0), (3, 4.0)]
+        assert [call.args[0] for call in sleep.call_args_list] == [1.0, 2.0, 4.0]
+
+    def test_jitter_stays_below_backoff_delay(self):
+        policy = RetryPolicy(initial_delay=1.0, max_delay=3.0)
+        delays = [policy.get_delay(retry_number) for retry_number in range(1, 5) for _ in range(20)]
+        assert all(0 <= delay <= 3.0 for delay in delays)
+
+    @pytest.mark.parametrize(
+        "headers, expected_delay",
+        [
+            ({"Retry-After": "7"}, 7.0),
+            ({"retry-after-ms": "1500"}, 1.5),
+            ({"x-ratelimit-reset-requests": "1m30s"}, 90.0),
+        ],
+    )
+    def test_retry_after_headers_are_honored(self, headers, expected_delay):
+        assert RetryPolicy().get_delay(1, FakeAPIError(429, headers)) == expected_delay
+
+    def test_non_transient_errors_are_raised(self):
+        policy = RetryPolicy()
+        with patch("smolagents.models.time.sleep") as sleep:
+            with pytest.raises(FakeAPIError):
+                policy.call(self.failing_call([FakeAPIError(400)]))
+            with pytest.raises(ValueError):
+                policy.call(self.failing_call([ValueError("Malformed output")]))
+            with pytest.raises(FakeAPIError):
+                RetryPolicy(max_retries=1).call(self.failing_call([FakeAPIError(500)] * 2))
+        assert sleep.call_count == 1
+
+    def test_retry_after_pauses_the_shared_rate_limiter(self):
+        rate_limiter = get_rate_limiter("test-provider", "pause-model")
+        assert get_rate_limiter("test-provider", "pause-model") is rate_limiter
+        policy = RetryPolicy()
+        start_time = time.monotonic()
+        result = policy.call(self.failing_call([FakeAPIError(429, {"retry-after": "0.2"})]), rate_limiter=rate_limiter)
+        assert result == "success"
+        assert time.monotonic() - start_time >= 0.2
+
+
+class TestRateLimiter:
+    def test_requests_are_spaced_by_the_rate(self):
+        rate_limiter = RateLimiter(requests_per_minute=600)
+        start_time = time.monotonic()
+        for _ in range(4):
+            rate_limiter.acquire()
+        assert time.monotonic() - start_time >= 0.3
+
+    def test_unlimited_rate_does_not_wait(self):
+        rate_limiter = RateLimiter()
+        assert sum(rate_limiter.acquire() for _ in range(100)) == 0.0
+
 
 class TestInferenceClientModel:
     def test_call_with_custom_role_conversions(self):
@@ -310,6 +551,218 @@ class TestLiteLLMRouterModel:
             assert mock_router.call_args.kwargs["routing_strategy"] == "simple-shuffle"
             assert router_model.client == mock_router.return_value
 
+    @staticmethod
+    def make_router(model_list, latencies):
+        """Fake litellm router whose deployments, given by id, answer after the given latencies."""
+        router = MagicMock()
+        router.model_list = [
+            {**deployment, "model_info": {"id": f"id-{index}"}} for index, deployment in enumerate(model_list)
+        ]
+
+        def completion(model, **kwargs):
+            # Like litellm, a deployment id routes the request to this deployment
+            assert "specific_deployment" not in kwargs
+            time.sleep(latencies[model])
+            response = MagicMock()
+            response.usage.prompt_tokens = 10
+            response.usage.completion_tokens = 5
+            response.choices[0].message.model_dump.return_value = {"role": "assistant", "content": model}
+            return response
+
+        router.completion.side_effect = completion
+        return router
+
+    model_list = [
+        {"model_name": "model-group", "litellm_params": {"model": "openai/fast"}},
+        {"model_name": "model-group", "litellm_params": {"model": "openai/slow"}},
+        {"model_name": "other-group", "litellm_params": {"model": "openai/other"}},
+    ]
+    messages = [{"role": "user", "content": [{"type": "text", "text": "Hello"}]}]
+
+    def test_latency_routing_picks_the_fastest_deployment(self):
+        router = self.make_router(self.model_list, {"id-0": 0.01, "id-1": 0.2})
+        model = LiteLLMRouterModel(
+            model_id="model-group", model_list=self.model_list, client=router, latency_routing=True
+        )
+        assert model.deployments == ["id-0", "id-1"]
+        contents = [model.generate(self.messages).content for _ in range(4)]
+        # Both deployments are tried once, then the fastest one is used
+        assert sorted(contents[:2]) == ["id-0", "id-1"]
+        assert contents[2:] == ["id-0", "id-0"]
+
+    def test_replicas_of_the_same_model_are_tracked_separately(self):
+        model_list = [
+            {"model_name": "model-group", "litellm_params": {"model": "openai/model", "api_base": "http://replica-0"}},
+            {"model_name": "model-group", "litellm_params": {"model": "openai/model", "api_base": "http://replica-1"}},
+        ]
+        router = self.make_router(model_list, {"id-0": 0.2, "id-1": 0.01})
+        model = LiteLLMRouterModel(model_id="model-group", model_list=model_list, client=router, latency_routing=True)
+        assert model.deployments == ["id-0", "id-1"]
+        contents = [model.generate(self.messages).content for _ in range(4)]
+        assert contents[2:] == ["id-1", "id-1"]
+        assert model.latency_tracker.predict("id-0") > model.latency_tracker.predict("id-1")
+
+    def test_slow_requests_are_hedged(self):
+        latencies = {"id-0": 1.0, "id-1": 0.01}
+        model = LiteLLMRouterModel(
+            model_id="model-group",
+            model_list=self.model_list,
+            client=self.make_router(self.model_list, latencies),
+            hedge_percentile=95,
+            hedge_min_samples=2,
+        )
+        # id-0 used to be the fastest deployment: its slow requests are duplicated after its p95
+        for deployment, latency in [("id-0", 0.05), ("id-0", 0.05), ("id-1", 0.1), ("id-1", 0.1)]:
+            model.latency_tracker.record(deployment, latency)
+        assert model.generate(self.messages).content == "id-1"
+        assert model.get_token_counts() == {"input_token_count": 10, "output_token_count": 5}
+        # The discarded answer of the primary is counted once it arrives
+        deadline = time.monotonic() + 10
+        while model.hedge_token_counts["input_token_count"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert model.hedge_token_counts == {"input_token_count": 10, "output_token_count": 5}
+
+    def test_deployment_that_failed_once_is_chosen_again(self):
+        router = self.make_router(self.model_list, {"id-0": 0.01, "id-1": 0.02})
+        completion = router.completion.side_effect
+        failures = ["id-0"]
+
+        def failing_once(model, **kwargs):
+            if model in failures:
+                failures.remove(model)
+                raise ConnectionError(f"{model} is down")
+            return completion(model, **kwargs)
+
+        router.completion.side_effect = failing_once
+        model = LiteLLMRouterModel(
+            model_id="model-group", model_list=self.model_list, client=router, latency_routing=True
+        )
+        model.latency_tracker = LatencyTracker(decay_half_life=0.02)
+        with pytest.raises(ConnectionError):
+            model.generate(self.messages)
+        assert model.generate(self.messages).content == "id-1"
+        # The failure of id-0 is forgotten over time while id-1 keeps being used
+        contents = []
+        deadline = time.monotonic() + 10
+        while "id-0" not in contents and time.monotonic() < deadline:
+            contents.append(model.generate(self.messages).content)
+        assert contents[0] == "id-1"
+        assert contents[-1] == "id-0"
+
+
+class TestToolCallStreamAssembler:
+    def test_tool_calls_are_returned_as_soon_as_complete(self):
+        assembler = ToolCallStreamAssembler()
+        assert assembler.add([ToolCallFragment(index=0, id="call_0", name="search")]) == []
+        assert assembler.add([ToolCallFragment(index=0, arguments='{"query": "a}')]) == []
+        (tool_call,) = assembler.add([ToolCallFragment(index=0, arguments=' b"}')])
+        assert (tool_call.id, tool_call.function.name, tool_call.function.arguments) == (
+            "call_0",
+            "search",
+            {"query": "a} b"},
+        )
+        assert (
+            assembler.add([ToolCallFragment(index=1, id="call_1", name="final_answer", arguments='{"answer"')]) == []
+        )
+        assert assembler.add([ToolCallFragment(index=1, arguments=": 3}")])[0].function.arguments == {"answer": 3}
+        assert assembler.flush() == []
+        assert [tool_call.id for tool_call in assembler.tool_calls] == ["call_0", "call_1"]
+
+    def test_incomplete_tool_calls_are_completed_by_later_calls_and_flush(self):
+        assembler = ToolCallStreamAssembler()
+        assembler.add([ToolCallFragment(index=0, id="call_0", name="search", arguments="not json")])
+        (tool_call,) = assembler.add([ToolCallFragment(index=1, name="visit")])
+        assert tool_call.function.arguments == "not json"
+        (tool_call,) = assembler.flush()
+        assert tool_call.function.name == "visit"
+        assert tool_call.function.arguments == {}
+        assert tool_call.id
+
+
+class TestLatencyTracker:
+    def test_ewma_and_percentiles(self):
+        tracker = LatencyTracker(alpha=0.5, decay_half_life=None)
+        for latency in [1.0, 3.0]:
+            tracker.record("a", latency)
+        tracker.record("b", 1.0)
+        assert tracker.predict("a") == 2.0
+        assert tracker.predict("unseen") == 0.0
+        assert tracker.rank(["a", "b", "unseen"]) == ["unseen", "b", "a"]
+        assert tracker.percentile("a", 0) == 1.0
+        assert tracker.percentile("a", 100) == 3.0
+        assert tracker.percentile("unseen", 95) is None
+
+    def test_failures_increase_the_predicted_latency(self):
+        tracker = LatencyTracker(alpha=0.5, failure_latency=10.0, decay_half_life=None)
+        tracker.record("a", 1.0)
+        tracker.record_failure("a", 0.1)
+        assert tracker.predict("a") == 5.5
+        assert tracker.sample_count("a") == 1
+
+    def test_predicted_latencies_decay_over_time(self):
+        tracker = LatencyTracker(alpha=0.5, failure_latency=10.0, decay_half_life=30.0)
+        with patch("smolagents.models.time.monotonic", return_value=100.0):
+            tracker.record_failure("a", 0.1)
+            tracker.record("b", 2.0)
+            assert tracker.rank(["a", "b"]) == ["b", "a"]
+        with patch("smolagents.models.time.monotonic", return_value=190.0):
+            tracker.record("b", 2.0)
+            assert tracker.predict("a") == 1.25
+            assert tracker.predict("b") == 1.125
+            assert tracker.rank(["a", "b"]) == ["b", "a"]
+        with patch("smolagents.models.time.monotonic", return_value=220.0):
+            # a failed 120 seconds ago and is tried again even though b keeps answering
+            tracker.record("b", 2.0)
+            assert tracker.predict("a") == 0.625
+            assert tracker.rank(["a", "b"]) == ["a", "b"]
+            tracker.record("a", 2.0)
+            assert tracker.predict("a") == 1.3125
+
+
+class TestHedgedCall:
+    @staticmethod
+    def delayed(result, delay, calls=None):
+        def call():
+            time.sleep(delay)
+            if calls is not None:
+                calls.append(result)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        return call
+
+    def test_fast_primary_does_not_start_backup(self):
+        calls = []
+        result = hedged_call(self.delayed("primary", 0, calls), self.delayed("backup", 0, calls), hedge_delay=0.5)
+        assert result == "primary"
+        assert calls == ["primary"]
+
+    def test_slow_primary_is_hedged_and_discarded(self):
+        discarded = []
+        start_time = time.monotonic()
+        result = hedged_call(
+            self.delayed("primary", 0.5), self.delayed("backup", 0.05), hedge_delay=0.05, on_discarded=discarded.append
+        )
+        assert result == "backup"
+        assert time.monotonic() - start_time < 0.4
+        time.sleep(0.6)
+        assert discarded == ["primary"]
+
+    def test_failed_primary_starts_backup_right_away(self):
+        start_time = time.monotonic()
+        result = hedged_call(self.delayed(ValueError("Error"), 0), self.delayed("backup", 0), hedge_delay=1.0)
+        assert result == "backup"
+        assert time.monotonic() - start_time < 0.5
+
+    def test_error_is_raised_if_all_calls_fail(self):
+        with pytest.raises(ValueError, match="primary error"):
+            hedged_call(
+                self.delayed(ValueError("primary error"), 0.05),
+                self.delayed(RuntimeError("backup error"), 0),
+                hedge_delay=0.01,
+            )
+
 
 class TestOpenAIServerModel:
     def test_client_kwargs_passed_correctly(self):
@@ -334,6 +787,73 @@ class TestOpenAIServerModel:
         )
         assert model.client == MockOpenAI.return_value
 
+    def test_agenerate_uses_async_client(self):
+        with patch("openai.OpenAI") as MockOpenAI, patch("openai.AsyncOpenAI") as MockAsyncOpenAI:
+            model = OpenAIServerModel(model_id="gpt-4o", api_key="test_api_key")
+            response = MagicMock()
+            response.usage.prompt_tokens = 5
+            response.usage.completion_tokens = 2
+            response.choices[0].message.model_dump.return_value = {"role": "assistant", "content": "Hi!"}
+            MockAsyncOpenAI.return_value.chat.completions.create = AsyncMock(return_value=response)
+            message = asyncio.run(model.agenerate([{"role": "user", "content": "Hello"}]))
+        assert message.content == "Hi!"
+        assert model.get_token_counts() == {"input_token_count": 5, "output_token_count": 2}
+        MockOpenAI.return_value.chat.completions.create.assert_not_called()
+        MockAsyncOpenAI.assert_called_once()
+
+    def test_generate_stream_with_tools_yields_tool_call_fragments(self):
+        def make_event(tool_call_id=None, name=None, arguments=None):
+            event = MagicMock(usage=None)
+            tool_call = MagicMock(index=0, id=tool_call_id)
+            tool_call.function.name = name
+            tool_call.function.arguments = arguments
+            event.choices[0].delta.content = None
+            event.choices[0].delta.tool_calls = [tool_call]
+            return event
+
+        with patch("openai.OpenAI") as MockOpenAI:
+            model = OpenAIServerModel(model_id="gpt-4o", api_key="test_api_key")
+        MockOpenAI.return_value.chat.completions.create.return_value = iter(
+            [
+                make_event("call_0", "get_weather", ""),
+                make_event(arguments='{"city": '),
+                make_event(arguments='"Paris"}'),
+            ]
+        )
+
+        @tool
+        def get_weather(city: str) -> str:
+            """
+            Gets the weather.
+            Args:
+                city: the city
+            """
+            return "sunny"
+
+        deltas = list(
+            model.generate_stream([{"role": "user", "content": "Weather?"}], tools_to_call_from=[get_weather])
+        )
+        assert "tools" in MockOpenAI.return_value.chat.completions.create.call_args.kwargs
+        assert [delta.tool_call_fragments for delta in deltas] == [
+            [ToolCallFragment(index=0, id="call_0", name="get_weather", arguments="")],
+            [ToolCallFragment(index=0, arguments='{"city": ')],
+            [ToolCallFragment(index=0, arguments='"Paris"}')],
+        ]
+
+    def test_shared_clients_are_reused(self):
+        clear_shared_clients()
+
+        def make_model(model_id="gpt-4o", api_key="test_api_key", **kwargs):
+            return OpenAIServerModel(model_id=model_id, api_key=api_key, share_client=True, **kwargs)
+
+        model = make_model()
+        assert make_model(model_id="gpt-4o-mini").client is model.client
+        assert make_model().async_client is model.async_client
+        assert make_model(api_key="other_api_key").client is not model.client
+        assert make_model(max_connections=10).client is not model.client
+        assert OpenAIServerModel(model_id="gpt-4o", api_key="test_api_key").client is not model.client
+        clear_shared_clients()
+
 
 class TestAmazonBedrockServerModel:
     def test_client_for_bedrock(self):
@@ -380,6 +900,31 @@ class TestAzureOpenAIServerModel:
         assert model.client == MockAzureOpenAI.return_value
 
 
+class TestPrefixCache:
+    def test_longest_common_prefix_is_popped(self):
+        prefix_cache = PrefixCache(max_entries=3)
+        prefix_cache.put([1, 2, 3], "cache_a")
+        prefix_cache.put([1, 2, 4, 5], "cache_b")
+        assert prefix_cache.pop([1, 2, 4, 5, 6, 7]) == ("cache_b", 4)
+        assert prefix_cache.pop([1, 2, 4, 5, 6, 7]) == ("cache_a", 2)
+        assert prefix_cache.pop([1, 2, 4, 5, 6, 7]) == (None, 0)
+
+    def test_unrelated_prompt_gets_no_cache(self):
+        prefix_cache = PrefixCache(max_entries=3)
+        prefix_cache.put([1, 2, 3], "cache_a")
+        assert prefix_cache.pop([4, 5]) == (None, 0)
+        assert len(prefix_cache) == 1
+
+    def test_least_recently_put_cache_is_evicted(self):
+        prefix_cache = PrefixCache(max_entries=2)
+        prefix_cache.put([1], "cache_a")
+        prefix_cache.put([2], "cache_b")
+        prefix_cache.put([3], "cache_c")
+        assert len(prefix_cache) == 2
+        assert prefix_cache.pop([1]) == (None, 0)
+        assert prefix_cache.pop([3, 4]) == ("cache_c", 1)
+
+
 class TestTransformersModel:
     @pytest.mark.parametrize(
         "patching",
@@ -426,6 +971,125 @@ class TestTransformersModel:
             assert mocks["transformers.AutoProcessor.from_pretrained"].call_args.args == ("test-model",)
             assert mocks["transformers.AutoProcessor.from_pretrained"].call_args.kwargs == {"trust_remote_code": True}
 
+    @staticmethod
+    def make_model(**kwargs):
+        with (
+            patch(
+                "transformers.AutoModelForImageTextToText.from_pretrained",
+                side_effect=ValueError("Unrecognized configuration class"),
+            ),
+            patch("transformers.AutoModelForCausalLM.from_pretrained"),
+            patch("transformers.AutoTokenizer.from_pretrained"),
+        ):
+            return TransformersModel(model_id="test-model", device_map="cpu", max_new_tokens=5, **kwargs)
+
+    @staticmethod
+    def prompt(token_ids):
+        return {"inputs": np.array([token_ids]), "use_cache": True, "stopping_criteria": None, "max_new_tokens": 5}
+
+    class FakeCache:
+        def __init__(self, seq_length):
+            self.seq_length = seq_length
+
+        def get_seq_length(self):
+            return self.seq_length
+
+        def crop(self, length):
+            self.seq_length = length
+
+    def test_generate_reuses_the_cropped_prefix_cache(self):
+        model = self.make_model()
+        model.tokenizer.decode.return_value = "output"
+        caches = [self.FakeCache(4), self.FakeCache(7)]
+        sequences = [np.array([[1, 2, 3, 4, 5]]), np.array([[1, 2, 3, 4, 6, 7, 8, 9]])]
+        model.model.generate.side_effect = [
+            SimpleNamespace(sequences=sequence, past_key_values=cache) for sequence, cache in zip(sequences, caches)
+        ]
+        with patch.object(
+            model, "_prepare_completion_args", side_effect=[self.prompt([1, 2, 3]), self.prompt([1, 2, 3, 4, 6, 7])]
+        ):
+            model.generate([])
+            model.generate([])
+        first_call, second_call = model.model.generate.call_args_list
+        # Without a cached prefix, the model uses its own cache class
+        assert "past_key_values" not in first_call.kwargs
+        assert second_call.kwargs["past_key_values"] is caches[0]
+        assert caches[0].seq_length == 4
+        assert model.tokenizer.decode.call_args_list[1].args[0].tolist() == [8, 9]
+
+    def test_generate_stream_stores_the_prompt_cache(self):
+        model = self.make_model()
+        model.streamer = ["Hel", "lo"]
+        cache = self.FakeCache(6)
+        model.model.generate.return_value = SimpleNamespace(
+            sequences=np.array([[1, 2, 3, 4, 5, 6, 7]]), past_key_values=cache
+        )
+        with patch.object(model, "_prepare_completion_args", return_value=self.prompt([1, 2, 3])):
+            assert "".join(delta.content for delta in model.generate_stream([])) == "Hello"
+        assert "past_key_values" not in model.model.generate.call_args.kwargs
+        assert cache.seq_length == 3
+        assert model.prefix_cache.pop([1, 2, 3, 8]) == (cache, 3)
+
+    @staticmethod
+    def fake_batch_generate(inputs, attention_mask, pad_token_id, **kwargs):
+        """Generates token * 10 for each prompt token, the rows of shorter prompts finishing earlier."""
+        import torch
+
+        max_generated_length = int(attention_mask.sum(dim=1).max())
+        out = torch.full((inputs.shape[0], inputs.shape[1] + max_generated_length), pad_token_id, dtype=inputs.dtype)
+        out[:, : inputs.shape[1]] = inputs
+        for row in range(inputs.shape[0]):
+            prompt = inputs[row][attention_mask[row] == 1]
+            out[row, inputs.shape[1] : inputs.shape[1] + len(prompt)] = prompt * 10
+        return out
+
+    def test_generate_batch_returns_the_own_tokens_of_each_request(self):
+        import torch
+
+        model = self.make_model(max_batch_size=4)
+        model.tokenizer.pad_token_id = 0
+        model.model.generate.side_effect = self.fake_batch_generate
+        requests = [
+            ({"inputs": torch.tensor([[5, 6, 7]]), "max_new_tokens": 5}, None),
+            ({"inputs": torch.tensor([[8]]), "max_new_tokens": 5}, None),
+        ]
+        generated_tokens = model._generate_batch(requests)
+        assert [tokens.tolist() for tokens in generated_tokens] == [[50, 60, 70], [80]]
+        # Prompts are left-padded
+        call_kwargs = model.model.generate.call_args.kwargs
+        assert call_kwargs["inputs"].tolist() == [[5, 6, 7], [0, 0, 8]]
+        assert call_kwargs["attention_mask"].tolist() == [[1, 1, 1], [0, 0, 1]]
+        assert call_kwargs["max_new_tokens"] == 5
+
+    def test_concurrent_generate_calls_are_split_into_batches(self):
+        import torch
+
+        model = self.make_model(max_batch_size=2, batch_window=0.5)
+        model.tokenizer.pad_token_id = 0
+        model.tokenizer.decode.side_effect = lambda tokens, **kwargs: " ".join(str(token) for token in tokens.tolist())
+        model.model.generate.side_effect = self.fake_batch_generate
+        prompts = {"a": [1, 2], "b": [3], "c": [4, 5, 6]}
+
+        def prepare_completion_args(messages, **kwargs):
+            return {"inputs": torch.tensor([prompts[messages]]), "use_cache": True, "stopping_criteria": None}
+
+        barrier = threading.Barrier(len(prompts))
+        outputs = {}
+
+        def generate(name):
+            barrier.wait(timeout=10)
+            outputs[name] = model.generate(name).content
+
+        with patch.object(model, "_prepare_completion_args", side_effect=prepare_completion_args):
+            threads = [threading.Thread(target=generate, args=(name,)) for name in prompts]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert outputs == {"a": "10 20", "b": "30", "c": "40 50 60"}
+        batch_sizes = sorted(call.kwargs["inputs"].shape[0] for call in model.model.generate.call_args_list)
+        assert batch_sizes == [1, 2]
+
 
 def test_get_clean_message_list_basic():
     messages = [
@@ -643,3 +1307,27 @@ class TestGetToolCallFromText:
         result = get_tool_call_from_text(text, "name", "arguments")
         assert result.function.name == "calculator"
         assert result.function.arguments == 42
+
+
+def test_get_clean_message_list_does_not_modify_input_messages():
+    messages = [
+        {"role": "user", "content": [{"type": "text", "text": "Hello!"}]},
+        {"role": "user", "content": [{"type": "text", "text": "How are you?"}]},
+    ]
+    original_messages = deepcopy(messages)
+    result = get_clean_message_list(messages)
+    assert result == [{"role": "user", "content": [{"type": "text", "text": "Hello!\nHow are you?"}]}]
+    result[0]["content"][0]["text"] = "Modified"
+    assert messages == original_messages
+
+
+def test_get_clean_message_list_encodes_each_image_once():
+    image = PIL.Image.new("RGB", (4, 4))
+    messages = [{"role": "user", "content": [{"type": "image", "image": image}]}]
+    with patch("smolagents.models.encode_image_base64", return_value="encoded_image") as mock_encode:
+        first_result = get_clean_message_list(messages, convert_images_to_image_urls=True)
+        second_result = get_clean_message_list(messages, convert_images_to_image_urls=True)
+    assert mock_encode.call_count == 1
+    assert first_result == second_result
+    assert second_result[0]["content"][0]["image_url"] == {"url": "data:image/png;base64,encoded_image"}
+    assert messages[0]["content"][0] == {"type": "image", "image": image}
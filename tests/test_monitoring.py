@@ -13,9 +13,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
 import unittest
 
 import pytest
+from rich.console import Console
 
 from smolagents import (
     AgentImage,
@@ -29,6 +31,7 @@ from smolagents.models import (
     ChatMessageToolCallDefinition,
     Model,
 )
+from smolagents.monitoring import AgentLogger, LogLevel
 
 
 class FakeLLMModel(Model):
@@ -186,3 +189,38 @@ class MonitoringTester(unittest.TestCase):
         final_message = outputs[-1]
         self.assertEqual(final_message.role, "assistant")
         self.assertIn("Malformed call", final_message.content)
+
+
+class TestMarkdownStreamRenderer:
+    def make_logger(self, level=LogLevel.INFO):
+        return AgentLogger(level, Console(file=io.StringIO(), force_terminal=False, width=200))
+
+    def test_renders_are_batched(self):
+        logger = self.make_logger()
+        with logger.stream_markdown(refresh_interval=3600, refresh_chars=50) as renderer:
+            for _ in range(1000):
+                renderer.update("a")
+        # One render every 50 characters, plus the final one
+        assert renderer.render_count == 21
+        assert renderer.text == "a" * 1000
+        assert "a" * 200 in logger.console.file.getvalue()
+
+    def test_completed_blocks_are_rendered_once(self):
+        logger = self.make_logger()
+        text = "First paragraph.\n\n```py\nx = 1\n\nprint(x)\n```\nLast paragraph."
+        with logger.stream_markdown(refresh_interval=0) as renderer:
+            for character in text:
+                renderer.update(character)
+        assert renderer.text == text
+        output = logger.console.file.getvalue()
+        for expected in ["First paragraph.", "x = 1", "print(x)", "Last paragraph."]:
+            assert output.count(expected) == 1
+
+    def test_disabled_below_log_level(self):
+        logger = self.make_logger(level=LogLevel.OFF)
+        with logger.stream_markdown(refresh_interval=0) as renderer:
+            renderer.update("Hello ")
+            renderer.update("world")
+        assert renderer.text == "Hello world"
+        assert renderer.render_count == 0
+        assert logger.console.file.getvalue() == ""
@@ -15,6 +15,7 @@
 import inspect
 import os
 import textwrap
+import threading
 import unittest
 
 import pytest
@@ -22,7 +23,16 @@ from IPython.core.interactiveshell import InteractiveShell
 
 from smolagents import Tool
 from smolagents.tools import tool
-from smolagents.utils import get_source, instance_to_source, is_valid_name, parse_code_blobs, parse_json_blob
+from smolagents.utils import (
+    CaptureBuffer,
+    get_http_session,
+    get_source,
+    instance_to_source,
+    is_valid_name,
+    parse_code_blobs,
+    parse_json_blob,
+    truncate_content,
+)
 
 
 class ValidTool(Tool):
@@ -495,3 +505,36 @@ def test_parse_json_blob_with_invalid_json(raw_json):
 def test_is_valid_name(name, expected):
     """Test the is_valid_name function with various inputs."""
     assert is_valid_name(name) is expected
+
+
+@pytest.mark.parametrize("max_length", [10, 11, None])
+@pytest.mark.parametrize("chunks", [[], ["short"], ["0123456789"] * 5, ["a" * 3, "b" * 25, "c" * 4, "\n" * 2]])
+def test_capture_buffer_matches_truncate_content(chunks, max_length):
+    buffer = CaptureBuffer(max_length=max_length)
+    for chunk in chunks:
+        assert buffer.write(chunk) == len(chunk)
+    content = "".join(chunks)
+    if max_length is None:
+        assert buffer.getvalue() == content
+    else:
+        assert buffer.getvalue() == truncate_content(content, max_length=max_length)
+        assert buffer.dropped == max(len(content) - max_length, 0)
+
+
+def test_capture_buffer_memory_is_bounded():
+    buffer = CaptureBuffer(max_length=100)
+    for i in range(10000):
+        print(i, file=buffer)
+    assert len(buffer.head) == 50
+    assert buffer.tail_length < 100
+    assert buffer.getvalue().endswith("9998\n9999\n")
+
+
+def test_http_session_is_reused_within_a_thread():
+    session = get_http_session()
+    assert get_http_session() is session
+    other_thread_sessions = []
+    thread = threading.Thread(target=lambda: other_thread_sessions.append(get_http_session()))
+    thread.start()
+    thread.join()
+    assert other_thread_sessions[0] is not session